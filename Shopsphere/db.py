@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+# -----------------------------
+# SQLITE PROFILES
+# -----------------------------
+# Connection settings for running the shop on a single SQLite file with
+# several worker threads/processes. Pick one with SQLITE_PROFILE:
+#
+# - 'stock': Django's defaults (rollback journal, 5 s busy wait).
+# - 'production': WAL journal so readers and the writer don't block each
+#   other, synchronous=NORMAL (fsync at checkpoints only - safe with WAL, a
+#   power cut can lose the last transactions but never corrupt the file),
+#   a longer busy_timeout, memory-mapped reads and a bigger page cache.
+#
+# The pragmas run on every new connection through Django's init_command;
+# CONN_MAX_AGE keeps connections open across requests so that happens once
+# per worker rather than once per request.
+
+PROFILES = ('stock', 'production')
+
+
+def sqlite_options(profile, busy_timeout=5000, mmap_size=256 * 1024 * 1024, cache_size=-20000):
+    """
+    DATABASES OPTIONS for `profile`. `busy_timeout` is in milliseconds,
+    `mmap_size` in bytes and `cache_size` in pages, or KiB when negative.
+    """
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(f"SQLITE_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}.")
+    if profile == 'stock':
+        return {}
+    pragmas = [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={int(busy_timeout)}',
+        f'PRAGMA mmap_size={int(mmap_size)}',
+        f'PRAGMA cache_size={int(cache_size)}',
+        'PRAGMA temp_store=MEMORY',
+    ]
+    return {'init_command': ';'.join(pragmas)}
+
+
+# -----------------------------
+# Write transactions
+# -----------------------------
+@contextmanager
+def immediate_atomic(using=None):
+    """
+    transaction.atomic() that starts with BEGIN IMMEDIATE on SQLite.
+
+    A plain (deferred) transaction that reads before it writes has to upgrade
+    its lock mid-way; when two do so at once SQLite fails one straight away
+    with "database is locked", busy_timeout or not. Taking the write lock up
+    front makes concurrent writers queue on busy_timeout instead. Nested
+    blocks are savepoints and inherit the outer transaction's mode.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    immediate = (
+        connection.vendor == 'sqlite'
+        and not connection.in_atomic_block
+        and getattr(settings, 'SQLITE_IMMEDIATE_WRITES', True)
+    )
+    if not immediate:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    connection.ensure_connection()  # transaction_mode is read from OPTIONS on connect
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous  # BEGIN has been issued
+            yield
+    finally:
+        connection.transaction_mode = previous
@@ -0,0 +1,155 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('shopsphere.sql')
+
+
+# -----------------------------
+# SQL INSTRUMENTATION
+# -----------------------------
+# Counts every statement a request runs (through connection.execute_wrapper,
+# so DEBUG is not needed), adds them up, and groups them by shape - the SQL
+# with literals and IN lists collapsed - so "the same SELECT once per cart
+# line" stands out. Each response gets
+#
+#     Server-Timing: db;dur=3.1;desc="4 queries", app;dur=12.9
+#
+# and one JSON log line on the `shopsphere.sql` logger: INFO normally,
+# WARNING when a shape repeats more than SQL_REPEAT_THRESHOLD times or the
+# view's query budget is exceeded.
+#
+# Views declare budgets with a `query_budget` attribute - an int, or a dict
+# of {action: int} on viewsets - or the @query_budget(n) decorator on plain
+# functions. With SQL_QUERY_BUDGET_STRICT on (the test suite turns it on) an
+# overrun or repeated shape raises QueryBudgetExceeded instead of logging.
+#
+# Queries run while a StreamingHttpResponse is consumed happen after the
+# middleware returns and are not counted.
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\((?:\?, )+\?\)')
+_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """The statement's shape: literals and placeholders as ?, IN lists as (...)."""
+    sql = _SAVEPOINT.sub('"s?"', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def query_budget(budget):
+    """Declare the most queries a function-based view may run."""
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def extend_query_budget(request, extra):
+    """Let this request run `extra` more queries, for fixed-cost layers around a view."""
+    request = getattr(request, '_request', request)  # DRF wraps the HttpRequest
+    if getattr(request, 'query_budget', None) is not None:
+        request.query_budget += extra
+
+
+class QueryStats:
+    """execute_wrapper that tallies count, time and shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+def get_budget(view_func, request):
+    budget = getattr(view_func, 'query_budget', None)
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if budget is None and view_class is not None:
+        budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        # Viewset routes know which action each HTTP method maps to
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(request.method.lower()))
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        stats = QueryStats()
+        request.query_budget = None
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        response['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", app;dur={elapsed * 1000:.1f}'
+        )
+        self.report(request, response, stats, elapsed)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_budget(view_func, request)
+
+    def report(self, request, response, stats, elapsed):
+        threshold = getattr(settings, 'SQL_REPEAT_THRESHOLD', 5)
+        repeated = stats.repeated(threshold)
+        budget = request.query_budget
+        problems = []
+        if budget is not None and stats.count > budget:
+            problems.append(f"{stats.count} queries, budget is {budget}")
+        problems += [f"{count}x {shape[:300]}" for shape, count in repeated]
+
+        logger.log(logging.WARNING if problems else logging.INFO, json.dumps({
+            'event': 'request_sql',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'budget': budget,
+            'sql_ms': round(stats.duration * 1000, 2),
+            'duration_ms': round(elapsed * 1000, 2),
+            'repeated': [{'sql': shape, 'count': count} for shape, count in repeated],
+        }))
+
+        if problems and getattr(settings, 'SQL_QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(f"{request.method} {request.path}: " + '; '.join(problems))
@@ -0,0 +1,39 @@
+import codecs
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, get_encoding
+from rest_framework.utils import json as drf_json
+
+from .renderers import FastJSONRenderer, orjson
+
+
+# -----------------------------
+# FAST JSON PARSER
+# -----------------------------
+# JSONParser counterpart of FastJSONRenderer. UTF-8 bodies are decoded with
+# orjson; anything orjson rejects (other charsets, integers beyond 64 bits,
+# NaN when STRICT_JSON is off, malformed input) is re-parsed by the stock
+# parser, so accepted payloads and error messages are unchanged.
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser with an orjson fast path for UTF-8 bodies."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = get_encoding(parser_context or {})
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+        try:
+            parse_constant = drf_json.strict_constant if self.strict else None
+            return json.loads(body.decode(encoding), parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+
+# -----------------------------
+# FAST JSON RENDERER
+# -----------------------------
+# Drop-in replacement for DRF's JSONRenderer that encodes with orjson when it
+# is installed and falls back to the stock renderer otherwise. The bytes are
+# the same either way: compact separators, UTF-8 rather than \u escapes,
+# \u2028/\u2029 escaped, and every type orjson does not encode the way DRF
+# would (datetimes, dates, times, Decimal, lazy strings, querysets, ...) is
+# handed to DRF's own JSONEncoder.default.
+#
+# Known gaps: raw NaN/Infinity floats come out as null where STRICT_JSON
+# would raise, and floats below 1e-4 or from 1e16 up are spelled differently
+# (0.00001 and 1e16 rather than 1e-05 and 1e+16). Serializers emit prices as strings, so neither
+# reaches a response. Indented output (the browsable API,
+# `Accept: application/json; indent=4`) always goes through the stdlib path,
+# since orjson only knows 2-space indent.
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    # orjson passes datetime/date/time through here so they get DRF's
+    # formatting ('Z' for UTC, DRF's handling of aware times)
+    if isinstance(obj, Decimal) and not obj.is_finite():
+        # orjson would write null; send it back to the stdlib path, which
+        # refuses it under STRICT_JSON like it always has
+        raise TypeError("Out of range float values are not JSON compliant")
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer with an orjson fast path for compact output."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, non-finite Decimals, unknown types, ... -
+            # the stdlib encoder produces its usual output (or its usual error)
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
@@ -0,0 +1,137 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+# -----------------------------
+# READ REPLICAS
+# -----------------------------
+# Catalog and order-history reads can be served from read replicas listed in
+# settings.DATABASE_REPLICAS (aliases in DATABASES). Nothing is routed by
+# default: viewsets opt in with ReplicaReadMixin, whose `replica_actions`
+# (list and retrieve) run on one replica picked per request. Everything
+# else - writes, checkout, authentication, the admin - uses the primary.
+#
+# Replicas lag behind the primary, so a user who just wrote must not read
+# from one: any request that writes (ReplicaRouter.db_for_write is called)
+# makes its user sticky to the primary for REPLICA_STICKY_SECONDS, which
+# should exceed the worst replication lag. Catalog writes do the same for
+# catalog cache rebuilds - see CatalogCacheMixin.
+#
+# Responses served from a replica carry `X-Read-Replica: <alias>`.
+# `simulate_replication` keeps local SQLite replica files a few seconds
+# behind db.sqlite3 to try this out.
+
+HEADER = 'X-Read-Replica'
+STICKY_PREFIX = 'replica:sticky'
+
+_read_alias = ContextVar('read_alias', default=None)
+_wrote = ContextVar('wrote', default=False)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def get_sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def get_cache():
+    return caches[getattr(settings, 'REPLICA_STICKY_CACHE_ALIAS', 'default')]
+
+
+@contextmanager
+def use_database(alias):
+    """Send reads in this block to `alias` (None: the primary)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def use_primary():
+    return use_database(None)
+
+
+# -----------------------------
+# Read-your-writes
+# -----------------------------
+def stick(user):
+    """Keep `user`'s reads on the primary until the replicas have caught up."""
+    get_cache().set(f'{STICKY_PREFIX}:{user.pk}', 1, timeout=get_sticky_seconds())
+
+
+def is_sticky(user):
+    return user.is_authenticated and get_cache().get(f'{STICKY_PREFIX}:{user.pk}') is not None
+
+
+class ReplicaStickinessMiddleware:
+    """Makes the user of every request that wrote to the database sticky."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)  # DRF sets it here once it has authenticated
+            if _wrote.get() and get_replicas() and user is not None and user.is_authenticated:
+                stick(user)
+        finally:
+            _wrote.reset(token)
+        return response
+
+
+# -----------------------------
+# Router and viewset mixin
+# -----------------------------
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()  # None falls through to the primary
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in get_replicas()  # replicas get their schema by replication
+
+
+class ReplicaReadMixin:
+    """Serve `replica_actions` from a read replica unless the user just wrote."""
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        self.read_replica = None
+        with use_primary():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # authenticates, so stickiness is known
+        self.read_replica = self.choose_replica(request)
+        _read_alias.set(self.read_replica)
+
+    def choose_replica(self, request):
+        replicas = get_replicas()
+        if not replicas or self.action not in self.replica_actions or request.method not in SAFE_METHODS:
+            return None
+        if is_sticky(request.user):
+            return None
+        return random.choice(replicas)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'read_replica', None):
+            response[HEADER] = self.read_replica
+        return response
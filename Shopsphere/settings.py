@@ -15,6 +15,8 @@ import os
 import environ
 from datetime import timedelta
 
+from .db import sqlite_options
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -80,6 +82,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Shopsphere.middleware.QueryInstrumentationMiddleware',  # outermost, so it sees every query
+    'Shopsphere.routers.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -146,13 +150,107 @@ WSGI_APPLICATION = 'Shopsphere.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLITE_PROFILE picks the connection pragmas - see Shopsphere/db.py.
+# Under ASGI set CONN_MAX_AGE=0: async requests don't reuse thread connections.
+SQLITE_PROFILE = env('SQLITE_PROFILE', default='production')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=60),  # seconds; 0 closes after every request
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': sqlite_options(
+            SQLITE_PROFILE,
+            busy_timeout=env.int('SQLITE_BUSY_TIMEOUT', default=5000),  # ms
+            mmap_size=env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),  # bytes
+            cache_size=env.int('SQLITE_CACHE_SIZE', default=-20000),  # negative = KiB
+        ),
     }
 }
 
+# Read replicas for catalog and order-history reads - see Shopsphere/routers.py.
+# SQLITE_REPLICAS lists replica files, e.g. ones kept a few seconds behind
+# db.sqlite3 by `manage.py simulate_replication`; tests mirror them to default.
+DATABASE_REPLICAS = []
+for index, path in enumerate(env.list('SQLITE_REPLICAS', default=[]), start=1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = ['Shopsphere.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=5)  # must exceed the worst replication lag
+REPLICA_STICKY_CACHE_ALIAS = 'default'  # shared backend (CACHE_URL) so every worker sees it
+
+# Checkout and cart writes open their transaction with BEGIN IMMEDIATE
+SQLITE_IMMEDIATE_WRITES = env.bool('SQLITE_IMMEDIATE_WRITES', default=True)
+
+# Per-request query counting, Server-Timing and N+1 warnings - see Shopsphere/middleware.py
+SQL_INSTRUMENTATION = env.bool('SQL_INSTRUMENTATION', default=True)
+SQL_REPEAT_THRESHOLD = 5  # one statement shape run more often than this in a request is flagged
+SQL_QUERY_BUDGET_STRICT = False  # raise instead of logging; the test suite turns this on
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO logs a JSON line per request; WARNING only the over-budget/N+1 ones
+        'shopsphere.sql': {
+            'handlers': ['console'],
+            'level': env('SQL_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Point CACHE_URL at Redis/Memcached in production so every worker shares it,
+# e.g. CACHE_URL=redis://127.0.0.1:6379/1
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Catalog (products/categories) read-through cache - see shop/cache.py
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', default=300)  # seconds
+CATALOG_CACHE_LOCK_TIMEOUT = 10  # seconds a rebuild may hold the stampede lock
+
+# Throttle counters; must be a shared backend (CACHE_URL) for limits to hold across workers
+THROTTLE_CACHE_ALIAS = 'default'
+
+# JWT identity (user row + cart id) cache - see account/authentication.py
+IDENTITY_CACHE_ALIAS = 'default'
+IDENTITY_CACHE_TIMEOUT = env.int('IDENTITY_CACHE_TIMEOUT', default=300)  # seconds, shared cache
+IDENTITY_LOCAL_TIMEOUT = 5  # seconds a worker trusts its in-process copy
+
+# Product search backend - see shop/search.py. None picks FTS5 on SQLite.
+PRODUCT_SEARCH_BACKEND = None
+
+# Product list facets - see shop/facets.py. Price ranges are 'min-max' (min inclusive, max exclusive).
+PRODUCT_PRICE_FACETS = '-25,25-50,50-100,100-500,500-'
+# Serve the unfiltered facet counts from the FacetCount table (run rebuild_facet_counts once after enabling)
+PRODUCT_FACET_COUNT_TABLE = env.bool('PRODUCT_FACET_COUNT_TABLE', default=False)
+
+# Counters a product's stock is split into once sharded (admin action or inventory.enable) - see shop/inventory.py
+PRODUCT_STOCK_SHARDS = 8
+
+# Product image variants - see shop/images.py. Widths in pixels; originals are never upscaled.
+PRODUCT_IMAGE_VARIANTS = {'thumb': 160, 'small': 320, 'medium': 640, 'large': 1280}
+PRODUCT_IMAGE_FORMAT = 'WEBP'
+PRODUCT_IMAGE_QUALITY = 80
+PRODUCT_IMAGE_WORKERS = env.int('PRODUCT_IMAGE_WORKERS', default=2)  # background render threads; 0 renders inline
+
+# Idempotency-Key handling for checkout and cart writes - see shop/idempotency.py
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=24 * 3600)  # seconds a response is replayed
+IDEMPOTENCY_WAIT_TIMEOUT = 10  # seconds a duplicate waits for the in-flight request before a 409
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # seconds after which an unfinished request's key can be taken over
+
+# `archive_orders` moves completed/cancelled orders older than this out of the hot tables - see shop/archive.py
+ORDER_ARCHIVE_AFTER_DAYS = env.int('ORDER_ARCHIVE_AFTER_DAYS', default=365)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -160,7 +258,18 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'account.authentication.CachedJWTAuthentication',
+    ],
+
+    # orjson-backed JSON with a stdlib fallback - see Shopsphere/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'Shopsphere.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'Shopsphere.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -171,9 +280,10 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
 
+    # Sliding-window counters kept in THROTTLE_CACHE_ALIAS - see account/throttles.py
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'account.throttles.SlidingUserRateThrottle',
+        'account.throttles.SlidingAnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '5/m',     # Authenticated users - 5 request per minute
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+
+# -----------------------------
+# CACHED JWT IDENTITY
+# -----------------------------
+# JWTAuthentication looks the user up by primary key on every request. This
+# keeps what that lookup returns - the user's columns minus the password
+# hash, plus the id of their cart - in two layers:
+#
+# - a per-process dict for IDENTITY_LOCAL_TIMEOUT seconds (kept short: other
+#   workers cannot reach into it, so a save elsewhere shows up here only
+#   once the entry expires), and
+# - the shared IDENTITY_CACHE_ALIAS cache for IDENTITY_CACHE_TIMEOUT seconds.
+#
+# Saving or deleting a User (profile edits, set_password + save, deactivation)
+# drops both layers for that user, as does creating or deleting their cart.
+# Writes through QuerySet.update() bypass this; call forget_user() after them.
+#
+# A miss costs one query: the user row LEFT JOINed to their cart.
+
+KEY_PREFIX = 'identity:user'
+CART_FIELD = 'cart__id'
+
+_local = {}
+_local_lock = threading.Lock()
+LOCAL_MAX_ENTRIES = 10_000
+
+
+def get_cache():
+    return caches[getattr(settings, 'IDENTITY_CACHE_ALIAS', 'default')]
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def _fields():
+    """Every concrete column except the password hash."""
+    return [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+def _load(user_id):
+    fields = _fields()
+    row = User.objects.filter(pk=user_id).values(*fields, 'password', CART_FIELD).first()
+    if row is None:
+        return None
+    return {
+        'fields': {name: row[name] for name in fields},
+        'cart_id': row[CART_FIELD],
+        # Only the digest simplejwt compares against, never the hash itself
+        'password_digest': get_md5_hash_password(row['password']) if api_settings.CHECK_REVOKE_TOKEN else None,
+    }
+
+
+def get_identity(user_id):
+    """The cached payload for `user_id`, or None if there is no such user."""
+    user_id = str(user_id)
+    now = time.monotonic()
+    entry = _local.get(user_id)
+    if entry and entry[0] > now:
+        return entry[1]
+
+    cache = get_cache()
+    payload = cache.get(_key(user_id))
+    if payload is None:
+        payload = _load(user_id)
+        if payload is None:
+            return None
+        cache.set(_key(user_id), payload, getattr(settings, 'IDENTITY_CACHE_TIMEOUT', 300))
+
+    with _local_lock:
+        if len(_local) >= LOCAL_MAX_ENTRIES:
+            _local.clear()
+        _local[user_id] = (now + getattr(settings, 'IDENTITY_LOCAL_TIMEOUT', 5), payload)
+    return payload
+
+
+def build_user(payload):
+    """A fresh User per request, so one request's changes never leak into another's."""
+    fields = payload['fields']
+    # The password column is deferred; check_password() and friends load it on demand
+    user = User.from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+    user.cart_pk = payload['cart_id']
+    return user
+
+
+def forget_user(user_id):
+    user_id = str(user_id)
+    with _local_lock:
+        _local.pop(user_id, None)
+    get_cache().delete(_key(user_id))
+
+
+def clear_local():
+    with _local_lock:
+        _local.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from the identity cache.
+    The returned user carries `cart_pk`, the id of their cart (or None).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if api_settings.USER_ID_FIELD != User._meta.pk.attname:
+            return super().get_user(validated_token)
+
+        payload = get_identity(user_id)
+        if payload is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        user = build_user(payload)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != payload['password_digest']:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import authentication
+from .models import User
+
+
+# -----------------------------
+# IDENTITY CACHE INVALIDATION
+# -----------------------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_identity(sender, instance, **kwargs):
+    # Covers profile edits, deactivation and set_password() followed by save()
+    authentication.forget_user(instance.pk)
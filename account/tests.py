@@ -1,3 +1,136 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop.models import Cart, CartItem, Product, Category
+from . import authentication
+from .models import User
+from .throttles import SimpleIPThrottle, SlidingAnonRateThrottle
+
+
+# -----------------------------
+# THROTTLING
+# -----------------------------
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 180.0 * 10_000  # start of a 3-minute window
+        timer = mock.patch.object(SimpleIPThrottle, 'timer', side_effect=lambda: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+
+    def request(self, ip='10.0.0.1'):
+        request = APIRequestFactory().post('/api/account/login/', REMOTE_ADDR=ip)
+        request.user = AnonymousUser()
+        return request
+
+    def hit(self, ip='10.0.0.1'):
+        # A fresh instance per call, like separate workers sharing the cache
+        throttle = SimpleIPThrottle()
+        return throttle.allow_request(self.request(ip), None), throttle
+
+    def test_limit_is_shared_across_instances(self):
+        results = [self.hit()[0] for _ in range(10)]
+        self.assertTrue(all(results))
+
+        allowed, throttle = self.hit()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 180.0)
+        self.assertTrue(self.hit(ip='10.0.0.2')[0])
+
+    def test_previous_window_decays(self):
+        for _ in range(10):
+            self.hit()
+
+        # Half way through the next window half of the old requests still count
+        self.now += 270
+        results = [self.hit()[0] for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+    def test_idle_clients_expire(self):
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            self.hit()
+        self.assertEqual(add.call_args.kwargs['timeout'], 360)
+
+    def test_rate_with_period_multiplier(self):
+        self.assertEqual(SimpleIPThrottle().parse_rate('10/3m'), (10, 180))
+        self.assertEqual(SlidingAnonRateThrottle().parse_rate('100/day'), (100, 86400))
+
+
+
+# -----------------------------
+# CACHED JWT IDENTITY
+# -----------------------------
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.clear_local()
+        throttles = mock.patch.object(APIView, 'get_throttles', return_value=[])
+        throttles.start()
+        self.addCleanup(throttles.stop)
+
+        self.client = APIClient()
+        response = self.client.post('/api/account/register/', {
+            'email': 'Ada@Example.com', 'name': 'Ada', 'username': 'ada', 'country': 'NG',
+            'password': 'S3cure-pass!',
+        }, format='json', secure=True)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.user = User.objects.get(username='ada')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        category = Category.objects.create(name='Books', slug='books')
+        self.product = Product.objects.create(name='Novel', slug='novel', price='12.50', stock=5, category=category)
+
+    def tables_queried(self, ctx):
+        return {table for q in ctx.captured_queries for table in ('account_user', 'shop_cart"') if table in q['sql']}
+
+    def test_registration_creates_cart(self):
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+    def test_cart_requests_skip_user_and_cart_lookups(self):
+        self.client.get('/api/account/profile/', secure=True)  # warm the cache
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                '/api/shop/cart/add/', {'product_id': self.product.pk, 'quantity': 2}, format='json', secure=True
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CartItem.objects.get().cart, self.user.cart)
+        self.assertEqual(self.tables_queried(ctx), set())
+
+    def test_profile_changes_are_seen_immediately(self):
+        self.assertEqual(self.client.get('/api/account/profile/', secure=True).data['username'], 'ada')
+
+        response = self.client.patch('/api/account/profile/', {'username': 'lovelace'}, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/account/profile/', secure=True).data['username'], 'lovelace')
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/account/profile/', secure=True)
+        self.assertEqual(response.data['code'], 'user_inactive')
+
+    def test_password_change_drops_cached_identity(self):
+        self.client.get('/api/account/profile/', secure=True)
+        self.assertIsNotNone(authentication.get_cache().get(authentication._key(self.user.pk)))
+
+        response = self.client.post('/api/account/change-password/', {
+            'old_password': 'S3cure-pass!', 'new_password': 'An0ther-pass!',
+        }, format='json', secure=True)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIsNone(authentication.get_cache().get(authentication._key(self.user.pk)))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('An0ther-pass!'))
 
-# Create your tests here.
+    def test_cached_identity_never_holds_the_password_hash(self):
+        self.client.get('/api/account/profile/', secure=True)
+        payload = authentication.get_identity(self.user.pk)
+        self.assertNotIn('password', payload['fields'])
+        self.assertEqual(payload['cart_id'], self.user.cart.pk)
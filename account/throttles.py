@@ -1,32 +1,117 @@
-import time
-from rest_framework.throttling import BaseThrottle
+import re
 
-# Simple in-memory throttle (It will reset upon server restart)
-VISIT_RECORD = {}
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
 
-class SimpleIPThrottle(BaseThrottle):
+
+RATE_RE = re.compile(r'^(?P<num>\d+)/(?P<count>\d*)(?P<unit>[smhd])')
+UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
     """
-    Allows a maximum of `max_requests` per `duration` seconds per IP.
+    Sliding-window-counter throttle.
+
+    Instead of a list of timestamps per client, keeps one integer counter per
+    fixed window and estimates the rolling count as
+    `previous * (1 - elapsed / duration) + current` - O(1) time and memory per
+    client. Counters live in a Django cache (settings.THROTTLE_CACHE_ALIAS)
+    so every worker shares them, and expire after two windows so idle
+    clients are evicted automatically.
+
+    Rates accept an optional period multiplier, e.g. '10/3m'.
     """
-    max_requests = 10
-    duration = 180  # seconds (3 minutes)
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def parse_rate(self, rate):
+        if rate is None:
+            return (None, None)
+        match = RATE_RE.match(rate)
+        if not match:
+            raise ValueError(f"Invalid throttle rate: {rate!r}")
+        count = int(match['count'] or 1)
+        return (int(match['num']), count * UNIT_SECONDS[match['unit']])
 
     def allow_request(self, request, view):
-        ip = self.get_ident(request)
-        now = time.time()
-        history = VISIT_RECORD.get(ip, [])
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
 
-        # Remove old requests outside the duration window
-        history = [timestamp for timestamp in history if now - timestamp < self.duration]
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
 
-        if len(history) >= self.max_requests:
-            return False  # Block request
+        if self.estimate() >= self.num_requests:
+            return self.throttle_failure()
 
-        # Record this request
-        history.append(now)
-        VISIT_RECORD[ip] = history
+        # Two windows: the current one is still needed as `previous` next window
+        if not self.cache.add(current_key, 1, timeout=self.duration * 2):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                # Evicted between add() and incr()
+                self.cache.set(current_key, 1, timeout=self.duration * 2)
         return True
 
+    def estimate(self, elapsed=None):
+        elapsed = self.elapsed if elapsed is None else elapsed
+        return self.previous * (1 - elapsed / self.duration) + self.current
+
     def wait(self):
-        """Optional: return number of seconds until next request is allowed"""
-        return self.duration
+        """Seconds until the estimated rolling count drops back under the limit."""
+        if self.current < self.num_requests:
+            if not self.previous:
+                return None
+            # Previous window's weight decays within the current window
+            allowed_at = self.duration * (1 - (self.num_requests - self.current) / self.previous)
+            return max(allowed_at - self.elapsed, 0)
+        # Only the next window can help: wait for this window's count to decay
+        allowed_at = self.duration * (1 - self.num_requests / self.current)
+        return max(self.duration - self.elapsed + allowed_at, 0)
+
+
+class SlidingUserRateThrottle(SlidingWindowThrottle):
+    """Sliding-window version of DRF's UserRateThrottle ('user' rate)."""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class SlidingAnonRateThrottle(SlidingWindowThrottle):
+    """Sliding-window version of DRF's AnonRateThrottle ('anon' rate)."""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None  # Only throttle unauthenticated requests.
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class SimpleIPThrottle(SlidingWindowThrottle):
+    """
+    Allows a maximum of 10 requests per 3 minutes per IP (login attempts).
+    """
+    scope = 'login'
+    rate = '10/3m'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order
+from . import inventory
+from .models import ArchivedOrder, Category, Product, Cart, CartItem, Order
 
 
 class CategoryAdmin(admin.ModelAdmin):
@@ -9,11 +10,41 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'category', 'price', 'stock', 'is_active', 'created_at')
-    list_filter = ('is_active', 'category', 'created_at')
+    list_display = ('id', 'name', 'category', 'price', 'available_stock', 'sharded_stock', 'is_active', 'created_at')
+    list_filter = ('is_active', 'sharded_stock', 'category', 'created_at')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     ordering = ('-created_at',)
+    readonly_fields = ('available_stock',)
+    actions = ['shard_stock', 'unshard_stock']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_stock_total()
+
+    @admin.display(description='Available stock', ordering='stock_total')
+    def available_stock(self, obj):
+        return inventory.available(obj)
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        if obj is not None and obj.sharded_stock:
+            form.base_fields['stock'].help_text = (
+                "Stock is sharded: this is the reserve, added to the shards on the next rebalance."
+            )
+        return form
+
+    @admin.action(description="Shard stock of selected products (flash sales)")
+    def shard_stock(self, request, queryset):
+        for product in queryset:
+            inventory.enable(product)
+        self.message_user(request, f"Sharded the stock of {len(queryset)} products.")
+
+    @admin.action(description="Stop sharding stock of selected products")
+    def unshard_stock(self, request, queryset):
+        products = [product for product in queryset if product.sharded_stock]
+        for product in products:
+            inventory.disable(product)
+        self.message_user(request, f"Folded the stock shards of {len(products)} products.")
 
 
 class CartAdmin(admin.ModelAdmin):
@@ -23,6 +54,8 @@ class CartAdmin(admin.ModelAdmin):
 
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'cart', 'product', 'quantity')
+    # Cart.__str__ shows the user and Product.__str__ the category name
+    list_select_related = ('cart__user', 'product__category')
 
 
 class OrderAdmin(admin.ModelAdmin):
@@ -32,8 +65,24 @@ class OrderAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Read-only: rows only get here through `archive_orders`."""
+    list_display = ('id', 'user', 'total_amount', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('uuid', 'user__email', 'user__username')
+    ordering = ('-created_at',)
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Cart, CartAdmin)
 admin.site.register(CartItem, CartItemAdmin)
-admin.site.register(Order, OrderAdmin)
\ No newline at end of file
+admin.site.register(Order, OrderAdmin)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
\ No newline at end of file
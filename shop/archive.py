@@ -0,0 +1,85 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from Shopsphere.db import immediate_atomic
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+# -----------------------------
+# ORDER ARCHIVE
+# -----------------------------
+# Finished orders are rarely read again but every order query and admin
+# changelist pays for them. `archive_orders` moves completed and cancelled
+# orders older than ORDER_ARCHIVE_AFTER_DAYS into ArchivedOrder /
+# ArchivedOrderItem, keeping their ids and uuids:
+#
+#     BEGIN IMMEDIATE
+#     SELECT id FROM shop_order WHERE status IN (...) AND created_at < ? ORDER BY id LIMIT n
+#     INSERT INTO shop_archivedorder ... ; INSERT INTO shop_archivedorderitem ...
+#     DELETE FROM shop_orderitem ... ; DELETE FROM shop_order ...
+#     COMMIT
+#
+# Each batch is one short transaction, so checkouts only wait for one batch
+# at a time. The selection uses the (status, created_at) index.
+#
+# Order detail lookups (by id or uuid) fall back to the archive; order lists
+# and the cart only ever show live orders. export_orders reads both.
+
+ARCHIVABLE_STATUSES = (Order.STATUS_COMPLETED, Order.STATUS_CANCELLED)
+
+ORDER_FIELDS = ['id', 'uuid', 'user_id', 'total_amount', 'status', 'created_at', 'updated_at', 'placed_at']
+ITEM_FIELDS = [
+    'id', 'order_id', 'product_id', 'quantity', 'price', 'product_name', 'product_slug', 'category_name',
+    'category_id',
+]
+
+
+def get_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(cutoff, statuses=ARCHIVABLE_STATUSES):
+    return Order.objects.filter(status__in=statuses, created_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size, statuses=ARCHIVABLE_STATUSES):
+    """Move up to `batch_size` orders (oldest ids first). Returns (orders, items) moved."""
+    now = timezone.now()
+    with immediate_atomic():
+        ids = list(archivable(cutoff, statuses).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0, 0
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(archived_at=now, **row)
+            for row in Order.objects.filter(pk__in=ids).values(*ORDER_FIELDS)
+        ])
+        items = ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**row) for row in OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS)
+        ])
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(pk__in=ids).delete()
+    return len(ids), len(items)
+
+
+# -----------------------------
+# Detail lookups
+# -----------------------------
+def lookup_filter(value):
+    """Filter kwargs for an order detail URL value (an id or a uuid), or None if it is neither."""
+    if value.isascii() and value.isdecimal():  # isdigit() also accepts '²', which int() rejects
+        return {'pk': int(value)}
+    try:
+        return {'uuid': uuid.UUID(value)}
+    except ValueError:
+        return None
+
+
+def find(user, lookup):
+    """`user`'s archived order matching `lookup` (from lookup_filter), or None."""
+    return ArchivedOrder.objects.filter(user=user, **lookup).prefetch_related('items').first()
@@ -0,0 +1,118 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from Shopsphere.renderers import FastJSONRenderer
+
+from .filters import ProductFilter
+from .models import Category, Product
+from .search import get_backend, tokenize
+from .serializers import CategorySerializer, ProductSerializer
+
+
+# -----------------------------
+# ASYNC CATALOG VIEWS
+# -----------------------------
+# Native async counterparts of the read-only catalog endpoints, for
+# deployments running Shopsphere.asgi. They use the async ORM (acount,
+# aget, async iteration) so a slow client never pins a worker thread, and
+# they render the same JSON as ProductViewSet/CategoryViewSet: same
+# serializers, filters, ordering, search and page-number pagination.
+#
+# They are public reads, so they skip DRF authentication and throttling.
+
+ORDERING_FIELDS = ['price', 'created_at']
+DEFAULT_ORDERING = ['-created_at']
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def not_found(detail):
+    return json_response({'detail': detail}, status=404)
+
+
+def get_ordering(request):
+    """Same rules as OrderingFilter: keep valid terms, else the default."""
+    terms = [term.strip() for term in request.GET.get(api_settings.ORDERING_PARAM, '').split(',')]
+    valid = [term for term in terms if term.lstrip('-') in ORDERING_FIELDS]
+    return valid or DEFAULT_ORDERING
+
+
+async def paginate(request, queryset, serializer_class):
+    page_size = api_settings.PAGE_SIZE
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        number = 0
+    count = await queryset.acount()
+    last_page = max((count + page_size - 1) // page_size, 1)
+    if number < 1 or number > last_page:
+        return None
+
+    offset = (number - 1) * page_size
+    rows = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    if number == 1:
+        previous = None
+    elif number == 2:
+        previous = remove_query_param(url, 'page')
+    else:
+        previous = replace_query_param(url, 'page', number - 1)
+
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', number + 1) if number < last_page else None,
+        'previous': previous,
+        'results': serializer_class(rows, many=True, context={'request': request}).data,
+    }
+
+
+@require_safe
+async def product_list(request):
+    queryset = Product.objects.filter(is_active=True).select_related('category').with_stock_total()
+
+    filterset = ProductFilter(request.GET, queryset=queryset)
+    if not filterset.is_valid():
+        return json_response(filterset.errors, status=400)
+    queryset = filterset.qs.order_by(*get_ordering(request))
+
+    query = request.GET.get(api_settings.SEARCH_PARAM, '')
+    if tokenize(query):
+        queryset, rank_ordering = get_backend().search(queryset, query)
+        if rank_ordering and api_settings.ORDERING_PARAM not in request.GET:
+            queryset = queryset.order_by(*rank_ordering)
+
+    page = await paginate(request, queryset, ProductSerializer)
+    if page is None:
+        return not_found('Invalid page.')
+    return json_response(page)
+
+
+@require_safe
+async def product_detail(request, slug):
+    try:
+        product = await Product.objects.select_related('category').with_stock_total().aget(slug=slug, is_active=True)
+    except Product.DoesNotExist:
+        return not_found('No Product matches the given query.')
+    return json_response(ProductSerializer(product, context={'request': request}).data)
+
+
+@require_safe
+async def category_list(request):
+    page = await paginate(request, Category.objects.all().order_by('name'), CategorySerializer)
+    if page is None:
+        return not_found('Invalid page.')
+    return json_response(page)
+
+
+@require_safe
+async def category_detail(request, pk):
+    try:
+        category = await Category.objects.aget(pk=pk)
+    except Category.DoesNotExist:
+        return not_found('No Category matches the given query.')
+    return json_response(CategorySerializer(category).data)
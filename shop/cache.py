@@ -0,0 +1,192 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from Shopsphere import routers
+
+
+# -----------------------------
+# CATALOG CACHE
+# -----------------------------
+# Read-through cache for the public catalog endpoints.
+#
+# Entries are never deleted on writes. Instead every key embeds a version
+# counter, and saving/deleting a Product or Category bumps the counters it
+# affects so stale entries simply stop being addressed and age out.
+#
+# - The global version covers unfiltered product lists and slug detail
+#   responses, and is bumped by any Product or Category change.
+# - A per-category version covers product lists filtered by
+#   `?category=<slug>`, so editing a book does not throw away the cached
+#   electronics pages.
+# - The categories version covers the category endpoints and is mixed into
+#   category-filtered lists so renaming a category still invalidates them.
+#
+# With read replicas configured, a bump also marks the catalog as recently
+# written for REPLICA_STICKY_SECONDS, and entries rebuilt in that window are
+# read from the primary: built from a lagging replica, they would cache the
+# old rows under the new version.
+
+KEY_PREFIX = 'catalog'
+GLOBAL_SCOPE = 'global'
+CATEGORIES_SCOPE = 'categories'
+
+RECENT_WRITE_KEY = f'{KEY_PREFIX}:recent-write'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def _version_key(scope):
+    return f'{KEY_PREFIX}:v:{scope}'
+
+
+def category_scope(slug):
+    return f'cat:{slug}'
+
+
+def get_versions(*scopes):
+    """Return the current version of each scope, initialising missing ones."""
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # `add` keeps the first writer's value if two workers race here
+            cache.add(key, 1, timeout=None)
+            found[key] = cache.get(key, 1)
+        versions.append(found[key])
+    return versions
+
+
+def bump(*scopes):
+    """Invalidate every entry built under the given scopes."""
+    cache = get_cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Key missing/evicted: any value other than the old one will do
+            cache.set(key, time.time_ns(), timeout=None)
+    if routers.get_replicas():
+        cache.set(RECENT_WRITE_KEY, 1, timeout=routers.get_sticky_seconds())
+
+
+def recently_written():
+    """Whether the replicas may not have caught up with the last catalog write yet."""
+    return bool(routers.get_replicas()) and get_cache().get(RECENT_WRITE_KEY) is not None
+
+
+def invalidate_products(products):
+    """Bump the scopes covering `products` (for writes that bypass model signals)."""
+    scopes = {GLOBAL_SCOPE}
+    scopes.update(category_scope(product.category.slug) for product in products)
+    bump(*scopes)
+
+
+def build_key(namespace, request, scopes):
+    """
+    Build a cache key from the request's host, path and query string plus
+    the current version of each scope. Query parameters are sorted so that
+    `?a=1&b=2` and `?b=2&a=1` share an entry.
+    """
+    params = sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+    raw = f'{request.get_host()}|{request.path}|{params}'
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    versions = '.'.join(str(v) for v in get_versions(*scopes))
+    return f'{KEY_PREFIX}:{namespace}:{versions}:{digest}'
+
+
+def get_or_build(key, builder):
+    """
+    Return the cached value for `key`, calling `builder()` on a miss.
+
+    Only one caller rebuilds a cold key: the others poll until the value
+    appears or the lock expires, then fall back to building it themselves
+    rather than blocking forever. Returns a `(value, hit)` tuple.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        record_hit()
+        return value, True
+
+    record_miss()
+    lock_key = f'{key}:lock'
+    lock_timeout = getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 10)
+    token = uuid.uuid4().hex
+
+    if not cache.add(lock_key, token, timeout=lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key)
+            if value is not None:
+                return value, True
+            if cache.get(lock_key) is None:
+                break
+        # Holder died or was too slow - build it ourselves
+        value = builder()
+        cache.set(key, value, timeout=get_timeout())
+        return value, False
+
+    try:
+        value = builder()
+        cache.set(key, value, timeout=get_timeout())
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    return value, False
+
+
+# -----------------------------
+# HIT / MISS COUNTERS
+# -----------------------------
+def _incr(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def record_hit():
+    _incr(HITS_KEY)
+
+
+def record_miss():
+    _incr(MISSES_KEY)
+
+
+def stats():
+    """Return hit/miss counters shared by every worker using the cache."""
+    found = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = found.get(HITS_KEY, 0)
+    misses = found.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,201 @@
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import Category, FacetCount, Product
+
+
+# -----------------------------
+# PRODUCT FACETS
+# -----------------------------
+# Sidebar counts for the product list: products per category and per price
+# range. Each facet ignores its own filter (picking "Books" still shows how
+# many products the other categories have) but honours every other filter
+# and the search query.
+#
+# Live counts cost one GROUP BY query per facet. With
+# settings.PRODUCT_FACET_COUNT_TABLE enabled, the unfiltered sidebar is read
+# from the FacetCount table instead, which product signals keep current by
+# applying +1/-1 deltas and `rebuild_facet_counts` recomputes after bulk writes.
+
+DEFAULT_PRICE_RANGES = '-25,25-50,50-100,100-500,500-'
+
+
+class InvalidRanges(ValueError):
+    pass
+
+
+def parse_price_ranges(value=None):
+    """
+    Parse 'lo-hi,lo-hi,...' into [(Decimal|None, Decimal|None), ...].
+    Bounds are inclusive below and exclusive above; a blank side is open.
+    """
+    value = value or getattr(settings, 'PRODUCT_PRICE_FACETS', DEFAULT_PRICE_RANGES)
+    ranges = []
+    for part in value.split(','):
+        low, sep, high = part.strip().partition('-')
+        if not sep:
+            raise InvalidRanges(f"Invalid price range {part!r}; use 'min-max' with either side optional.")
+        try:
+            bounds = tuple(Decimal(bound) if bound.strip() else None for bound in (low, high))
+        except InvalidOperation:
+            raise InvalidRanges(f"Invalid price range {part!r}.")
+        if bounds[0] is not None and bounds[1] is not None and bounds[0] >= bounds[1]:
+            raise InvalidRanges(f"Invalid price range {part!r}; min must be below max.")
+        ranges.append(bounds)
+    return ranges
+
+
+def range_key(low, high):
+    return f"{'' if low is None else low}-{'' if high is None else high}"
+
+
+def range_q(low, high):
+    q = models.Q()
+    if low is not None:
+        q &= models.Q(price__gte=low)
+    if high is not None:
+        q &= models.Q(price__lt=high)
+    return q
+
+
+def bucket_for(price, ranges):
+    """Keys of every configured range containing `price` (ranges may overlap)."""
+    return [
+        range_key(low, high) for low, high in ranges
+        if (low is None or price >= low) and (high is None or price < high)
+    ]
+
+
+# -----------------------------
+# Live counts (grouped aggregates)
+# -----------------------------
+def category_counts(queryset):
+    rows = (
+        queryset.order_by()
+        .values('category__slug', 'category__name')
+        .annotate(count=models.Count('id'))
+        .order_by('category__name')
+    )
+    return [
+        {'slug': row['category__slug'], 'name': row['category__name'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def price_counts(queryset, ranges):
+    aggregates = {
+        f'range_{index}': models.Count('id', filter=range_q(low, high))
+        for index, (low, high) in enumerate(ranges)
+    }
+    counts = queryset.order_by().aggregate(**aggregates)
+    return [
+        {
+            'min': None if low is None else str(low),
+            'max': None if high is None else str(high),
+            'count': counts[f'range_{index}'],
+        }
+        for index, (low, high) in enumerate(ranges)
+    ]
+
+
+# -----------------------------
+# Precomputed table
+# -----------------------------
+def table_enabled():
+    return getattr(settings, 'PRODUCT_FACET_COUNT_TABLE', False)
+
+
+def precomputed_counts(ranges):
+    """Unfiltered facets from FacetCount, or None when the table can't answer."""
+    if not table_enabled():
+        return None
+    rows = {(row.facet, row.key): row.count for row in FacetCount.objects.all()}
+    if (FacetCount.FACET_META, FacetCount.KEY_BUILT) not in rows:
+        return None
+    price_keys = [range_key(low, high) for low, high in ranges]
+    if any((FacetCount.FACET_PRICE, key) not in rows for key in price_keys):
+        return None  # ranges differ from the ones the table was built with
+
+    category_ids = {
+        int(key): count for (facet, key), count in rows.items()
+        if facet == FacetCount.FACET_CATEGORY and count > 0
+    }
+    categories = Category.objects.filter(pk__in=category_ids).order_by('name')
+    return {
+        'category': [
+            {'slug': category.slug, 'name': category.name, 'count': category_ids[category.pk]}
+            for category in categories
+        ],
+        'price': [
+            {
+                'min': None if low is None else str(low),
+                'max': None if high is None else str(high),
+                'count': rows[(FacetCount.FACET_PRICE, range_key(low, high))],
+            }
+            for low, high in ranges
+        ],
+    }
+
+
+def contribution(category_id, price, is_active, ranges):
+    """The FacetCount rows one product adds 1 to."""
+    if not is_active:
+        return Counter()
+    keys = Counter({(FacetCount.FACET_CATEGORY, str(category_id)): 1})
+    keys.update((FacetCount.FACET_PRICE, key) for key in bucket_for(price, ranges))
+    return keys
+
+
+def apply_change(before, after):
+    """
+    Move one product's contribution from `before` to `after`; each is a
+    (category_id, price, is_active) tuple or None for "did not exist".
+    """
+    if not table_enabled():
+        return
+    ranges = parse_price_ranges()
+    delta = Counter()
+    if after:
+        delta.update(contribution(*after, ranges))
+    if before:
+        delta.subtract(contribution(*before, ranges))
+    delta = {key: change for key, change in delta.items() if change}
+    if not delta:
+        return
+
+    with transaction.atomic():
+        if not FacetCount.objects.filter(facet=FacetCount.FACET_META, key=FacetCount.KEY_BUILT).exists():
+            return
+        for (facet, key), change in delta.items():
+            updated = FacetCount.objects.filter(facet=facet, key=key).update(count=models.F('count') + change)
+            if not updated:
+                FacetCount.objects.create(facet=facet, key=key, count=max(change, 0))
+
+
+def rebuild():
+    """Recompute the table from scratch with two grouped queries."""
+    ranges = parse_price_ranges()
+    active = Product.objects.filter(is_active=True)
+    per_category = active.order_by().values('category_id').annotate(count=models.Count('id'))
+    prices = price_counts(active, ranges)
+
+    rows = [FacetCount(facet=FacetCount.FACET_META, key=FacetCount.KEY_BUILT, count=1)]
+    rows += [
+        FacetCount(facet=FacetCount.FACET_CATEGORY, key=str(row['category_id']), count=row['count'])
+        for row in per_category
+    ]
+    rows += [
+        FacetCount(
+            facet=FacetCount.FACET_PRICE,
+            key=range_key(*bounds),
+            count=bucket['count'],
+        )
+        for bounds, bucket in zip(ranges, prices)
+    ]
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows)
+    return len(rows) - 1
@@ -1,5 +1,6 @@
 import django_filters
 from .models import Product
+from . import facets
 
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
@@ -9,3 +10,21 @@ class ProductFilter(django_filters.FilterSet):
     class Meta:
         model = Product
         fields = ["category", "min_price", "max_price"]
+
+    def facet_counts(self, price_ranges=None):
+        """
+        Product counts per category and per price range for the current
+        filters. Each facet ignores its own filters so the sidebar still
+        shows the alternatives to what is selected.
+        """
+        ranges = price_ranges or facets.parse_price_ranges()
+        return {
+            'category': facets.category_counts(self.without('category')),
+            'price': facets.price_counts(self.without('min_price', 'max_price'), ranges),
+        }
+
+    def without(self, *names):
+        data = self.data.copy()
+        for name in names:
+            data.pop(name, None)
+        return type(self)(data, queryset=self.queryset, request=self.request).qs
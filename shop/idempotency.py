@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from Shopsphere.db import immediate_atomic
+from Shopsphere.middleware import extend_query_budget
+
+from .models import IdempotencyKey
+
+
+# -----------------------------
+# IDEMPOTENCY KEYS
+# -----------------------------
+# Mobile clients retry checkout and cart writes on timeouts. Checkout and
+# every cart mutation (add, remove, batch, clear) are covered. A request sent
+# with an `Idempotency-Key: <client-chosen id>` header runs once per user and
+# key; retries with the same key get the stored response back (with
+# `Idempotent-Replayed: true`) without touching the cart, stock or orders.
+#
+# 1. The first request claims the key by inserting an IdempotencyKey row in
+#    its own transaction; the (user, key) unique constraint lets exactly one
+#    of several concurrent duplicates win.
+# 2. The view runs in one transaction with the write that stores its
+#    response, so a crash can't leave an order committed without the stored
+#    response (or the other way round).
+# 3. Duplicates that lose the claim poll the row until the response is
+#    stored (up to IDEMPOTENCY_WAIT_TIMEOUT, then 409) instead of running.
+#
+# Responses the view returns with a status below 500 are stored for
+# IDEMPOTENCY_KEY_TTL seconds. A request that raises - including DRF's 4xx
+# exceptions such as ValidationError or NotFound - or returns a 5xx has its
+# transaction rolled back and releases the key, so a retry runs again from
+# scratch. A claim older than IDEMPOTENCY_LOCK_TIMEOUT with no response (its
+# worker died) can be taken over. Reusing a key for a
+# different request is a 422. `purge_idempotency_keys` deletes expired rows.
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Claim, wrapping transaction and the stored response, added to the view's query budget
+QUERY_COST = 8
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed. Retry later.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600))
+
+
+def request_hash(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    try:
+        digest.update(request.body)  # Django keeps the bytes, so DRF can still parse them
+    except RawPostDataException:  # already streamed into request.data
+        digest.update(json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder).encode())
+    return digest.hexdigest()
+
+
+# -----------------------------
+# Claiming a key
+# -----------------------------
+def claim(user, key, fingerprint):
+    """Insert the in-progress row for `key`; None if another request holds it."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, key=key, request_hash=fingerprint, started_at=now, expires_at=now + get_ttl(),
+            )
+    except IntegrityError:
+        return None
+
+
+def acquire(user, key, fingerprint):
+    """
+    Returns (row, owned): the row this request now owns and must complete,
+    or a completed row to replay. Waits while another request holds the key.
+    """
+    lock_timeout = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    delay = 0.02
+    while True:
+        record = claim(user, key, fingerprint)
+        if record is not None:
+            return record, True
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        now = timezone.now()
+        if record is None:
+            pass  # the holder failed and released it; claim again after the pause
+        elif record.expires_at <= now:
+            # Expired: the key is free again, for this request or any other
+            if IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).update(
+                request_hash=fingerprint, status_code=None, response=None, started_at=now, expires_at=now + get_ttl(),
+            ):
+                return record, True
+        elif record.request_hash != fingerprint:
+            raise IdempotencyKeyMismatch()
+        elif record.status_code is not None:
+            return record, False
+        elif record.started_at <= now - lock_timeout:
+            # Its worker died mid-request; whoever updates the row first takes over
+            if IdempotencyKey.objects.filter(pk=record.pk, started_at=record.started_at).update(started_at=now):
+                record.started_at = now
+                return record, True
+
+        if time.monotonic() + delay > deadline:
+            raise IdempotencyConflict()
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+
+
+def replay(record):
+    response = Response(record.response, status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+# -----------------------------
+# View decorator
+# -----------------------------
+def idempotent(view):
+    """
+    Make a viewset action honour the Idempotency-Key header. Requests without
+    the header run as before. Put it above any @immediate_atomic() of the
+    action so the key is claimed outside the action's transaction.
+    """
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return view(self, request, *args, **kwargs)
+        if not key.strip() or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Must be 1 to {MAX_KEY_LENGTH} characters.'})
+
+        extend_query_budget(request, QUERY_COST)
+        record, owned = acquire(request.user, key, request_hash(request))
+        if not owned:
+            return replay(record)
+
+        try:
+            with immediate_atomic():
+                response = view(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        status_code=response.status_code, response=response.data
+                    )
+                else:
+                    # Not stored, so a retry runs again: it must find nothing done
+                    transaction.set_rollback(True)
+        except BaseException:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            raise
+        if response.status_code >= 500:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return response
+    return wrapper
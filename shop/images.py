@@ -0,0 +1,174 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from . import cache as catalog_cache
+from .models import Product
+
+
+logger = logging.getLogger('shopsphere.images')
+
+
+# -----------------------------
+# PRODUCT IMAGE VARIANTS
+# -----------------------------
+# Listing pages should not download multi-megabyte originals for 160px
+# thumbnails. When a product's image changes, each width in
+# settings.PRODUCT_IMAGE_VARIANTS is rendered (WebP by default) and stored
+# next to the original:
+#
+#     products/lamp.jpg -> products/lamp.thumb.webp, products/lamp.medium.webp, ...
+#
+# and recorded on Product.image_variants as
+#
+#     {'source': 'products/lamp.jpg', 'sizes': {'thumb': {'name': ..., 'width': 160, 'height': 120}, ...}}
+#
+# `source` says which upload the sizes belong to, so a replaced image never
+# serves the previous one's variants while its own are being rendered.
+# Widths at or above the original's are skipped - nothing is upscaled.
+#
+# Rendering runs after commit on a small thread pool (PRODUCT_IMAGE_WORKERS;
+# 0 renders inline). Pillow releases the GIL while decoding, resizing and
+# encoding, so threads render in parallel. `generate_image_variants`
+# backfills existing images.
+
+DEFAULT_VARIANTS = {'thumb': 160, 'small': 320, 'medium': 640, 'large': 1280}
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_variants():
+    return getattr(settings, 'PRODUCT_IMAGE_VARIANTS', DEFAULT_VARIANTS)
+
+
+def get_format():
+    return getattr(settings, 'PRODUCT_IMAGE_FORMAT', 'WEBP').upper()
+
+
+def get_storage():
+    return Product._meta.get_field('image').storage
+
+
+def variant_name(name, variant):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{variant}.{EXTENSIONS[get_format()]}'
+
+
+def is_stale(product):
+    """Whether `product` has an image whose variants have not been rendered."""
+    return bool(product.image) and (product.image_variants or {}).get('source') != product.image.name
+
+
+# -----------------------------
+# Rendering
+# -----------------------------
+def render(original, width, fmt):
+    height = max(round(original.height * width / original.width), 1)
+    resized = original.resize((width, height), Image.Resampling.LANCZOS)
+    if fmt == 'JPEG' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')
+    buffer = io.BytesIO()
+    resized.save(buffer, fmt, quality=getattr(settings, 'PRODUCT_IMAGE_QUALITY', 80))
+    return buffer.getvalue(), height
+
+
+def generate(name):
+    """Render every variant of the stored image `name`; returns the `sizes` map."""
+    storage = get_storage()
+    fmt = get_format()
+    with storage.open(name, 'rb') as f, Image.open(f) as image:
+        original = ImageOps.exif_transpose(image)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info or 'A' in original.mode else 'RGB')
+
+    sizes = {}
+    for variant, width in sorted(get_variants().items(), key=lambda item: item[1]):
+        if width >= original.width:
+            continue
+        content, height = render(original, width, fmt)
+        target = variant_name(name, variant)
+        storage.delete(target)  # re-renders overwrite instead of piling up suffixed copies
+        sizes[variant] = {'name': storage.save(target, ContentFile(content)), 'width': width, 'height': height}
+    return sizes
+
+
+def process(product_id, name):
+    """
+    Render and record the variants of `name` for a product. Returns False
+    when the image could not be read or the product has moved on to another
+    image in the meantime.
+    """
+    try:
+        sizes = generate(name)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning("Could not render variants of %s for product %s: %s", name, product_id, e)
+        return False
+    # update() skips the model signals, which would only schedule this again
+    updated = Product.objects.filter(pk=product_id, image=name).update(
+        image_variants={'source': name, 'sizes': sizes}
+    )
+    if updated:
+        catalog_cache.invalidate_products(Product.objects.select_related('category').filter(pk=product_id))
+    return bool(updated)
+
+
+def process_in_worker(product_id, name):
+    try:
+        return process(product_id, name)
+    finally:
+        connection.close()  # the pool's threads would otherwise each hold one open
+
+
+# -----------------------------
+# Worker pool
+# -----------------------------
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PRODUCT_IMAGE_WORKERS, thread_name_prefix='product-images'
+            )
+        return _executor
+
+
+def schedule(product):
+    """Render `product`'s image variants once the current transaction commits."""
+    product_id, name = product.pk, product.image.name
+    if getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2):
+        transaction.on_commit(lambda: get_executor().submit(process_in_worker, product_id, name))
+    else:
+        transaction.on_commit(lambda: process(product_id, name))
+
+
+# -----------------------------
+# Serialization
+# -----------------------------
+def file_url(name, request=None):
+    # Mirrors rest_framework.fields.FileField.to_representation
+    if not name:
+        return None
+    url = get_storage().url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def variant_urls(image, variants, request=None):
+    """The API's `image_variants` map for an image name and its recorded variants."""
+    if not image or not variants or variants.get('source') != image:
+        return {}
+    return {
+        variant: {'url': file_url(size['name'], request), 'width': size['width'], 'height': size['height']}
+        for variant, size in variants['sizes'].items()
+    }
@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import Product, StockShard
+
+
+# -----------------------------
+# SHARDED STOCK
+# -----------------------------
+# Checkout decrements stock with a guarded UPDATE on the product row, so on a
+# flash sale every buyer of the same product queues behind one row lock.
+# Sharding is opt-in per product: its stock is split across
+# PRODUCT_STOCK_SHARDS StockShard rows and each checkout line decrements one
+# random shard that can cover it,
+#
+#     UPDATE shop_stockshard SET stock = stock - q
+#     WHERE id = (SELECT id ... WHERE product_id = p AND stock >= q ORDER BY RANDOM() LIMIT 1)
+#       AND stock >= q
+#
+# so concurrent buyers mostly lock different rows. The `stock >= q` guard
+# means a shard can never go negative, whatever the isolation level.
+#
+# A sharded product's own `stock` column becomes a reserve: restocking in
+# the admin adds to it and the next rebalance spreads it over the shards
+# (import_catalog, whose feeds carry totals, replaces the shards instead -
+# see reset_totals). The available total is reserve + shards, which
+# ProductQuerySet.with_stock_total() annotates for reads.
+#
+# When no single shard can cover a line - shards run low unevenly, or the
+# product is nearly sold out - the checkout rebalances: it locks the product
+# and its shards, pools everything and spreads it again, over fewer shards if
+# needed so at least one can cover the line, and retries once.
+#
+# Row locks are what sharding relieves. SQLite locks the whole database for
+# each write transaction, so there shards only cost a little; see
+# benchmark_stock_contention.
+
+DEFAULT_SHARDS = 8
+
+
+def get_shard_count():
+    return getattr(settings, 'PRODUCT_STOCK_SHARDS', DEFAULT_SHARDS)
+
+
+def split(total, shards, need=1):
+    """
+    Spread `total` over `shards` counters as evenly as possible, using only as
+    many as keep each at `need` or more (the rest get 0).
+    """
+    used = max(1, min(shards, total // max(need, 1)))
+    base, extra = divmod(total, used)
+    return [base + (1 if i < extra else 0) for i in range(used)] + [0] * (shards - used)
+
+
+def available(product):
+    """Stock a product can sell, preferring a `stock_total` annotation when present."""
+    total = getattr(product, 'stock_total', None)
+    if total is not None:
+        return total
+    if not product.sharded_stock:
+        return product.stock
+    return product.stock + (product.stock_shards.aggregate(total=models.Sum('stock'))['total'] or 0)
+
+
+# -----------------------------
+# Turning sharding on and off
+# -----------------------------
+def enable(product, shards=None):
+    """Split `product`'s stock across `shards` counters (re-splits if already sharded)."""
+    shards = shards or get_shard_count()
+    if shards < 1:
+        raise ValueError("A sharded product needs at least one shard")
+    with transaction.atomic():
+        total = _lock_and_pool(product.pk)
+        StockShard.objects.filter(product_id=product.pk).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product.pk, index=index, stock=stock)
+            for index, stock in enumerate(split(total, shards))
+        ])
+        Product.objects.filter(pk=product.pk).update(stock=0, sharded_stock=True)
+    product.stock, product.sharded_stock = 0, True
+    return total
+
+
+def disable(product):
+    """Fold the shards back into `product.stock`."""
+    with transaction.atomic():
+        total = _lock_and_pool(product.pk)
+        StockShard.objects.filter(product_id=product.pk).delete()
+        Product.objects.filter(pk=product.pk).update(stock=total, sharded_stock=False)
+    product.stock, product.sharded_stock = total, False
+    return total
+
+
+def _lock_and_pool(product_id):
+    # Product row first, then shards: the same order as rebalance(), so they can't deadlock
+    reserve = Product.objects.select_for_update().filter(pk=product_id).values_list('stock', flat=True).get()
+    # Aggregates can't be taken FOR UPDATE, so the counts are summed here
+    counts = StockShard.objects.select_for_update().filter(product_id=product_id).values_list('stock', flat=True)
+    return reserve + sum(counts)
+
+
+# -----------------------------
+# Checkout
+# -----------------------------
+def rebalance(product_id, need=1):
+    """
+    Pool a sharded product's reserve and shards and spread them again so at
+    least one shard holds `need`, if the total allows. Returns the total.
+    A product flagged sharded without any shard rows keeps its reserve.
+    """
+    with transaction.atomic():
+        reserve = Product.objects.select_for_update().filter(pk=product_id).values_list('stock', flat=True).get()
+        shards = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('index'))
+        if not shards:
+            # Nowhere to move it: zeroing the reserve would destroy the stock
+            return reserve
+        total = reserve + sum(shard.stock for shard in shards)
+        for shard, stock in zip(shards, split(total, len(shards), need)):
+            shard.stock = stock
+        StockShard.objects.bulk_update(shards, ['stock'])
+        if reserve:
+            Product.objects.filter(pk=product_id).update(stock=0)
+    return total
+
+
+def _take_from_random_shard(product_id, quantity):
+    candidate = (
+        StockShard.objects.filter(product_id=product_id, stock__gte=quantity)
+        .order_by('?').values('pk')[:1]
+    )
+    return StockShard.objects.filter(pk=models.Subquery(candidate), stock__gte=quantity).update(
+        stock=models.F('stock') - quantity
+    )
+
+
+def take(product_id, quantity):
+    """
+    Decrement `quantity` of a sharded product. Returns False, having changed
+    nothing, when the product doesn't have that much. Run it inside the
+    checkout transaction so a later failure puts the stock back.
+    """
+    if _take_from_random_shard(product_id, quantity):
+        return True
+    # No shard covers it alone, or another buyer just emptied the one picked
+    if rebalance(product_id, need=quantity) < quantity:
+        return False
+    return bool(_take_from_random_shard(product_id, quantity))
+
+
+def reset_totals(products):
+    """
+    Make `stock` the new total of the sharded ones among `products`, for
+    writers that set it as such (import_catalog): the shards are zeroed and
+    the reserve spread over them.
+    """
+    product_ids = [product.pk for product in products if product.sharded_stock]
+    if not product_ids:
+        return
+    with transaction.atomic():
+        StockShard.objects.filter(product_id__in=product_ids).update(stock=0)
+        for product_id in product_ids:
+            rebalance(product_id)
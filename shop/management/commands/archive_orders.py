@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into the archive "
+        "tables, one short transaction per batch. Reports throughput and how long each batch held "
+        "the write lock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive orders created more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Orders moved per transaction")
+        parser.add_argument(
+            '--pause', type=float, default=0.0, help="Seconds to sleep between batches, to let checkouts through",
+        )
+        parser.add_argument('--limit', type=int, help="Stop after archiving about this many orders")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the orders that would be archived")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError("--days cannot be negative")
+
+        cutoff = archive.get_cutoff(options['days'])
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count} orders created before {cutoff:%Y-%m-%d %H:%M} would be archived.")
+            return
+
+        orders = items = batches = 0
+        locks = []
+        started = time.perf_counter()
+        while options['limit'] is None or orders < options['limit']:
+            batch_started = time.perf_counter()
+            moved, lines = archive.archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            locks.append(time.perf_counter() - batch_started)
+            orders, items, batches = orders + moved, items + lines, batches + 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"batch {batches}: {moved} orders, {lines} items, {locks[-1] * 1000:.1f} ms")
+            if options['pause']:
+                time.sleep(options['pause'])
+        elapsed = time.perf_counter() - started
+
+        if not orders:
+            self.stdout.write(f"No orders created before {cutoff:%Y-%m-%d %H:%M} to archive.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {orders} orders ({items} items) in {batches} batches, {elapsed:.1f}s "
+            f"({orders / elapsed:.0f} orders/s)."
+        ))
+        self.stdout.write(
+            f"Lock held per batch: avg {sum(locks) / len(locks) * 1000:.1f} ms, max {max(locks) * 1000:.1f} ms"
+        )
@@ -0,0 +1,130 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+
+# Throttle counters and the catalog cache go to a dummy backend so both
+# servers do the same database work on every request.
+BENCHMARK_SETTINGS = {
+    'CACHES': {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+    'THROTTLE_CACHE_ALIAS': 'benchmark',
+    'CATALOG_CACHE_ALIAS': 'benchmark',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare catalog read throughput of the sync DRF endpoints behind WSGI (fixed thread pool) "
+        "with the async endpoints behind ASGI (single event loop), at high concurrency with slow clients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per run")
+        parser.add_argument('--concurrency', type=int, default=500, help="Simultaneous client connections")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads (e.g. gunicorn --threads)")
+        parser.add_argument(
+            '--client-delay', type=float, default=0.25,
+            help="Seconds each client takes to read its response (slow mobile clients)",
+        )
+        parser.add_argument('--path', default='products/', help="Catalog path under /api/shop/")
+
+    def handle(self, *args, **options):
+        with override_settings(**BENCHMARK_SETTINGS):
+            wsgi = self.run_wsgi(f"/api/shop/{options['path']}", options)
+            asgi = asyncio.run(self.run_asgi(f"/api/shop/async/{options['path']}", options))
+
+        self.stdout.write(
+            f"{options['requests']} requests, {options['concurrency']} concurrent clients, "
+            f"{options['client_delay'] * 1000:.0f} ms client read time"
+        )
+        for label, (elapsed, latencies) in [(f"WSGI ({options['threads']} threads)", wsgi), ("ASGI (1 loop)", asgi)]:
+            self.report(label, elapsed, latencies, options['requests'])
+        self.stdout.write(f"ASGI/WSGI throughput: {wsgi[0] / asgi[0]:.2f}x")
+
+    def report(self, label, elapsed, latencies, total):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{label:<20} {total / elapsed:8.1f} req/s   "
+            f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+        )
+
+    # -----------------------------
+    # WSGI: each request holds a thread until its client has read the body
+    # -----------------------------
+    def run_wsgi(self, path, options):
+        application = get_wsgi_application()
+        delay = options['client_delay']
+
+        def request(queued):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '443', 'HTTP_HOST': 'localhost',
+                'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(),
+                'wsgi.errors': io.StringIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False, 'wsgi.version': (1, 0),
+            }
+            statuses = []
+            body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+            time.sleep(delay)  # the worker thread waits on the slow socket
+            if not statuses[0].startswith('200') or not body:
+                raise RuntimeError(f"WSGI request failed: {statuses[0]}")
+            return time.perf_counter() - queued
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            started = time.perf_counter()
+            # Latency counts from when the client connected, including time queued for a thread
+            futures = [pool.submit(request, time.perf_counter()) for _ in range(options['requests'])]
+            latencies = [future.result() for future in futures]
+        return time.perf_counter() - started, latencies
+
+    # -----------------------------
+    # ASGI: slow clients only park a coroutine
+    # -----------------------------
+    async def run_asgi(self, path, options):
+        application = get_asgi_application()
+        delay = options['client_delay']
+        gate = asyncio.Semaphore(options['concurrency'])
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'https', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': b'', 'headers': [(b'host', b'localhost')],
+            'server': ('localhost', 443), 'client': ('127.0.0.1', 50000),
+        }
+
+        async def request():
+            started = time.perf_counter()
+            async with gate:
+                sent = asyncio.Event()
+                messages = []
+
+                async def receive():
+                    if not messages:
+                        messages.append('body')
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    await sent.wait()
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start' and message['status'] != 200:
+                        raise RuntimeError(f"ASGI request failed: {message['status']}")
+                    if message['type'] == 'http.response.body' and not message.get('more_body'):
+                        await asyncio.sleep(delay)  # the coroutine waits on the slow socket
+                        sent.set()
+
+                await application(dict(scope), receive, send)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return time.perf_counter() - started, latencies
@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from account.models import User
+from Shopsphere.db import sqlite_options
+from shop.models import Cart, Category, Product
+
+
+# Throttling and the catalog cache are switched off so only the database differs
+BENCHMARK_SETTINGS = {
+    'CACHES': {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+    'THROTTLE_CACHE_ALIAS': 'benchmark',
+    'CATALOG_CACHE_ALIAS': 'benchmark',
+    'IDENTITY_CACHE_ALIAS': 'benchmark',
+}
+
+# 'stock' resets the journal too: WAL mode is stored in the database file
+PROFILES = {
+    'stock': {
+        'OPTIONS': {'init_command': 'PRAGMA journal_mode=DELETE'},
+        'CONN_MAX_AGE': 0,
+        'SQLITE_IMMEDIATE_WRITES': False,
+    },
+    'production': {
+        'OPTIONS': sqlite_options('production'),
+        'CONN_MAX_AGE': 60,
+        'SQLITE_IMMEDIATE_WRITES': True,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent add-to-cart + checkout cycles against a copy of the SQLite database, "
+        "once with Django's stock connection settings and once with the production profile"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent shoppers (threads)")
+        parser.add_argument('--checkouts', type=int, default=25, help="Checkouts per shopper")
+        parser.add_argument('--items', type=int, default=3, help="Products added to the cart before each checkout")
+
+    def handle(self, *args, **options):
+        database = connections['default'].settings_dict
+        if database['ENGINE'] != 'django.db.backends.sqlite3' or connections['default'].is_in_memory_db():
+            raise CommandError("This benchmark needs a file-backed SQLite database.")
+
+        original = {key: database[key] for key in ('NAME', 'OPTIONS', 'CONN_MAX_AGE')}
+        self.stdout.write(
+            f"{options['workers']} shoppers x {options['checkouts']} checkouts, "
+            f"{options['items']} cart adds per checkout"
+        )
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                for name, profile in PROFILES.items():
+                    path = os.path.join(tmp, f'{name}.sqlite3')
+                    self.copy_database(original['NAME'], path)
+                    connections.close_all()
+                    database.update(NAME=path, OPTIONS=profile['OPTIONS'], CONN_MAX_AGE=profile['CONN_MAX_AGE'])
+                    with override_settings(SQLITE_IMMEDIATE_WRITES=profile['SQLITE_IMMEDIATE_WRITES'], **BENCHMARK_SETTINGS):
+                        results[name] = self.run(options)
+                    connections.close_all()
+                    self.report(name, *results[name])
+        finally:
+            connections.close_all()
+            database.update(original)
+
+        stock, production = (len(results[name][1]) / results[name][0] for name in ('stock', 'production'))
+        if stock:
+            self.stdout.write(f"Throughput change: {production / stock:.1f}x")
+
+    def copy_database(self, source, target):
+        # The backup API copies a consistent snapshot, WAL contents included
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+
+    def report(self, name, elapsed, latencies, errors):
+        # A cycle fails when any of its requests does, almost always with "database is locked"
+        done = len(latencies)
+        if not done:
+            self.stdout.write(f"{name:<11} no checkout succeeded, {errors} errors")
+            return
+        latencies = sorted(latencies)
+        p95 = latencies[min(int(done * 0.95), done - 1)]
+        self.stdout.write(
+            f"{name:<11} {done / elapsed:7.1f} checkouts/s   p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+            f"p95 {p95 * 1000:7.1f} ms   {errors} cycles failed"
+        )
+
+    # -----------------------------
+    # One run
+    # -----------------------------
+    def setup_shoppers(self, options):
+        category, _ = Category.objects.get_or_create(slug='benchmark-checkout', defaults={'name': 'Benchmark Checkout'})
+        stock = options['workers'] * options['checkouts'] * 2
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Checkout Benchmark {i}', slug=f'checkout-benchmark-{i}', price=Decimal('9.99'),
+                stock=stock, category=category,
+            )
+            for i in range(options['items'])
+        ])
+        users = User.objects.bulk_create([
+            User(
+                email=f'checkout-benchmark-{i}@example.com', username=f'checkout-benchmark-{i}',
+                name='Benchmark', country='NG', password='!',
+            )
+            for i in range(options['workers'])
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        for user, cart in zip(users, carts):
+            user.cart_pk = cart.pk  # as CachedJWTAuthentication would resolve it
+        return users, [product.pk for product in products]
+
+    def run(self, options):
+        users, product_ids = self.setup_shoppers(options)
+        connections.close_all()
+        latencies, errors = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(len(users) + 1)
+
+        def shop(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                start.wait()
+                for _ in range(options['checkouts']):
+                    began = time.perf_counter()
+                    try:
+                        for product_id in product_ids:
+                            response = client.post(
+                                '/api/shop/cart/add/', {'product_id': product_id}, format='json', secure=True
+                            )
+                            if response.status_code != 200:
+                                raise RuntimeError(f"cart add returned {response.status_code}")
+                        response = client.post('/api/shop/orders/checkout/', secure=True)
+                        if response.status_code != 201:
+                            raise RuntimeError(f"checkout returned {response.status_code}")
+                    except Exception as e:  # "database is locked" surfaces as OperationalError
+                        with lock:
+                            errors.append(e)
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - began)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=shop, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, latencies, len(errors)
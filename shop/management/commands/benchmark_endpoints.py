@@ -0,0 +1,257 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from account.models import User
+from shop.models import CartItem, Category, Order, Product
+from .generate_dataset import NOUNS, PASSWORD
+
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+# Throttling is off so every request reaches the view; the catalog cache is
+# off too unless --cache is given, so list timings measure the database path
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[max(math.ceil(len(values) * pct / 100) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every public API endpoint against a generate_dataset dataset and report "
+        "p50/p95/p99 latency and queries per request, optionally against a saved baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help="Dataset created by generate_dataset --prefix")
+        parser.add_argument('--requests', type=int, default=200, help="Timed requests per endpoint")
+        parser.add_argument('--login-requests', type=int, default=20, help="Timed logins (password hashing is slow on purpose)")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per endpoint")
+        parser.add_argument('--only', nargs='+', metavar='ENDPOINT', help="Run just these endpoints")
+        parser.add_argument('--cache', action='store_true', help="Keep the catalog cache on")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, metavar='PATH', help="Write results as the baseline")
+        parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='PATH', help="Fail on regressions against a baseline")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed p95 slowdown against the baseline, as a fraction (default 0.25)",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.load_fixtures(options['prefix'])
+        endpoints = self.endpoints()
+        if options['only']:
+            unknown = set(options['only']) - endpoints.keys()
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}. Choose from {', '.join(endpoints)}.")
+            endpoints = {name: endpoints[name] for name in options['only']}
+
+        overrides = {
+            'CACHES': BENCHMARK_CACHES,
+            'THROTTLE_CACHE_ALIAS': 'benchmark',
+            'IDENTITY_CACHE_ALIAS': 'default',
+            # A full run at 1M products outlasts the usual timeout; a reload would show as an extra query
+            'IDENTITY_CACHE_TIMEOUT': None,
+            'SQL_INSTRUMENTATION': True,
+            'SQL_QUERY_BUDGET_STRICT': False,
+        }
+        if not options['cache']:
+            overrides['CATALOG_CACHE_ALIAS'] = 'benchmark'
+
+        # Budget warnings would print once per request; the queries column shows them
+        sql_logger = logging.getLogger('shopsphere.sql')
+        disabled, sql_logger.disabled = sql_logger.disabled, True
+        results = {}
+        try:
+            with override_settings(**overrides):
+                self.client = APIClient()
+                self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+                for name, request in endpoints.items():
+                    count = options['login_requests'] if name == 'login' else options['requests']
+                    results[name] = self.measure(request, count, options['warmup'])
+        finally:
+            sql_logger.disabled = disabled
+
+        self.report(results)
+        run = {'dataset': self.dataset, 'catalog_cache': options['cache'], 'endpoints': results}
+        if options['compare']:
+            self.compare(run, options['compare'], options['tolerance'])
+        if options['save']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['save'])), exist_ok=True)
+            with open(options['save'], 'w') as f:
+                json.dump(run, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Baseline written to {options['save']}")
+
+    # -----------------------------
+    # Dataset
+    # -----------------------------
+    def load_fixtures(self, prefix):
+        """Pick the users, products and categories the requests will use."""
+        products = Product.objects.filter(slug__startswith=f'{prefix}-', is_active=True)
+        self.user = User.objects.filter(username__startswith=f'{prefix}-user-').order_by('pk').first()
+        if self.user is None or not products.exists():
+            raise CommandError(f"No '{prefix}' dataset found. Create one with: manage.py generate_dataset --prefix {prefix}")
+
+        # A few hundred ids sampled from the top of the table keeps this cheap on 1M rows.
+        # In stock, so cart_add never fails on a sold-out product
+        self.product_ids = list(products.filter(stock__gt=0).order_by('-pk').values_list('pk', flat=True)[:500])
+        self.product_slugs = list(products.filter(pk__in=self.product_ids).values_list('slug', flat=True))
+        self.category_slugs = list(Category.objects.filter(slug__startswith=f'{prefix}-').values_list('slug', flat=True))
+        # OFFSET pagination gets slower the further in a page is; the last page is the worst case
+        self.last_page = math.ceil(Product.objects.filter(is_active=True).count() / api_settings.PAGE_SIZE)
+        self.order_ids = list(Order.objects.filter(user=self.user).values_list('pk', flat=True)[:100])
+        self.dataset = {
+            'categories': len(self.category_slugs),
+            'products': Product.objects.filter(slug__startswith=f'{prefix}-').count(),
+            'users': User.objects.filter(username__startswith=f'{prefix}-user-').count(),
+            'orders': Order.objects.filter(user__username__startswith=f'{prefix}-user-').count(),
+        }
+        self.stdout.write(', '.join(f"{count} {name}" for name, count in self.dataset.items()))
+
+    # -----------------------------
+    # Endpoints
+    # -----------------------------
+    def endpoints(self):
+        """Name -> callable that sends one request and returns the response."""
+        choice = self.random.choice
+        get = lambda path, **params: self.client.get(path, params, secure=True)  # noqa: E731
+        endpoints = {
+            'categories_list': lambda: get('/api/shop/categories/'),
+            'products_list': lambda: get('/api/shop/products/', page=choice([1, 2, 3])),
+            'products_deep_page': lambda: get('/api/shop/products/', page=self.last_page),
+            'products_cursor': lambda: get('/api/shop/products/', pagination='cursor'),
+            'products_detail': lambda: get(f'/api/shop/products/{choice(self.product_slugs)}/'),
+            'products_filter': lambda: get(
+                '/api/shop/products/', category=choice(self.category_slugs), min_price=10, max_price=500,
+            ),
+            'products_search': lambda: get('/api/shop/products/', search=choice(NOUNS)),
+            'products_facets': lambda: get(
+                '/api/shop/products/', category=choice(self.category_slugs), facets='true',
+            ),
+            'cart_view': lambda: get('/api/shop/cart/'),
+            'cart_add': self.rolled_back(lambda: self.client.post(
+                '/api/shop/cart/add/', {'product_id': choice(self.product_ids)}, format='json', secure=True,
+            )),
+            'orders_list': lambda: get('/api/shop/orders/'),
+            'orders_detail': lambda: get(f'/api/shop/orders/{choice(self.order_ids)}/'),
+            'checkout': self.rolled_back(self.checkout),
+            'login': lambda: self.client.post(
+                '/api/account/login/', {'identifier': self.user.email, 'password': PASSWORD}, format='json', secure=True,
+            ),
+        }
+        if not self.order_ids:
+            del endpoints['orders_detail']
+        return endpoints
+
+    def rolled_back(self, send):
+        """Run a write request inside a transaction that is rolled back, so every run sees the same data."""
+        def request():
+            with transaction.atomic():
+                response = send()
+                transaction.set_rollback(True)
+            return response
+        return request
+
+    def checkout(self):
+        cart_id = self.user.cart.pk
+        CartItem.objects.bulk_create([
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=1)
+            for product_id in self.random.sample(self.product_ids, min(3, len(self.product_ids)))
+        ])
+        CartItem.objects.filter(cart_id=cart_id, product__stock__lt=1).delete()
+        return self.client.post('/api/shop/orders/checkout/', secure=True)
+
+    # -----------------------------
+    # Measuring and reporting
+    # -----------------------------
+    def measure(self, request, count, warmup):
+        for _ in range(warmup):
+            request()
+        latencies, queries, errors = [], [], 0
+        for _ in range(count):
+            started = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+            match = QUERIES_RE.search(response.get('Server-Timing', ''))
+            if match:
+                queries.append(int(match.group(1)))
+
+        latencies = sorted(ms * 1000 for ms in latencies)
+        return {
+            'requests': count,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'queries': max(queries) if queries else None,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>7}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<20} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+                f"{1000 / result['mean_ms']:8.0f} {result['queries'] if result['queries'] is not None else '-':>8} "
+                f"{result['errors']:>7}"
+            )
+
+    def compare(self, run, path, tolerance):
+        """
+        Query counts must not grow at all; p95 may be `tolerance` slower.
+        Latency only means something against a baseline from the same machine
+        and dataset size, so a dataset mismatch is reported first.
+        """
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {path}; create one with --save.")
+
+        if baseline.get('dataset') != run['dataset']:
+            self.stdout.write(self.style.WARNING(
+                f"Dataset differs from the baseline ({baseline.get('dataset')}); latency comparisons are rough."
+            ))
+
+        regressions = []
+        for name, result in run['endpoints'].items():
+            before = baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            if result['queries'] is not None and before['queries'] is not None and result['queries'] > before['queries']:
+                regressions.append(f"{name}: {result['queries']} queries, baseline {before['queries']}")
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms, baseline {before['p95_ms']:.2f} ms")
+            if result['errors'] > before.get('errors', 0):
+                regressions.append(f"{name}: {result['errors']} errors, baseline {before.get('errors', 0)}")
+
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}"))
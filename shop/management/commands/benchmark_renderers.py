@@ -0,0 +1,66 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from Shopsphere import renderers
+from Shopsphere.parsers import FastJSONParser
+from Shopsphere.renderers import FastJSONRenderer
+from shop.models import Product
+from shop.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Time DRF's JSONRenderer/JSONParser against the orjson-backed pair on one product list page"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Products per page")
+        parser.add_argument('--repeat', type=int, default=500, help="Timed runs per renderer")
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError("orjson is not installed; FastJSONRenderer is running on the stdlib fallback.")
+
+        rows, repeat = options['rows'], options['repeat']
+        queryset = Product.objects.filter(is_active=True).select_related('category').order_by('-created_at')
+        products = list(queryset[:rows])
+        if len(products) < rows:
+            raise CommandError(f"Need at least {rows} active products; run populate_shop or import_catalog first.")
+
+        # Same shape as a PageNumberPagination response
+        page = {
+            'count': queryset.count(),
+            'next': 'https://localhost/api/shop/products/?page=2',
+            'previous': None,
+            'results': ProductSerializer(products, many=True).data,
+        }
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        body = stock.render(page)
+        if fast.render(page) != body:
+            raise CommandError("FastJSONRenderer output differs from JSONRenderer.")
+
+        timings = [
+            ("render  JSONRenderer", self.time(lambda: stock.render(page), repeat)),
+            ("render  FastJSONRenderer", self.time(lambda: fast.render(page), repeat)),
+            ("parse   JSONParser", self.time(lambda: JSONParser().parse(io.BytesIO(body)), repeat)),
+            ("parse   FastJSONParser", self.time(lambda: FastJSONParser().parse(io.BytesIO(body)), repeat)),
+        ]
+        self.stdout.write(f"{rows}-product page, {len(body) / 1024:.1f} KiB")
+        for label, median in timings:
+            self.stdout.write(f"{label:<26} {median * 1_000_000:8.1f} µs per response")
+        self.stdout.write(
+            f"Render speed-up: {timings[0][1] / timings[1][1]:.1f}x   "
+            f"Parse speed-up: {timings[2][1] / timings[3][1]:.1f}x"
+        )
+
+    def time(self, fn, repeat):
+        fn()  # warm up
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples)
@@ -0,0 +1,46 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from shop.models import Product
+from shop.serializers import ProductSerializer, ProductValuesSerializer
+
+
+class Command(BaseCommand):
+    help = "Time ProductSerializer against the values() fast path for one product list page (fetch + serialize + render)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Products per page")
+        parser.add_argument('--repeat', type=int, default=200, help="Timed runs per path")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        queryset = Product.objects.filter(is_active=True).select_related('category').order_by('-created_at')
+        if queryset.count() < rows:
+            raise CommandError(f"Need at least {rows} active products; run populate_shop or import_catalog first.")
+
+        def full():
+            return JSONRenderer().render(ProductSerializer(list(queryset[:rows]), many=True).data)
+
+        def fast():
+            page = list(ProductValuesSerializer.values(queryset)[:rows])
+            return JSONRenderer().render(ProductValuesSerializer(page).data)
+
+        if full() != fast():
+            raise CommandError("Fast path output differs from ProductSerializer.")
+
+        results = {name: self.time(fn, repeat) for name, fn in [('ProductSerializer', full), ('values() fast path', fast)]}
+        for name, median in results.items():
+            self.stdout.write(f"{name:<20} {median * 1000:8.2f} ms per {rows}-row page")
+        self.stdout.write(f"Speed-up: {results['ProductSerializer'] / results['values() fast path']:.1f}x")
+
+    def time(self, fn, repeat):
+        fn()  # warm up
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples)
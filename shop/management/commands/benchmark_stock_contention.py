@@ -0,0 +1,150 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models
+from django.test.utils import override_settings
+
+from account.models import User
+from Shopsphere.db import immediate_atomic
+from shop import inventory
+from shop.models import Cart, CartItem, Category, Order, OrderItem, Product
+from .benchmark_checkout import BENCHMARK_SETTINGS, PROFILES, Command as CheckoutBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Many shoppers checking out the same product at once, with its stock in one row and then "
+        "sharded. Reports checkouts/s and verifies nothing was oversold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help="Concurrent shoppers (threads)")
+        parser.add_argument('--checkouts', type=int, default=25, help="Checkout attempts per shopper")
+        parser.add_argument('--shards', type=int, default=inventory.get_shard_count())
+        parser.add_argument(
+            '--stock', type=int,
+            help="Units on sale; defaults to 80%% of the attempts so the product sells out mid-run",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        database = connection.settings_dict
+        stock = options['stock'] or int(options['workers'] * options['checkouts'] * 0.8)
+        self.stdout.write(
+            f"{options['workers']} shoppers x {options['checkouts']} attempts on one product with {stock} units "
+            f"({connection.vendor})"
+        )
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                "SQLite takes one lock per write transaction, not per row, so sharding cannot raise "
+                "throughput here; run against PostgreSQL/MySQL for the row-lock numbers."
+            ))
+
+        original = {key: database[key] for key in ('NAME', 'OPTIONS', 'CONN_MAX_AGE')}
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                for mode in ('single-row', 'sharded'):
+                    if connection.vendor == 'sqlite':
+                        if connection.is_in_memory_db():
+                            raise CommandError("This benchmark needs a file-backed database.")
+                        path = os.path.join(tmp, f'{mode}.sqlite3')
+                        CheckoutBenchmark().copy_database(original['NAME'], path)
+                        connections.close_all()
+                        profile = PROFILES['production']
+                        database.update(NAME=path, OPTIONS=profile['OPTIONS'], CONN_MAX_AGE=profile['CONN_MAX_AGE'])
+                    with override_settings(**BENCHMARK_SETTINGS):
+                        results[mode] = self.run(mode, stock, options)
+                    connections.close_all()
+        finally:
+            connections.close_all()
+            database.update(original)
+
+        single, sharded = (results[mode][0] for mode in ('single-row', 'sharded'))
+        if single:
+            self.stdout.write(f"Throughput change: {sharded / single:.2f}x")
+        if any(not ok for _, ok in results.values()):
+            raise CommandError("Stock was oversold or lost - see above.")
+
+    # -----------------------------
+    # One run
+    # -----------------------------
+    def setup(self, mode, stock, options):
+        category, _ = Category.objects.get_or_create(slug='benchmark-contention', defaults={'name': 'Benchmark Contention'})
+        product = Product.objects.create(
+            name=f'Flash Sale {mode}', slug=f'flash-sale-{mode}-{time.time_ns()}', price=Decimal('5.00'),
+            stock=stock, category=category,
+        )
+        if mode == 'sharded':
+            inventory.enable(product, options['shards'])
+        users = User.objects.bulk_create([
+            User(
+                email=f'contention-{mode}-{i}@example.com', username=f'contention-{mode}-{i}',
+                name='Benchmark', country='NG', password='!',
+            )
+            for i in range(options['workers'])
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        return product, carts
+
+    def cleanup(self, product, carts):
+        # Only matters off SQLite, where the run writes to the configured database itself
+        users = [cart.user_id for cart in carts]
+        Order.objects.filter(user__in=users).delete()
+        User.objects.filter(pk__in=users).delete()
+        product.delete()
+
+    def run(self, mode, stock, options):
+        product, carts = self.setup(mode, stock, options)
+        try:
+            return self.measure(mode, stock, options, product, carts)
+        finally:
+            self.cleanup(product, carts)
+
+    def measure(self, mode, stock, options, product, carts):
+        connections.close_all()
+        counts = {'sold': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(len(carts) + 1)
+
+        def shop(cart):
+            try:
+                start.wait()
+                for _ in range(options['checkouts']):
+                    outcome = 'sold'
+                    try:
+                        with immediate_atomic():  # as the cart views do
+                            CartItem.objects.update_or_create(cart=cart, product_id=product.pk, defaults={'quantity': 1})
+                        Order.create_from_cart(cart)
+                    except ValueError:  # "Insufficient stock"
+                        outcome = 'sold_out'
+                    except Exception:  # "database is locked" and friends
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=shop, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        # Every unit is either still in stock or on an order line, and none went below zero
+        left = inventory.available(Product.objects.with_stock_total().get(pk=product.pk))
+        ordered = OrderItem.objects.filter(product=product).aggregate(total=models.Sum('quantity'))['total'] or 0
+        ok = left >= 0 and left + ordered == stock and ordered == counts['sold']
+        self.stdout.write(
+            f"{mode:<11} {counts['sold'] / elapsed:7.1f} checkouts/s   sold {counts['sold']}/{stock}, "
+            f"{counts['sold_out']} turned away, {counts['errors']} errors, {left} left   "
+            + (self.style.SUCCESS("no overselling") if ok else self.style.ERROR(f"MISMATCH: {ordered} units ordered"))
+        )
+        return counts['sold'] / elapsed, ok
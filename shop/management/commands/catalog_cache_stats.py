@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shop import cache as catalog_cache
+
+
+class Command(BaseCommand):
+    help = "Show (and optionally reset) the catalog cache hit/miss counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them")
+
+    def handle(self, *args, **options):
+        stats = catalog_cache.stats()
+        self.stdout.write(f"Hits: {stats['hits']}")
+        self.stdout.write(f"Misses: {stats['misses']}")
+        self.stdout.write(f"Hit ratio: {stats['hit_ratio']:.2%}")
+
+        if options['reset']:
+            catalog_cache.reset_stats()
+            self.stdout.write("Counters reset.")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import exports
+
+
+class Command(BaseCommand):
+    help = "Stream order lines as NDJSON or CSV for finance, optionally limited to a placed_at date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=exports.FORMATS, default='ndjson')
+        parser.add_argument('--start', help="First day/datetime to include (ISO 8601)")
+        parser.add_argument('--end', help="Last day to include, or exclusive datetime (ISO 8601)")
+        parser.add_argument('--output', default='-', help="File to write to; '-' for stdout")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per database round trip")
+
+    def handle(self, *args, **options):
+        try:
+            start = exports.parse_bound(options['start'])
+            end = exports.parse_bound(options['end'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = exports.export_rows(start, end, chunk_size=options['chunk_size'])
+        lines = exports.render(rows, options['format'])
+
+        if options['output'] == '-':
+            out = self.stdout
+            for line in lines:
+                out.write(line, ending='')
+            return
+
+        count = -1 if options['format'] == 'csv' else 0  # don't count the CSV header
+        with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+            for line in lines:
+                handle.write(line)
+                count += 1
+        self.stderr.write(f"Wrote {max(count, 0)} order lines to {options['output']}")
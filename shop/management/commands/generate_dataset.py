@@ -0,0 +1,207 @@
+import random
+import time
+from decimal import Decimal
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from account.models import User
+from shop import cache as catalog_cache
+from shop import facets, rollups, search
+from shop.models import Cart, CartItem, Category, Order, OrderItem, Product
+
+
+# Every generated user can log in with this password (benchmark_endpoints does)
+PASSWORD = 'Benchmark-pass-1'
+
+ADJECTIVES = [
+    'wireless', 'compact', 'premium', 'classic', 'portable', 'ergonomic', 'vintage', 'smart',
+    'organic', 'durable', 'lightweight', 'deluxe', 'modern', 'rugged', 'silent', 'solar',
+]
+NOUNS = [
+    'headphones', 'kettle', 'backpack', 'lamp', 'keyboard', 'novel', 'jacket', 'blender',
+    'camera', 'chair', 'puzzle', 'sneakers', 'speaker', 'notebook', 'monitor', 'teapot',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-insert a synthetic catalog with users, carts and orders for benchmarking. "
+        "Rows are tagged with --prefix so they can be replaced or removed later."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--cart-items', type=int, default=3, help="Lines in every user's cart")
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT")
+        parser.add_argument('--seed', type=int, default=1, help="Same seed, same dataset")
+        parser.add_argument('--prefix', default='bench', help="Tag for slugs, usernames and emails")
+        parser.add_argument('--replace', action='store_true', help="Delete an earlier dataset with this prefix first")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        self.random = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+
+        if Category.objects.filter(slug__startswith=f'{self.prefix}-').exists():
+            if not options['replace']:
+                raise CommandError(f"A '{self.prefix}' dataset already exists; pass --replace or another --prefix.")
+            self.step("Removed previous dataset", self.delete_dataset)
+
+        categories = self.step("Categories", self.create_categories, options['categories'])
+        product_ids = self.step("Products", self.create_products, options['products'], categories)
+        users = self.step("Users and carts", self.create_users, options['users'])
+        self.step("Cart items", self.create_cart_items, users, product_ids, options['cart_items'])
+        self.step("Orders", self.create_orders, users, product_ids, options['orders'])
+
+        # Bulk inserts skip the model signals; catch the derived data up once
+        self.step("Search index", search.get_backend().rebuild)
+        if facets.table_enabled():
+            self.step("Facet counts", facets.rebuild)
+        self.step("Sales rollups", self.rebuild_rollups)
+        catalog_cache.bump(catalog_cache.GLOBAL_SCOPE, catalog_cache.CATEGORIES_SCOPE)
+        catalog_cache.bump(*(catalog_cache.category_scope(category.slug) for category in categories))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset '{self.prefix}' ready. Users log in as {self.prefix}-user-<n>@example.com / {PASSWORD}"
+        ))
+
+    def step(self, label, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        count = f" ({len(result)})" if isinstance(result, (list, range)) else ''
+        self.stdout.write(f"{label}{count}: {time.perf_counter() - started:.1f}s")
+        return result
+
+    def rebuild_rollups(self):
+        start = rollups.first_sale_day()
+        if start is not None:
+            rollups.rebuild(start, timezone.localdate())
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # -----------------------------
+    # Generators
+    # -----------------------------
+    def delete_dataset(self):
+        with transaction.atomic():
+            users = User.objects.filter(username__startswith=f'{self.prefix}-user-')
+            # Order lines protect their products, so orders go first
+            Order.objects.filter(user__in=users).delete()
+            users.delete()
+            Product.objects.filter(slug__startswith=f'{self.prefix}-').delete()
+            Category.objects.filter(slug__startswith=f'{self.prefix}-').delete()
+
+    def create_categories(self, count):
+        return Category.objects.bulk_create([
+            Category(name=f'{self.prefix.title()} Category {i}', slug=f'{self.prefix}-category-{i}')
+            for i in range(count)
+        ])
+
+    def create_products(self, count, categories):
+        rand = self.random
+
+        def rows():
+            for i in range(count):
+                adjective, noun = rand.choice(ADJECTIVES), rand.choice(NOUNS)
+                yield Product(
+                    name=f'{adjective.title()} {noun.title()} {i}',
+                    slug=f'{self.prefix}-product-{i}',
+                    description=f'A {adjective} {noun} from the {rand.choice(ADJECTIVES)} range.',
+                    price=Decimal(rand.randint(99, 99_999)) / 100,
+                    stock=rand.randint(0, 500),
+                    category=rand.choice(categories),
+                    is_active=rand.random() > 0.05,
+                )
+
+        ids = []
+        for batch in self.batches(rows()):
+            with transaction.atomic():
+                ids.extend(product.pk for product in Product.objects.bulk_create(batch))
+        return ids
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)  # hashing once keeps a 100k-user run in seconds
+        users = []
+        for batch in self.batches(
+            User(
+                email=f'{self.prefix}-user-{i}@example.com', username=f'{self.prefix}-user-{i}',
+                name=f'Benchmark User {i}', country='NG', password=password,
+            )
+            for i in range(count)
+        ):
+            with transaction.atomic():
+                created = User.objects.bulk_create(batch)
+                Cart.objects.bulk_create([Cart(user=user) for user in created])
+            users.extend(created)
+        return users
+
+    def create_cart_items(self, users, product_ids, per_cart):
+        carts = dict(Cart.objects.filter(user__in=[user.pk for user in users]).values_list('user_id', 'pk'))
+        lines = (
+            CartItem(cart_id=carts[user.pk], product_id=product_id, quantity=self.random.randint(1, 3))
+            for user in users
+            for product_id in self.random.sample(product_ids, min(per_cart, len(product_ids)))
+        )
+        created = 0
+        for batch in self.batches(lines):
+            CartItem.objects.bulk_create(batch)
+            created += len(batch)
+        return range(created)
+
+    def create_orders(self, users, product_ids, count):
+        if not users or not product_ids:
+            return []
+        products = {}
+        now = timezone.now()
+        created = 0
+        for batch in self.batches(range(count)):
+            # Snapshot data for the products this batch sells, fetched once per batch
+            picks = [self.random.sample(product_ids, min(self.random.randint(1, 4), len(product_ids))) for _ in batch]
+            missing = {pk for pick in picks for pk in pick} - products.keys()
+            products.update(
+                (row[0], row[1:])
+                for row in Product.objects.filter(pk__in=missing).values_list('pk', 'name', 'slug', 'category_id', 'category__name', 'price')
+            )
+            with transaction.atomic():
+                orders = Order.objects.bulk_create([
+                    Order(
+                        user=self.random.choice(users),
+                        total_amount=0,
+                        status=self.random.choice([choice for choice, _ in Order.STATUS_CHOICES]),
+                        placed_at=now - timedelta(minutes=self.random.randint(0, 525_600)),
+                    )
+                    for _ in batch
+                ])
+                items = []
+                for order, pick in zip(orders, picks):
+                    for product_id in pick:
+                        name, slug, category_id, category_name, price = products[product_id]
+                        quantity = self.random.randint(1, 3)
+                        order.total_amount += price * quantity
+                        items.append(OrderItem(
+                            order=order, product_id=product_id, quantity=quantity, price=price,
+                            product_name=name, product_slug=slug, category_name=category_name,
+                            category_id=category_id,
+                        ))
+                OrderItem.objects.bulk_create(items)
+                Order.objects.bulk_update(orders, ['total_amount'])
+            created += len(orders)
+            products.clear()  # keep memory flat on large runs
+        return range(created)
@@ -0,0 +1,60 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import images
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the resized image variants (PRODUCT_IMAGE_VARIANTS) of existing product images "
+        "in parallel. Products whose variants are current are skipped unless --force is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 2,
+            help="Render threads (Pillow releases the GIL, so these run in parallel)",
+        )
+        parser.add_argument('--force', action='store_true', help="Re-render variants that are already current")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Products read per query")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        products = (
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .only('pk', 'image', 'image_variants').order_by('pk')
+        )
+        rendered = failed = skipped = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='product-images') as pool:
+            # One thread renders inline on this connection; a pool gives each worker its own
+            render = images.process if options['workers'] == 1 else (
+                lambda *args: pool.submit(images.process_in_worker, *args)
+            )
+            pending = []
+            for product in products.iterator(chunk_size=options['chunk_size']):
+                if not options['force'] and not images.is_stale(product):
+                    skipped += 1
+                    continue
+                pending.append(render(product.pk, product.image.name))
+                if len(pending) >= options['chunk_size']:
+                    rendered, failed = self.collect(pending, rendered, failed)
+                    pending = []
+            rendered, failed = self.collect(pending, rendered, failed)
+
+        self.stdout.write(
+            f"Rendered variants for {rendered} products in {time.perf_counter() - started:.1f}s "
+            f"({skipped} already current, {failed} failed)."
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING("Failures are logged on the shopsphere.images logger."))
+
+    def collect(self, pending, rendered, failed):
+        done = [result if isinstance(result, bool) else result.result() for result in pending]
+        return rendered + done.count(True), failed + done.count(False)
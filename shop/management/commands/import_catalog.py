@@ -0,0 +1,210 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_slug
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+from shop import cache as catalog_cache
+from shop import facets, inventory, search
+from shop.models import Category, Product
+
+
+UPDATE_FIELDS = ['name', 'description', 'price', 'stock', 'category', 'is_active', 'updated_at']
+MAX_PRICE = Decimal('100000000')  # Product.price is max_digits=10, decimal_places=2
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or JSONL supplier feed into the catalog, upserting products by slug in fixed-size chunks. "
+        "Columns: name, slug (optional), description, price, stock, category (name), is_active (optional)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to a .csv or .jsonl file")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per INSERT ... ON CONFLICT batch")
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row without writing anything")
+        parser.add_argument('--max-errors', type=int, default=20, help="How many row errors to print")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        self.dry_run = options['dry_run']
+        self.max_errors = options['max_errors']
+        self.errors = 0
+        # Every category is looked up once; new names are created the first time they appear.
+        # Names match case-insensitively, and slugs taken so far are tracked so new ones stay unique.
+        self.categories = {}
+        self.category_slugs = set()
+        for pk, name, slug in Category.objects.values_list('pk', 'name', 'slug'):
+            self.categories[name.lower()] = pk
+            self.category_slugs.add(slug)
+        touched_categories = set()
+
+        started = time.perf_counter()
+        imported = 0
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as handle:
+                rows = self.read_jsonl(handle) if fmt == 'jsonl' else self.read_csv(handle)
+                products = self.validate(rows)
+                while True:
+                    chunk = list(islice(products, chunk_size))
+                    if not chunk:
+                        break
+                    if not self.dry_run:
+                        self.upsert(chunk)
+                    touched_categories.update(product.category_id for product in chunk)
+                    imported += len(chunk)
+                    self.report_progress(imported, started)
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        if imported and not self.dry_run:
+            slugs = Category.objects.filter(pk__in=touched_categories).values_list('slug', flat=True)
+            catalog_cache.bump(catalog_cache.GLOBAL_SCOPE, *(catalog_cache.category_scope(s) for s in slugs))
+            if facets.table_enabled():
+                facets.rebuild()
+
+        elapsed = time.perf_counter() - started
+        verb = "Validated" if self.dry_run else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {imported} rows in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} rows/s), "
+            f"{self.errors} rows rejected."
+        ))
+
+    # -----------------------------
+    # Readers (one row in memory at a time)
+    # -----------------------------
+    def read_csv(self, handle):
+        reader = csv.DictReader(handle)
+        for line, row in enumerate(reader, start=2):
+            yield line, row
+
+    def read_jsonl(self, handle):
+        for line, raw in enumerate(handle, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as e:
+                self.reject(line, f"invalid JSON ({e})")
+                continue
+            if not isinstance(row, dict):
+                self.reject(line, "expected a JSON object")
+                continue
+            yield line, row
+
+    # -----------------------------
+    # Validation
+    # -----------------------------
+    def validate(self, rows):
+        for line, row in rows:
+            try:
+                yield self.build_product(row)
+            except (ValueError, ValidationError, InvalidOperation) as e:
+                message = e.messages[0] if isinstance(e, ValidationError) else str(e) or e.__class__.__name__
+                self.reject(line, message)
+
+    def build_product(self, row):
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise ValueError("name is required")
+        slug = str(row.get('slug') or '').strip() or slugify(name)
+        validate_slug(slug)
+        if len(slug) > 300:
+            raise ValueError("slug is longer than 300 characters")
+
+        price = Decimal(str(row.get('price', '')).strip())
+        if not price.is_finite() or not 0 <= price < MAX_PRICE or price != price.quantize(Decimal('0.01')):
+            raise ValueError(f"invalid price {row.get('price')!r}")
+        stock = int(str(row.get('stock') or 0).strip())
+        if stock < 0:
+            raise ValueError(f"invalid stock {row.get('stock')!r}")
+
+        category = str(row.get('category') or '').strip()
+        if not category:
+            raise ValueError("category is required")
+
+        is_active = row.get('is_active', True)
+        if isinstance(is_active, str):
+            is_active = is_active.strip().lower() in TRUE_VALUES
+
+        return Product(
+            name=name[:255],
+            slug=slug,
+            description=str(row.get('description') or ''),
+            price=price,
+            stock=stock,
+            category_id=self.resolve_category(category),
+            is_active=bool(is_active),
+        )
+
+    def resolve_category(self, name):
+        key = name.lower()
+        if key not in self.categories:
+            if len(name) > Category._meta.get_field('name').max_length:
+                raise ValueError("category is longer than 120 characters")
+            slug = self.unique_category_slug(name)
+            self.category_slugs.add(slug)
+            self.categories[key] = None if self.dry_run else self.create_category(name, slug)
+        return self.categories[key]
+
+    def unique_category_slug(self, name):
+        """slugify(name), or 'category' when that is empty, suffixed -2, -3, ... past slugs in use."""
+        max_length = Category._meta.get_field('slug').max_length
+        base = slugify(name)[:max_length] or 'category'
+        slug, n = base, 1
+        while slug in self.category_slugs:
+            n += 1
+            suffix = f'-{n}'
+            slug = base[:max_length - len(suffix)] + suffix
+        return slug
+
+    def create_category(self, name, slug):
+        try:
+            with transaction.atomic():
+                return Category.objects.create(name=name, slug=slug).pk
+        except IntegrityError:
+            # Created by someone else since the categories were loaded
+            existing = Category.objects.filter(name__iexact=name).values_list('pk', flat=True).first()
+            if existing is None:
+                raise ValueError(f"could not create category {name!r}: slug {slug!r} is taken")
+            return existing
+
+    def reject(self, line, message):
+        self.errors += 1
+        if self.errors <= self.max_errors:
+            self.stderr.write(f"Line {line}: {message}")
+        elif self.errors == self.max_errors + 1:
+            self.stderr.write("Further row errors suppressed.")
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def upsert(self, chunk):
+        # The last occurrence of a slug within a chunk wins, like it would across chunks
+        by_slug = {product.slug: product for product in chunk}
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                list(by_slug.values()),
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=UPDATE_FIELDS,
+            )
+            search.get_backend().index_queryset(Product.objects.filter(slug__in=list(by_slug)))
+            # Feed stock is the new total; for sharded products it replaces the shards
+            inventory.reset_totals(Product.objects.filter(slug__in=list(by_slug), sharded_stock=True))
+
+    def report_progress(self, imported, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{imported} rows ({imported / elapsed if elapsed else 0:.0f} rows/s)")
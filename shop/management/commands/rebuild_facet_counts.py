@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop import facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed product facet counts (FacetCount table)"
+
+    def handle(self, *args, **options):
+        rows = facets.rebuild()
+        self.stdout.write(f"Rebuilt {rows} facet counts.")
+        if not facets.table_enabled():
+            self.stdout.write(self.style.WARNING(
+                "PRODUCT_FACET_COUNT_TABLE is off, so the table will not be read or kept up to date."
+            ))
@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from shop import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups from live and archived orders, one transaction per "
+        "batch of days. Defaults to every day from the first order until today."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD), default today")
+        parser.add_argument('--days-per-batch', type=int, default=31, help="Days recomputed per transaction")
+
+    def handle(self, *args, **options):
+        if options['days_per_batch'] < 1:
+            raise CommandError("--days-per-batch must be at least 1")
+        start = self.parse(options['start']) or rollups.first_sale_day()
+        end = self.parse(options['end']) or timezone.localdate()
+        if start is None:
+            self.stdout.write("No orders to roll up.")
+            return
+        if start > end:
+            raise CommandError("--start is after --end")
+
+        started = time.perf_counter()
+        days_with_sales = 0
+        batch_start = start
+        while batch_start <= end:
+            batch_end = min(batch_start + timedelta(days=options['days_per_batch'] - 1), end)
+            days_with_sales += rollups.rebuild(batch_start, batch_end)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{batch_start} .. {batch_end}")
+            batch_start = batch_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt sales rollups for {start} .. {end} ({days_with_sales} days with sales) "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def parse(self, value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value!r}")
+        return day
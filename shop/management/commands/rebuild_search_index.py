@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop import search
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index (e.g. after bulk imports that bypass signals)"
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.rebuild()
+        self.stdout.write(
+            f"Rebuilt {backend.__class__.__name__} index for {Product.objects.count()} products."
+        )
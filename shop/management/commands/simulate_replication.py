@@ -0,0 +1,92 @@
+import sqlite3
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class LaggedReplicator:
+    """
+    Copies a SQLite primary into replica files `lag` seconds late: each tick
+    snapshots the primary into memory and applies the newest snapshot that
+    is at least `lag` seconds old.
+    """
+
+    def __init__(self, primary, replicas, lag):
+        self.primary = primary
+        self.replicas = replicas
+        self.lag = lag
+        self.snapshots = deque()
+
+    def snapshot(self):
+        copy = sqlite3.connect(':memory:')
+        with sqlite3.connect(self.primary) as source:
+            source.backup(copy)  # one step, so it is a consistent read of the primary
+        return copy
+
+    def apply(self, copy):
+        for path in self.replicas:
+            replica = sqlite3.connect(path, timeout=30)  # readers of the replica hold it briefly
+            try:
+                copy.backup(replica)
+            finally:
+                replica.close()
+
+    def tick(self, now=None):
+        """Take a snapshot; returns the age of the one applied, or None."""
+        now = time.monotonic() if now is None else now
+        self.snapshots.append((now, self.snapshot()))
+        due = None
+        while self.snapshots and self.snapshots[0][0] <= now - self.lag:
+            if due is not None:
+                due[1].close()
+            due = self.snapshots.popleft()
+        if due is None:
+            return None
+        try:
+            self.apply(due[1])
+        finally:
+            due[1].close()
+        return now - due[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep the SQLite read replicas (SQLITE_REPLICAS) a fixed number of seconds behind the "
+        "primary database, to try replica routing and read-your-writes locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag', type=float, default=2.0, help="Seconds the replicas trail the primary")
+        parser.add_argument('--interval', type=float, default=0.5, help="Seconds between snapshots")
+        parser.add_argument('--once', action='store_true', help="Copy the primary now, without lag, and exit")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        replicas = [settings.DATABASES[alias]['NAME'] for alias in settings.DATABASE_REPLICAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("The simulator copies SQLite files; use real replication for other databases.")
+        if not replicas:
+            raise CommandError("No replicas configured. Set SQLITE_REPLICAS=path[,path...] first.")
+        if options['interval'] <= 0 or options['lag'] < 0:
+            raise CommandError("--interval must be positive and --lag not negative")
+
+        replicator = LaggedReplicator(str(primary['NAME']), [str(path) for path in replicas], options['lag'])
+        if options['once']:
+            replicator.apply(replicator.snapshot())
+            self.stdout.write(f"Copied {primary['NAME']} to {', '.join(map(str, replicas))}.")
+            return
+
+        self.stdout.write(
+            f"Replicating {primary['NAME']} to {', '.join(map(str, replicas))} "
+            f"{options['lag']}s behind. Ctrl+C to stop."
+        )
+        try:
+            while True:
+                started = time.monotonic()
+                replicator.tick(started)
+                time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            pass
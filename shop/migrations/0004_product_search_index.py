@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+# FTS5 inverted index over Product.name/description - see shop/search.py.
+# Only created on SQLite; other databases use the fallback search backend.
+
+CREATE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts USING fts5(
+    name,
+    description,
+    tokenize = 'porter unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+BACKFILL_SQL = """
+INSERT INTO shop_product_fts (rowid, name, description)
+SELECT id, name, description FROM shop_product
+"""
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(BACKFILL_SQL)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS shop_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_facetcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='category_name',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_slug',
+            field=models.SlugField(blank=True, db_index=False, default='', max_length=300),
+        ),
+    ]
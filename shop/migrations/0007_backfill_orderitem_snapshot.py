@@ -0,0 +1,42 @@
+from django.db import migrations, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+
+# Fill the product snapshot on order lines placed before it existed, using
+# the product as it is now (the closest record there is). Runs outside one
+# big transaction, in id ranges of CHUNK_SIZE lines, each its own UPDATE, so
+# a large order history neither holds a long write lock nor has to be
+# loaded into memory; re-running it only touches lines still left blank.
+
+CHUNK_SIZE = 5000
+
+
+def backfill_snapshot(apps, schema_editor):
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    Product = apps.get_model('shop', 'Product')
+    db = schema_editor.connection.alias
+
+    product = Product.objects.using(db).filter(pk=OuterRef('product_id'))
+    last_id = OrderItem.objects.using(db).aggregate(last=Max('id'))['last'] or 0
+
+    for start in range(0, last_id + 1, CHUNK_SIZE):
+        with transaction.atomic(using=db):
+            OrderItem.objects.using(db).filter(
+                id__gte=start, id__lt=start + CHUNK_SIZE, product_name='',
+            ).update(
+                product_name=Subquery(product.values('name')[:1]),
+                product_slug=Subquery(product.values('slug')[:1]),
+                category_name=Subquery(product.values('category__name')[:1]),
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0006_orderitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.category'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.category'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Fill the sold-under category on order lines placed before it was recorded.
+# The category_name snapshot names it, so the category with that name is
+# taken, falling back to the product's current category when it has been
+# renamed or deleted. Chunked like 0007; re-running only touches lines still
+# left blank.
+
+CHUNK_SIZE = 5000
+
+
+def backfill_category(apps, schema_editor):
+    Category = apps.get_model('shop', 'Category')
+    Product = apps.get_model('shop', 'Product')
+    db = schema_editor.connection.alias
+
+    by_name = Category.objects.using(db).filter(name=OuterRef('category_name')).values('pk')[:1]
+    current = Product.objects.using(db).filter(pk=OuterRef('product_id')).values('category_id')[:1]
+
+    for model_name in ('OrderItem', 'ArchivedOrderItem'):
+        model = apps.get_model('shop', model_name)
+        last_id = model.objects.using(db).aggregate(last=Max('id'))['last'] or 0
+        for start in range(0, last_id + 1, CHUNK_SIZE):
+            with transaction.atomic(using=db):
+                model.objects.using(db).filter(
+                    id__gte=start, id__lt=start + CHUNK_SIZE, category__isnull=True,
+                ).update(category_id=Coalesce(Subquery(by_name), Subquery(current)))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shop', '0014_order_item_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_category, migrations.RunPython.noop),
+    ]
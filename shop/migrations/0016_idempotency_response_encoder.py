@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:33
+
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_backfill_orderitem_category'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='response',
+            field=models.JSONField(blank=True, encoder=rest_framework.utils.encoders.JSONEncoder, null=True),
+        ),
+    ]
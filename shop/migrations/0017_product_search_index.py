@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_idempotency_response_encoder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='shop.product')),
+                ('document', models.TextField(db_column='shop_product_fts')),
+            ],
+            options={
+                'db_table': 'shop_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
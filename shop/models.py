@@ -1,9 +1,15 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
 import uuid
 
+from Shopsphere.db import immediate_atomic
+
+from . import cache as catalog_cache
+
 
 class Category(models.Model):
     name = models.CharField(max_length=120, unique=True)
@@ -17,6 +23,28 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_stock_total(self):
+        """
+        Annotate `stock_total`: `stock` for ordinary products, and `stock` (the
+        unsharded reserve) plus the shard counts for sharded ones. The CASE
+        only runs the shard subquery for sharded rows.
+        """
+        # SUM() as a plain function: one aggregate over the filtered rows, no GROUP BY
+        shard_total = (
+            StockShard.objects.filter(product=models.OuterRef('pk'))
+            .annotate(total=models.Func(models.F('stock'), function='SUM')).values('total')
+        )
+        return self.annotate(stock_total=models.Case(
+            models.When(
+                sharded_stock=True,
+                then=models.F('stock') + Coalesce(models.Subquery(shard_total), 0),
+            ),
+            default=models.F('stock'),
+            output_field=models.PositiveIntegerField(),
+        ))
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=300, unique=True)
@@ -24,16 +52,35 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     stock = models.PositiveIntegerField(default=0)  # stock quantity
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Resized copies of `image`, rendered in the background - see shop/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Stock split across StockShard rows for hot products - see shop/inventory.py
+    sharded_stock = models.BooleanField(default=False, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        # Public reads always filter `is_active`, which Django renders as a bare
+        # `WHERE "is_active"`: SQLite only uses indexes *partial* on that
+        # predicate, never ones that merely start with the column.
+        # `slug` needs no index of its own; its unique constraint is one.
         indexes = [
             models.Index(fields=['name']),
-            models.Index(fields=['slug']),
+            # Price filters/ordering, and keyset pagination walking (<ordering field>, id) - see shop/pagination.py
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True), name='product_active_price_id_idx'),
+            models.Index(
+                fields=['created_at', 'id'], condition=models.Q(is_active=True), name='product_active_created_id_idx'
+            ),
+            # ?category=<slug> listings, newest first, without a sort step
+            models.Index(
+                fields=['category', '-created_at'], condition=models.Q(is_active=True),
+                name='product_active_cat_created_idx',
+            ),
         ]
 
     def __str__(self):
@@ -41,24 +88,108 @@ class Product(models.Model):
 
     def reduce_stock(self, quantity):
         """Reduce stock by quantity. Raises ValueError if insufficient."""
+        if self.sharded_stock:
+            from .inventory import take
+            with transaction.atomic():
+                if not take(self.pk, quantity):
+                    raise ValueError("Insufficient stock for product: %s" % self.pk)
+            return
         if quantity > self.stock:
             raise ValueError("Insufficient stock for product: %s" % self.pk)
         self.stock = models.F('stock') - quantity
         self.save(update_fields=['stock'])
 
 
+class StockShard(models.Model):
+    """One slice of a sharded product's stock - see shop/inventory.py."""
+    product = models.ForeignKey(Product, related_name='stock_shards', on_delete=models.CASCADE)
+    index = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'index'], name='stockshard_product_index_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}#{self.index}: {self.stock}"
+
+
+class ProductSearchIndex(models.Model):
+    """
+    The FTS5 table behind product search (created in migration 0004, SQLite
+    only), mapped so searches can join it - see shop/search.py.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_index', on_delete=models.DO_NOTHING,
+    )
+    # FTS5's hidden column named after the table: MATCH it to search every
+    # column, and pass it to bm25()
+    document = models.TextField(db_column='shop_product_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'shop_product_fts'
+
+
+def line_subtotal_expression(prefix=''):
+    """`price * quantity` for a cart line, computed in SQL."""
+    return models.ExpressionWrapper(
+        models.F(f'{prefix}product__price') * models.F(f'{prefix}quantity'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Load carts ready for rendering in three queries, whatever their size:
+        the cart with its total aggregated in SQL, its items with each line
+        subtotal annotated, then their products joined to category with
+        `stock_total` annotated (so sharded lines need no query of their own).
+        """
+        products = Product.objects.with_stock_total().select_related('category')
+        items = (
+            CartItem.objects.annotate(line_subtotal=line_subtotal_expression())
+            .prefetch_related(models.Prefetch('product', queryset=products))
+            .order_by('pk')
+        )
+        return self.annotate(
+            total_amount=models.Sum(line_subtotal_expression('items__'))
+        ).prefetch_related(models.Prefetch('items', queryset=items))
+
+
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='cart', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart({self.user})"
 
+    @classmethod
+    def for_user(cls, user):
+        """
+        The user's cart. Users authenticated through the identity cache carry
+        its id as `cart_pk`, so no query is needed; anyone else gets one
+        (created on the spot for accounts that predate carts-at-registration).
+        """
+        cart_pk = getattr(user, 'cart_pk', None)
+        if cart_pk is not None:
+            cart = cls.from_db(None, ['id', 'user_id'], [cart_pk, user.pk])
+            cart.user = user
+            return cart
+        cart, _ = cls.objects.get_or_create(user=user)
+        return cart
+
     def total(self):
         """Return cart total as Decimal."""
-        total = sum(item.subtotal() for item in self.items.select_related('product'))
-        return total
+        if hasattr(self, 'total_amount'):
+            return self.total_amount or 0
+        return self.items.aggregate(total=models.Sum(line_subtotal_expression()))['total'] or 0
 
     def clear(self):
         """Remove all items from cart."""
@@ -78,6 +209,8 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
 
     def subtotal(self):
+        if hasattr(self, 'line_subtotal'):
+            return self.line_subtotal
         return self.product.price * self.quantity
 
 
@@ -105,6 +238,12 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's order history, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # Admin/staff views of orders in one status, by date
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.uuid} by {self.user}"
@@ -112,36 +251,65 @@ class Order(models.Model):
     @classmethod
     def create_from_cart(cls, cart):
         """
-        Create an Order from a Cart instance.
-        This will copy CartItems into OrderItems and optionally reduce product stock.
+        Create an Order from a Cart instance in a single transaction.
+
+        The cart is read once, stock for every line is decremented by one
+        conditional UPDATE guarded by `stock >= quantity`, and order items are
+        bulk-inserted, so the number of queries does not grow with the cart.
+        Lines for products with sharded stock decrement one of their shards
+        instead (one UPDATE each - see shop/inventory.py). If any product is
+        short the whole checkout is rolled back. The daily sales rollups are
+        updated in the same transaction (shop/rollups.py).
         """
-        if not cart.items.exists():
-            raise ValueError("Cart is empty")
-
-        total = sum(item.subtotal() for item in cart.items.select_related('product'))
-
-        order = cls.objects.create(user=cart.user, total_amount=total, placed_at=timezone.now())
-
-        order_items = []
-        for item in cart.items.select_related('product'):
-            # Save price at purchase time
-            oi = OrderItem(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price
-            )
-            order_items.append(oi)
-            # reduce stock - consider wrapping in transaction in real impl
-            if item.product.stock < item.quantity:
-                # rollback behaviour should be implemented at view or service layer
-                raise ValueError(f"Insufficient stock for product {item.product.pk}")
-            item.product.stock = models.F('stock') - item.quantity
-            item.product.save(update_fields=['stock'])
-
-        OrderItem.objects.bulk_create(order_items)
-        # clear the cart
-        cart.clear()
+        from . import rollups
+        from .inventory import take
+
+        with immediate_atomic():  # takes the write lock before reading the cart
+            items = list(cart.items.select_related('product__category'))
+            if not items:
+                raise ValueError("Cart is empty")
+
+            total = sum(item.subtotal() for item in items)
+            order = cls.objects.create(user_id=cart.user_id, total_amount=total, placed_at=timezone.now())
+
+            for item in items:
+                if item.product.sharded_stock and not take(item.product_id, item.quantity):
+                    raise ValueError(f"Insufficient stock for product {item.product_id}")
+
+            # UPDATE ... SET stock = CASE id WHEN .. THEN stock - qty .. END
+            # WHERE (id = .. AND stock >= qty) OR ..
+            plain = [item for item in items if not item.product.sharded_stock]
+            guard = models.Q()
+            for item in plain:
+                guard |= models.Q(pk=item.product_id, stock__gte=item.quantity)
+            updated = Product.objects.filter(guard).update(
+                stock=models.Case(
+                    *[models.When(pk=item.product_id, then=models.F('stock') - item.quantity) for item in plain],
+                    output_field=models.PositiveIntegerField(),
+                )
+            ) if plain else 0
+            if updated != len(plain):
+                stock = dict(
+                    Product.objects.filter(pk__in=[item.product_id for item in plain]).values_list('pk', 'stock')
+                )
+                product_id = next(
+                    item.product_id for item in plain if stock.get(item.product_id, 0) < item.quantity
+                )
+                raise ValueError(f"Insufficient stock for product {product_id}")
+
+            lines = OrderItem.objects.bulk_create([
+                # Save price, name and category at purchase time
+                OrderItem.snapshot(item.product, order=order, quantity=item.quantity)
+                for item in items
+            ])
+            # clear the cart
+            cart.clear()
+            rollups.record(order.placed_at, [
+                (line.product_id, line.category_id, line.quantity, line.price) for line in lines
+            ])
+
+        # The bulk UPDATE skips Product signals, so refresh cached stock ourselves
+        transaction.on_commit(lambda: catalog_cache.invalidate_products(item.product for item in items))
         return order
 
 
@@ -151,5 +319,157 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     price = models.DecimalField(max_digits=10, decimal_places=2)  # price at time of purchase
 
+    # What the product looked like at purchase time, so order history renders
+    # without joining the catalog and doesn't change when the product does
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    product_slug = models.SlugField(max_length=300, blank=True, default='', db_index=False)
+    category_name = models.CharField(max_length=120, blank=True, default='')
+    # The category it was sold under, which the sales rollups count it in
+    category = models.ForeignKey(Category, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} @ {self.price}"
+
+    @classmethod
+    def snapshot(cls, product, **kwargs):
+        """An unsaved line for `product` (with its category loaded), priced and named as of now."""
+        return cls(
+            product=product,
+            price=product.price,
+            product_name=product.name,
+            product_slug=product.slug,
+            category_name=product.category.name,
+            category_id=product.category_id,
+            **kwargs,
+        )
+
+
+class ArchivedOrder(models.Model):
+    """
+    A completed or cancelled order moved out of the hot Order table by
+    `archive_orders`. It keeps the original id and uuid.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    uuid = models.UUIDField(unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='archived_orders', on_delete=models.CASCADE)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    placed_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archorder_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.uuid} by {self.user}"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='archived_order_items', on_delete=models.PROTECT)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    product_slug = models.SlugField(max_length=300, blank=True, default='', db_index=False)
+    category_name = models.CharField(max_length=120, blank=True, default='')
+    category = models.ForeignKey(Category, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} @ {self.price}"
+
+
+class SalesDay(models.Model):
+    """
+    Daily sales totals - see shop/rollups.py. Cancelled orders are not counted.
+    ProductSalesDay and CategorySalesDay break the same totals down.
+    """
+    day = models.DateField(unique=True)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, {self.revenue}"
+
+
+class ProductSalesDay(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='productsalesday_day_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} product {self.product_id}: {self.units} units"
+
+
+class CategorySalesDay(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(Category, related_name='+', on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='categorysalesday_day_category_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} category {self.category_id}: {self.units} units"
+
+
+class FacetCount(models.Model):
+    """
+    Precomputed product counts for the unfiltered facet sidebar - see shop/facets.py.
+    A ('meta', 'built') row marks the table as complete.
+    """
+    FACET_META = 'meta'
+    FACET_CATEGORY = 'category'
+    FACET_PRICE = 'price'
+    KEY_BUILT = 'built'
+
+    facet = models.CharField(max_length=20)
+    key = models.CharField(max_length=100)  # category id, or price range such as '25-50'
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'key')
+
+    def __str__(self):
+        return f"{self.facet}:{self.key} = {self.count}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a request sent with an Idempotency-Key header, replayed to
+    retries of it - see shop/idempotency.py. `status_code` is null while the
+    first request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # DRF's encoder, so a replay renders Decimals etc. exactly as the original response did
+    response = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    started_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotencykey_user_key_uniq'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} @ {self.price}"
+        return f"{self.key} ({self.status_code or 'in progress'})"
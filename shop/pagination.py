@@ -0,0 +1,172 @@
+import base64
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# -----------------------------
+# KEYSET (CURSOR) PAGINATION
+# -----------------------------
+class ProductKeysetPagination(BasePagination):
+    """
+    Keyset pagination over `(<ordering field>, id)`.
+
+    Each page is fetched with `WHERE (field, id) > (last_field, last_id)
+    ORDER BY field, id LIMIT n+1`, so it walks a composite index instead of
+    counting the whole result set and skipping OFFSET rows - page 10,000
+    costs the same as page 1. The response has no `count`.
+
+    Select it per request with `?pagination=cursor`; the `next`/`previous`
+    links carry an opaque `cursor` parameter.
+    """
+    mode_query_param = 'pagination'
+    mode_query_value = 'cursor'
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    # How each orderable field round-trips through the cursor
+    field_parsers = {
+        'price': Decimal,
+        'created_at': parse_datetime,
+    }
+
+    @classmethod
+    def is_requested(cls, request):
+        return (
+            request.query_params.get(cls.mode_query_param) == cls.mode_query_value
+            or cls.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+
+        # Walking backwards flips both the comparison and the sort direction
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+
+        if cursor:
+            # (field, id) > (value, id) spelled so the leading `field >= value`
+            # term gives SQLite a range seek on the index rather than a scan
+            lookup = 'lt' if descending else 'gt'
+            value = cursor['v']
+            queryset = queryset.filter(**{f'{self.field}__{lookup}e': value}).filter(
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{f'id__{lookup}': cursor['id']})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, view):
+        """
+        Use the first valid `?ordering=` term (same rules as OrderingFilter),
+        falling back to the view's default ordering.
+        """
+        terms = OrderingFilter().get_ordering(request, view.get_queryset(), view) or ['-created_at']
+        for term in terms:
+            field = term.lstrip('-')
+            if field in self.field_parsers:
+                return field, term.startswith('-')
+        return 'created_at', True
+
+    # -----------------------------
+    # Cursor encoding
+    # -----------------------------
+    def encode_cursor(self, obj, reverse):
+        # Rows may be model instances or .values() dicts
+        if isinstance(obj, dict):
+            value, pk = obj[self.field], obj['id']
+        else:
+            value, pk = getattr(obj, self.field), obj.pk
+        payload = {
+            'f': self.field,
+            'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'id': pk,
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if payload['f'] != self.field:
+                raise ValueError('cursor was issued for a different ordering')
+            payload['v'] = self.field_parsers[self.field](payload['v'])
+            payload['id'] = int(payload['id'])
+            if payload['v'] is None:
+                raise ValueError('unparseable cursor value')
+        except (TypeError, ValueError, KeyError, ArithmeticError):
+            raise NotFound(self.invalid_cursor_message)
+        return payload
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
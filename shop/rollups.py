@@ -0,0 +1,211 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from Shopsphere.db import immediate_atomic
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, CategorySalesDay, Order, OrderItem, ProductSalesDay, SalesDay,
+)
+
+
+# -----------------------------
+# SALES ROLLUPS
+# -----------------------------
+# Reporting straight off OrderItem means aggregating every order ever placed.
+# Instead, units, revenue and order counts are kept per day (in TIME_ZONE,
+# by placed_at) in three small tables - totals, per product, per category -
+# and the staff analytics endpoints read only those, so a dashboard costs
+# O(days) whatever the order volume.
+#
+# They are maintained incrementally, in the transaction that changes the order:
+#
+# - create_from_cart adds the new order;
+# - saving an order into or out of the cancelled status subtracts or adds it
+#   back (see shop/signals.py). Cancelled orders are not counted.
+#
+# Each table takes two statements per order whatever its size: an INSERT of
+# zero rows that ignores conflicts, then one UPDATE adding a CASE of deltas:
+#
+#     UPDATE shop_productsalesday SET units = units + CASE product_id WHEN 3 THEN 2 ... END, ...
+#     WHERE day = ? AND product_id IN (...)
+#
+# Writes that skip model signals (queryset.update(status=...), bulk inserts,
+# deleting orders) are not tracked; `rebuild_sales_rollups` recomputes any
+# range of days from the live and archived orders. Archiving does not change
+# the rollups.
+
+FIELDS = ('units', 'revenue', 'orders')
+REVENUE = models.DecimalField(max_digits=14, decimal_places=2)
+
+
+def is_counted(status):
+    return status != Order.STATUS_CANCELLED
+
+
+# -----------------------------
+# Incremental updates
+# -----------------------------
+def _deltas():
+    return {'units': 0, 'revenue': Decimal('0'), 'orders': 0}
+
+
+def _apply(model, day, key_field, deltas):
+    """Add `deltas` ({key: {'units': .., 'revenue': .., 'orders': ..}}) to `model`'s rows for `day`."""
+    if key_field is None:  # SalesDay: one row per day
+        model.objects.bulk_create([model(day=day)], ignore_conflicts=True)
+        values = deltas[None]
+        model.objects.filter(day=day).update(**{
+            field: models.F(field) + models.Value(values[field], output_field=model._meta.get_field(field))
+            for field in FIELDS
+        })
+        return
+
+    model.objects.bulk_create([model(day=day, **{key_field: key}) for key in deltas], ignore_conflicts=True)
+    model.objects.filter(day=day, **{f'{key_field}__in': list(deltas)}).update(**{
+        field: models.F(field) + models.Case(
+            *[models.When(**{key_field: key}, then=models.Value(values[field])) for key, values in deltas.items()],
+            output_field=model._meta.get_field(field),
+        )
+        for field in FIELDS
+    })
+
+
+def record(placed_at, lines, sign=1):
+    """
+    Add one order to the rollups (sign=-1 takes it out). `lines` are
+    (product_id, category_id, quantity, unit_price) tuples, with the
+    category the line was sold under (None if it has since been deleted).
+    """
+    if placed_at is None or not lines:
+        return
+    day = timezone.localdate(placed_at)
+    total = _deltas()
+    products = defaultdict(_deltas)
+    categories = defaultdict(_deltas)
+    for product_id, category_id, quantity, price in lines:
+        targets = [total, products[product_id]]
+        if category_id is not None:
+            targets.append(categories[category_id])
+        for deltas in targets:
+            deltas['units'] += sign * quantity
+            deltas['revenue'] += sign * quantity * price
+            deltas['orders'] = sign  # once per order, however many lines it touches
+    _apply(SalesDay, day, None, {None: total})
+    _apply(ProductSalesDay, day, 'product_id', products)
+    if categories:
+        _apply(CategorySalesDay, day, 'category_id', categories)
+
+
+def record_order(order, sign=1):
+    """record() for a saved order, reading its lines."""
+    lines = OrderItem.objects.filter(order=order).values_list('product_id', 'category_id', 'quantity', 'price')
+    record(order.placed_at, list(lines), sign)
+
+
+# -----------------------------
+# Rebuilding
+# -----------------------------
+def _day_bounds(start, end):
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def _aggregate(model, start, end, *group_by):
+    lower, upper = _day_bounds(start, end)
+    return (
+        model.objects
+        .filter(order__placed_at__gte=lower, order__placed_at__lt=upper)
+        .exclude(order__status=Order.STATUS_CANCELLED)
+        .annotate(day=TruncDate('order__placed_at'))
+        .values('day', *group_by)
+        .annotate(
+            units=models.Sum('quantity'),
+            revenue=models.Sum(models.F('quantity') * models.F('price'), output_field=REVENUE),
+            orders=models.Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+
+
+def _collect(start, end, *group_by):
+    # Live and archived orders never overlap, so their sums simply add up
+    rows = defaultdict(_deltas)
+    for model in (OrderItem, ArchivedOrderItem):
+        for row in _aggregate(model, start, end, *group_by):
+            deltas = rows[(row['day'], *(row[field] for field in group_by))]
+            for field in FIELDS:
+                deltas[field] += row[field]
+    return rows
+
+
+def rebuild(start, end):
+    """Recompute every rollup for the days start..end (dates, inclusive). Returns the days with sales."""
+    with immediate_atomic():
+        days = _collect(start, end)
+        products = _collect(start, end, 'product_id')
+        # Lines count under the category they were sold in, not the product's current one
+        categories = _collect(start, end, 'category_id')
+        categories = {key: values for key, values in categories.items() if key[1] is not None}
+        for model in (SalesDay, ProductSalesDay, CategorySalesDay):
+            model.objects.filter(day__gte=start, day__lte=end).delete()
+        SalesDay.objects.bulk_create([SalesDay(day=day, **values) for (day,), values in days.items()])
+        ProductSalesDay.objects.bulk_create([
+            ProductSalesDay(day=day, product_id=product_id, **values)
+            for (day, product_id), values in products.items()
+        ], batch_size=2000)
+        CategorySalesDay.objects.bulk_create([
+            CategorySalesDay(day=day, category_id=category_id, **values)
+            for (day, category_id), values in categories.items()
+        ])
+    return len(days)
+
+
+def first_sale_day():
+    """The earliest day with a placed order, live or archived, or None."""
+    firsts = [model.objects.aggregate(first=models.Min('placed_at'))['first'] for model in (Order, ArchivedOrder)]
+    return min((timezone.localdate(first) for first in firsts if first is not None), default=None)
+
+
+# -----------------------------
+# Reports
+# -----------------------------
+def daily(start, end):
+    return SalesDay.objects.filter(day__gte=start, day__lte=end).order_by('day')
+
+
+def totals(days):
+    """Sum SalesDay rows."""
+    summed = _deltas()
+    for day in days:
+        for field in FIELDS:
+            summed[field] += getattr(day, field)
+    return summed
+
+
+def breakdown(model, key_field, name_field, start, end, limit):
+    """The top `limit` products or categories by revenue over start..end, summed over days."""
+    rows = (
+        model.objects.filter(day__gte=start, day__lte=end)
+        .values(key_field, name_field)
+        .annotate(**{f'total_{field}': models.Sum(field) for field in FIELDS})
+        .order_by('-total_revenue', key_field)[:limit]
+    )
+    return [
+        {'id': row[key_field], 'name': row[name_field], **{field: row[f'total_{field}'] for field in FIELDS}}
+        for row in rows
+    ]
+
+
+def top_products(start, end, limit):
+    return breakdown(ProductSalesDay, 'product_id', 'product__name', start, end, limit)
+
+
+def top_categories(start, end, limit):
+    return breakdown(CategorySalesDay, 'category_id', 'category__name', start, end, limit)
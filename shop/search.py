@@ -0,0 +1,168 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Func, Lookup, Q, Value
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.settings import api_settings
+
+from .models import Product, ProductSearchIndex
+
+
+# -----------------------------
+# PRODUCT SEARCH BACKENDS
+# -----------------------------
+# `SearchFilter` turns `?search=` into `name LIKE '%term%'`, which no index
+# can serve. Search is delegated to a backend instead:
+#
+# - SQLiteFTS5Backend keeps an FTS5 inverted index over name + description
+#   (table created in migration 0004) and ranks matches with bm25.
+# - LikeSearchBackend is the portable fallback for other databases.
+#
+# Pick one with settings.PRODUCT_SEARCH_BACKEND (dotted path); by default the
+# FTS5 backend is used on SQLite and the fallback everywhere else.
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query or '')
+
+
+class BaseSearchBackend(ABC):
+    @abstractmethod
+    def search(self, queryset, query):
+        """Narrow `queryset` to matches. Returns (queryset, rank_ordering or None)."""
+
+    def index(self, product):
+        pass
+
+    def index_queryset(self, queryset):
+        """Re-index many products at once (bulk writes skip the save signals)."""
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Unindexed `icontains` over name and description (every term must match)."""
+
+    def search(self, queryset, query):
+        for term in tokenize(query):
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset, None
+
+
+class Match(Lookup):
+    """`search_index__document__match=...`: an FTS5 MATCH through the product's index row."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+ProductSearchIndex._meta.get_field('document').register_lookup(Match)
+
+
+class BM25(Func):
+    """FTS5's bm25() over an index row, with one weight per column."""
+    function = 'bm25'
+    output_field = FloatField()
+
+    def __init__(self, document, *weights):
+        super().__init__(document, *(Value(weight) for weight in weights))
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    table = 'shop_product_fts'
+    # bm25 column weights: a hit in the name counts ten times one in the description
+    name_weight = 10.0
+    description_weight = 1.0
+
+    def build_match(self, query):
+        """
+        Quote every token so user input can never be parsed as FTS5 syntax,
+        and make each one a prefix match so 'lap' finds 'laptop'.
+        """
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset, None
+        # An inner join, so SQLite starts from the index matches
+        queryset = queryset.filter(search_index__document__match=match).annotate(
+            search_rank=BM25(F('search_index__document'), self.name_weight, self.description_weight),
+        )
+        # bm25 is lower-is-better
+        return queryset, ['search_rank', '-id']
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)',
+                [product.pk, product.name, product.description],
+            )
+
+    def index_queryset(self, queryset):
+        rows = list(queryset.values_list('pk', 'name', 'description'))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)', rows
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description) '
+                f'SELECT id, name, description FROM {Product._meta.db_table}'
+            )
+
+
+def get_backend():
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    return LikeSearchBackend()
+
+
+# -----------------------------
+# DRF FILTER BACKEND
+# -----------------------------
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for `SearchFilter` on `?search=`.
+
+    Listed after `OrderingFilter` so results are sorted by relevance unless
+    the client asked for an explicit `?ordering=`. It only narrows the
+    queryset, so `ProductFilter` price/category filters compose with it.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not tokenize(query):
+            return queryset
+
+        queryset, rank_ordering = get_backend().search(queryset, query)
+        explicit_ordering = request.query_params.get(OrderingFilter.ordering_param)
+        if rank_ordering and not explicit_ordering:
+            queryset = queryset.order_by(*rank_ordering)
+        return queryset
@@ -1,4 +1,6 @@
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from . import images, inventory
 from .models import Category, Product, Cart, CartItem, Order, OrderItem
 
 
@@ -16,15 +18,76 @@ class CategorySerializer(serializers.ModelSerializer):
 # -----------------------------
 class ProductSerializer(serializers.ModelSerializer):
     category = serializers.StringRelatedField()  # shows category name
+    stock = serializers.SerializerMethodField()  # includes sharded stock - see shop/inventory.py
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'description',
-            'price', 'stock', 'image',
+            'price', 'stock', 'image', 'image_variants',
             'category', 'created_at', 'updated_at', 'is_active'
         ]
 
+    def get_stock(self, obj):
+        return inventory.available(obj)
+
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj.image.name, obj.image_variants, self.context.get('request'))
+
+
+# -----------------------------
+# PRODUCT LIST FAST PATH
+# -----------------------------
+class ProductValuesSerializer:
+    """
+    Read-only stand-in for `ProductSerializer(many=True)` on list pages.
+
+    Works on `.values()` rows (category name joined in SQL) instead of model
+    instances, and formats each column with the same DRF field objects
+    ProductSerializer uses, so the JSON is byte-for-byte identical without
+    building a Product/Category per row or running the full field machinery.
+    """
+    columns = [
+        'id', 'name', 'slug', 'description', 'price', 'stock_total', 'image', 'image_variants',
+        'category__name', 'created_at', 'updated_at', 'is_active',
+    ]
+
+    def __init__(self, instance, many=True, context=None):
+        self.instance = instance
+        self.context = context or {}
+
+    @classmethod
+    def values(cls, queryset):
+        if 'stock_total' not in queryset.query.annotations:
+            queryset = queryset.with_stock_total()
+        return queryset.values(*cls.columns)
+
+    @cached_property
+    def data(self):
+        fields = ProductSerializer().fields
+        price = fields['price'].to_representation
+        created_at = fields['created_at'].to_representation
+        updated_at = fields['updated_at'].to_representation
+        request = self.context.get('request')
+        return [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'slug': row['slug'],
+                'description': row['description'],
+                'price': price(row['price']),
+                'stock': row['stock_total'],
+                'image': images.file_url(row['image'], request),
+                'image_variants': images.variant_urls(row['image'], row['image_variants'], request),
+                'category': row['category__name'],
+                'created_at': created_at(row['created_at']),
+                'updated_at': updated_at(row['updated_at']),
+                'is_active': row['is_active'],
+            }
+            for row in self.instance
+        ]
+
 
 # -----------------------------
 # CART ITEM SERIALIZER
@@ -61,16 +124,42 @@ class CartSerializer(serializers.ModelSerializer):
         return obj.total()
 
 
+# -----------------------------
+# CART BATCH SERIALIZERS
+# -----------------------------
+class CartOperationSerializer(serializers.Serializer):
+    OP_ADD = 'add'
+    OP_SET = 'set'
+    OP_REMOVE = 'remove'
+
+    op = serializers.ChoiceField(choices=[OP_ADD, OP_SET, OP_REMOVE])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)  # ignored for 'remove'
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=200)
+
+
 # -----------------------------
 # ORDER ITEM SERIALIZER
 # -----------------------------
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price']
 
+    def get_product(self, obj):
+        # Snapshot taken at checkout: no catalog join, and it shows what was bought
+        return {
+            'id': obj.product_id,
+            'name': obj.product_name,
+            'slug': obj.product_slug,
+            'category': obj.category_name,
+        }
+
 
 # -----------------------------
 # ORDER SERIALIZER
@@ -85,3 +174,22 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'placed_at', 'items'
         ]
         read_only_fields = ['uuid', 'user', 'total_amount']
+
+
+# -----------------------------
+# SALES ANALYTICS SERIALIZERS
+# -----------------------------
+class SalesTotalsSerializer(serializers.Serializer):
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders = serializers.IntegerField()
+
+
+class SalesDaySerializer(SalesTotalsSerializer):
+    day = serializers.DateField()
+
+
+class SalesBreakdownSerializer(SalesTotalsSerializer):
+    """One product or category, summed over the requested days."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
@@ -0,0 +1,131 @@
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from account import authentication
+from . import cache as catalog_cache
+from . import facets, images, rollups, search
+from .models import Cart, Category, Order, Product
+
+
+# Fields that decide which facet buckets a product is counted in
+FACET_FIELDS = {'category', 'price', 'is_active'}
+
+
+# -----------------------------
+# CATALOG CACHE INVALIDATION
+# -----------------------------
+@receiver(pre_save, sender=Product)
+def remember_previous_state(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep what the row looked like before this save, so a product moved between
+    categories invalidates both and facet counts can move it between buckets.
+    """
+    instance._previous_state = None
+    if instance.pk is None or (update_fields is not None and not FACET_FIELDS & set(update_fields)):
+        return
+    instance._previous_state = (
+        Product.objects.filter(pk=instance.pk)
+        .values('category_id', 'category__slug', 'price', 'is_active')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    scopes = {catalog_cache.GLOBAL_SCOPE, catalog_cache.category_scope(instance.category.slug)}
+    previous = getattr(instance, '_previous_state', None)
+    if previous:
+        scopes.add(catalog_cache.category_scope(previous['category__slug']))
+    catalog_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    catalog_cache.bump(catalog_cache.GLOBAL_SCOPE, catalog_cache.CATEGORIES_SCOPE)
+
+
+# -----------------------------
+# SEARCH INDEX MAINTENANCE
+# -----------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    # Stock/price-only saves (checkout, admin list edits) leave the text untouched
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
+
+
+# -----------------------------
+# FACET COUNT TABLE
+# -----------------------------
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not FACET_FIELDS & set(update_fields):
+        return
+    previous = getattr(instance, '_previous_state', None)
+    before = (previous['category_id'], previous['price'], previous['is_active']) if previous else None
+    facets.apply_change(before, (instance.category_id, instance.price, instance.is_active))
+
+
+@receiver(post_delete, sender=Product)
+def remove_facet_counts(sender, instance, **kwargs):
+    facets.apply_change((instance.category_id, instance.price, instance.is_active), None)
+
+
+# -----------------------------
+# IMAGE VARIANTS
+# -----------------------------
+@receiver(post_save, sender=Product)
+def render_image_variants(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if images.is_stale(instance):
+        images.schedule(instance)
+
+
+# -----------------------------
+# CARTS
+# -----------------------------
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_cart(sender, instance, created, raw=False, **kwargs):
+    """Every account gets its cart at registration, so its id can ride along in the identity cache."""
+    if created and not raw:
+        Cart.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def forget_cart_owner(sender, instance, created=True, **kwargs):
+    # The owner's cached identity holds the cart id; re-read it on next request
+    if created:
+        authentication.forget_user(instance.user_id)
+
+
+# -----------------------------
+# SALES ROLLUPS
+# -----------------------------
+@receiver(pre_save, sender=Order)
+def remember_previous_status(sender, instance, update_fields=None, **kwargs):
+    instance._previous_status = None
+    if instance.pk is None or (update_fields is not None and 'status' not in update_fields):
+        return
+    instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, **kwargs):
+    # New orders are recorded by create_from_cart, which has their lines at hand
+    previous = getattr(instance, '_previous_status', None)
+    if created or previous is None:
+        return
+    counted, was_counted = rollups.is_counted(instance.status), rollups.is_counted(previous)
+    if counted != was_counted:
+        rollups.record_order(instance, 1 if counted else -1)
@@ -1,3 +1,1621 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management.base import CommandError
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from account.models import User
+from Shopsphere import routers
+from Shopsphere.db import immediate_atomic, sqlite_options
+from Shopsphere.middleware import QueryBudgetExceeded, fingerprint
+from Shopsphere.parsers import FastJSONParser
+from Shopsphere.renderers import FastJSONRenderer
+from Shopsphere.routers import ReplicaRouter
+from .management.commands.simulate_replication import LaggedReplicator
+from .idempotency import idempotent, request_hash
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, CategorySalesDay, Product, ProductSalesDay, Cart, CartItem,
+    IdempotencyKey, Order, OrderItem, SalesDay, StockShard,
+)
+from .search import BaseSearchBackend
+from .serializers import OrderSerializer, ProductSerializer, ProductValuesSerializer
+from .views import CartViewSet, ProductViewSet
+from . import cache as catalog_cache
+from . import exports, images, inventory
+
+
+@override_settings(SQL_QUERY_BUDGET_STRICT=True)
+class ShopTestCase(TestCase):
+    """
+    Shared fixtures. Requests go over HTTPS because of SECURE_SSL_REDIRECT,
+    and throttling is switched off so tests can make more than a handful of calls.
+    Views fail the test when they exceed their query budget or repeat a query.
+    """
+
+    def setUp(self):
+        cache.clear()
+        throttles = mock.patch.object(APIView, 'get_throttles', return_value=[])
+        throttles.start()
+        self.addCleanup(throttles.stop)
+        self.client = APIClient()
+        self.electronics = Category.objects.create(name='Electronics', slug='electronics')
+        self.books = Category.objects.create(name='Books', slug='books')
+        self.laptop = Product.objects.create(
+            name='Laptop', slug='laptop', price=Decimal('999.99'), stock=8, category=self.electronics
+        )
+        self.novel = Product.objects.create(
+            name='Novel', slug='novel', price=Decimal('12.50'), stock=30, category=self.books
+        )
+
+    def create_user(self, username='buyer'):
+        return User.objects.create_user(
+            email=f'{username}@example.com', name=username.title(), username=username,
+            country='NG', password='S3cure-pass!',
+        )
+
+    def make_products(self, count, stock=10, price=Decimal('2.50'), prefix='item'):
+        return Product.objects.bulk_create([
+            Product(
+                name=f'{prefix.title()} {i}', slug=f'{prefix}-{i}', price=price, stock=stock,
+                category=self.electronics,
+            )
+            for i in range(count)
+        ])
+
+    def get(self, url, data=None, **kwargs):
+        return self.client.get(url, data, secure=True, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.client.post(url, data, format='json', secure=True, **kwargs)
+
+
+# -----------------------------
+# CATALOG CACHE
+# -----------------------------
+class CatalogCacheTests(ShopTestCase):
+    def test_second_list_request_is_served_from_cache(self):
+        first = self.get('/api/shop/products/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.get('/api/shop/products/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(catalog_cache.stats()['hits'], 1)
+
+    def test_product_save_invalidates_list_and_detail(self):
+        self.get('/api/shop/products/')
+        self.get('/api/shop/products/laptop/')
+
+        self.laptop.price = Decimal('899.00')
+        self.laptop.save()
+
+        listing = self.get('/api/shop/products/')
+        detail = self.get('/api/shop/products/laptop/')
+        self.assertEqual(listing['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['price'], '899.00')
+
+    def test_category_lists_are_versioned_independently(self):
+        self.get('/api/shop/products/', {'category': 'electronics'})
+
+        self.novel.stock = 5
+        self.novel.save()
+        self.assertEqual(self.get('/api/shop/products/', {'category': 'electronics'})['X-Cache'], 'HIT')
+
+        self.laptop.delete()
+        response = self.get('/api/shop/products/', {'category': 'electronics'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_moving_product_invalidates_previous_category(self):
+        self.get('/api/shop/products/', {'category': 'books'})
+
+        self.novel.category = self.electronics
+        self.novel.save()
+
+        response = self.get('/api/shop/products/', {'category': 'books'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_category_rename_invalidates_category_endpoints(self):
+        self.get('/api/shop/categories/')
+        self.books.name = 'Literature'
+        self.books.save()
+
+        response = self.get('/api/shop/categories/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Literature', [c['name'] for c in response.data['results']])
+
+    def test_cold_key_waits_for_in_flight_rebuild(self):
+        key = 'catalog:test:cold'
+        catalog_cache.get_cache().add(f'{key}:lock', 'other-worker')
+        # Another worker finishes its rebuild while we are polling
+        timer = threading.Timer(0.1, catalog_cache.get_cache().set, args=(key, {'built': 'elsewhere'}))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        calls = []
+        value, hit = catalog_cache.get_or_build(key, lambda: calls.append(1) or {'built': 'here'})
+        self.assertEqual(value, {'built': 'elsewhere'})
+        self.assertEqual(calls, [])
+
+
+# -----------------------------
+# KEYSET PAGINATION
+# -----------------------------
+class KeysetPaginationTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        # Repeated prices make sure the id tie-breaker is doing its job
+        Product.objects.bulk_create([
+            Product(
+                name=f'Cable {i}', slug=f'cable-{i}', price=Decimal(5 + i % 3),
+                stock=10, category=self.electronics,
+            )
+            for i in range(23)
+        ])
+
+    def walk(self, params):
+        seen, url, data = [], '/api/shop/products/', dict(params, pagination='cursor', page_size=4)
+        while url:
+            response = self.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['slug'] for item in response.data['results'])
+            url, data = response.data['next'], None
+        return seen
+
+    def test_every_ordering_visits_each_product_once_in_order(self):
+        for ordering in ['price', '-price', 'created_at', '-created_at']:
+            with self.subTest(ordering=ordering):
+                prefix = '-' if ordering.startswith('-') else ''
+                expected = list(
+                    Product.objects.filter(is_active=True)
+                    .order_by(ordering, f'{prefix}id')
+                    .values_list('slug', flat=True)
+                )
+                self.assertEqual(self.walk({'ordering': ordering}), expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.get('/api/shop/products/', {'pagination': 'cursor', 'ordering': 'price'})
+        second = self.get(first.data['next'])
+        back = self.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_cursor_page_does_not_count(self):
+        first = self.get('/api/shop/products/', {'pagination': 'cursor'})
+        cache.clear()
+        with self.assertNumQueries(1) as ctx:
+            self.get(first.data['next'])
+        self.assertNotIn('COUNT', ctx.captured_queries[0]['sql'].upper())
+
+    def test_invalid_cursor_is_404(self):
+        response = self.get('/api/shop/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_remains_default(self):
+        response = self.get('/api/shop/products/')
+        self.assertEqual(response.data['count'], 25)
+
+
+# -----------------------------
+# FULL-TEXT SEARCH
+# -----------------------------
+class ProductSearchTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', slug='wireless-headphones', price=Decimal('59.99'), stock=5,
+            description='Bluetooth over-ear headphones.', category=self.electronics,
+        )
+        self.speaker = Product.objects.create(
+            name='Speaker', slug='speaker', price=Decimal('149.00'), stock=5,
+            description='Pairs with wireless headphones and phones.', category=self.electronics,
+        )
+
+    def search(self, **params):
+        response = self.get('/api/shop/products/', params)
+        return [item['slug'] for item in response.data['results']]
+
+    def test_searches_description_and_ranks_name_matches_first(self):
+        self.assertEqual(self.search(search='wireless'), ['wireless-headphones', 'speaker'])
+
+    def test_prefix_and_stemmed_terms_match(self):
+        self.assertEqual(self.search(search='lapt'), ['laptop'])
+        self.assertEqual(self.search(search='pair'), ['speaker'])
+
+    def test_composes_with_product_filter_and_ordering(self):
+        self.assertEqual(self.search(search='wireless', min_price='100'), ['speaker'])
+        self.assertEqual(self.search(search='wireless', category='books'), [])
+        self.assertEqual(self.search(search='wireless', ordering='-price'), ['speaker', 'wireless-headphones'])
+
+    def test_backends_must_implement_search(self):
+        class IndexOnly(BaseSearchBackend):
+            def index(self, product):
+                pass
+
+        with self.assertRaises(TypeError):
+            IndexOnly()
+
+    def test_fts_syntax_in_query_is_treated_as_text(self):
+        response = self.get('/api/shop/products/', {'search': 'wireless" OR NEAR(*'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_index_follows_save_and_delete(self):
+        self.novel.description = 'A gripping detective story.'
+        self.novel.save()
+        self.assertEqual(self.search(search='detective'), ['novel'])
+
+        self.novel.delete()
+        self.assertEqual(self.search(search='detective'), [])
+
+
+# -----------------------------
+# CHECKOUT
+# -----------------------------
+class CheckoutTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.cart = self.user.cart
+
+    def fill_cart(self, products, quantity=2):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=quantity) for product in products
+        ])
+
+    def checkout_queries(self, size):
+        self.fill_cart(self.make_products(size, prefix=f'batch{size}'))
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            Order.create_from_cart(cart)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        # savepoint, cart read, order insert, stock update, items insert, cart delete,
+        # insert + update for each of the three sales rollups, release
+        self.assertEqual(self.checkout_queries(1), 13)
+        self.assertEqual(self.checkout_queries(40), 13)
+
+    def test_decrements_stock_and_snapshots_prices(self):
+        self.fill_cart([self.laptop, self.novel], quantity=3)
+        order = Order.create_from_cart(self.cart)
+
+        self.laptop.refresh_from_db()
+        self.novel.refresh_from_db()
+        self.assertEqual((self.laptop.stock, self.novel.stock), (5, 27))
+        self.assertEqual(order.total_amount, Decimal('3037.47'))
+        self.assertEqual(
+            sorted(order.items.values_list('price', flat=True)), [Decimal('12.50'), Decimal('999.99')]
+        )
+        self.assertFalse(self.cart.items.exists())
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        self.fill_cart([self.novel], quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.laptop, quantity=9)
+
+        with self.assertRaisesMessage(ValueError, f'Insufficient stock for product {self.laptop.pk}'):
+            Order.create_from_cart(self.cart)
+
+        self.novel.refresh_from_db()
+        self.assertEqual(self.novel.stock, 30)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_empty_cart_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'Cart is empty'):
+            Order.create_from_cart(self.cart)
+
+    def test_order_history_shows_product_as_bought_without_catalog_queries(self):
+        self.fill_cart([self.laptop, self.novel])
+        Order.create_from_cart(self.cart)
+        Product.objects.filter(pk=self.laptop.pk).update(name='Laptop Pro', price=Decimal('1299.00'))
+        self.client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get('/api/shop/orders/')
+        self.assertFalse(any('shop_product' in q['sql'] or 'shop_category' in q['sql'] for q in ctx.captured_queries))
+
+        laptop = next(item for item in response.data['results'][0]['items'] if item['product']['id'] == self.laptop.pk)
+        self.assertEqual(laptop['product'], {'id': self.laptop.pk, 'name': 'Laptop', 'slug': 'laptop', 'category': 'Electronics'})
+        self.assertEqual(laptop['price'], '999.99')
+
+    def test_backfill_migration_fills_old_lines_in_chunks(self):
+        backfill = importlib.import_module('shop.migrations.0007_backfill_orderitem_snapshot')
+        order = Order.objects.create(user=self.user, total_amount=Decimal('0'))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for product in [self.laptop, self.novel]
+        ])
+
+        with mock.patch.object(backfill, 'CHUNK_SIZE', 1):
+            backfill.backfill_snapshot(apps, mock.Mock(connection=connection))
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list('product_name', 'product_slug', 'category_name')),
+            [('Laptop', 'laptop', 'Electronics'), ('Novel', 'novel', 'Books')],
+        )
+
+
+
+# -----------------------------
+# QUERY PLANS
+# -----------------------------
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(ShopTestCase):
+    """The hot view queries are answered from an index, with no sort step."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.make_products(30)
+        Order.objects.bulk_create([Order(user=self.user, total_amount=Decimal('1')) for _ in range(5)])
+
+    def plan_for(self, url, table):
+        """EXPLAIN QUERY PLAN of the page query the view ran against `table`."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get(url).status_code, 200)
+        sql = next(q['sql'] for q in ctx.captured_queries if f'FROM "{table}"' in q['sql'] and 'LIMIT' in q['sql'])
+        return self.explain(sql)
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertIndexed(self, plan, index):
+        self.assertIn(f'INDEX {index}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_product_listings(self):
+        self.assertIndexed(self.plan_for('/api/shop/products/', 'shop_product'), 'product_active_created_id_idx')
+        self.assertIndexed(self.plan_for('/api/shop/products/?ordering=price', 'shop_product'), 'product_active_price_id_idx')
+        self.assertIndexed(
+            self.plan_for('/api/shop/products/?category=electronics', 'shop_product'), 'product_active_cat_created_idx'
+        )
+        self.assertIn(
+            'INDEX product_active_price_id_idx',
+            self.plan_for('/api/shop/products/?min_price=1&max_price=5', 'shop_product'),
+        )
+
+    def test_order_history(self):
+        self.client.force_authenticate(self.user)
+        self.assertIndexed(self.plan_for('/api/shop/orders/', 'shop_order'), 'order_user_created_idx')
+
+    def test_orders_by_status(self):
+        sql, params = Order.objects.filter(status=Order.STATUS_PENDING).order_by('-created_at')[:20].query.sql_with_params()
+        self.assertIndexed(self.explain(sql, params), 'order_status_created_idx')
+
+
+# -----------------------------
+# SQLITE PROFILE
+# -----------------------------
+@skipUnless(connection.vendor == 'sqlite', 'SQLite connection settings')
+class SQLiteProfileTests(TransactionTestCase):
+    def test_connections_open_with_profile_pragmas(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -20000)
+
+    def test_profiles(self):
+        self.assertEqual(sqlite_options('stock'), {})
+        self.assertIn('PRAGMA journal_mode=WAL', sqlite_options('production')['init_command'].split(';'))
+        with self.assertRaises(ImproperlyConfigured):
+            sqlite_options('fast')
+
+    def begin_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with immediate_atomic():
+                Category.objects.create(name='Garden', slug='garden')
+        return ctx.captured_queries[0]['sql']
+
+    def test_write_transactions_begin_immediate(self):
+        self.assertEqual(self.begin_statement(), 'BEGIN IMMEDIATE')
+        self.assertIsNone(connection.transaction_mode)
+        with override_settings(SQLITE_IMMEDIATE_WRITES=False):
+            Category.objects.all().delete()
+            self.assertEqual(self.begin_statement(), 'BEGIN')
+
+
+# -----------------------------
+# SHARDED STOCK
+# -----------------------------
+class ShardedStockTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        inventory.enable(self.novel, shards=4)  # 30 units -> 8, 8, 7, 7
+
+    def shards(self):
+        return list(self.novel.stock_shards.order_by('index').values_list('stock', flat=True))
+
+    def buy(self, quantity):
+        CartItem.objects.update_or_create(cart=self.user.cart, product=self.novel, defaults={'quantity': quantity})
+        return Order.create_from_cart(self.user.cart)
+
+    def test_split(self):
+        self.assertEqual(inventory.split(30, 4), [8, 8, 7, 7])
+        self.assertEqual(inventory.split(10, 8, need=4), [5, 5, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(inventory.split(0, 3), [0, 0, 0])
+
+    def test_enable_moves_stock_into_shards(self):
+        self.novel.refresh_from_db()
+        self.assertEqual((self.novel.stock, self.novel.sharded_stock, self.shards()), (0, True, [8, 8, 7, 7]))
+        self.assertEqual(self.get('/api/shop/products/novel/').data['stock'], 30)
+        listed = {p['slug']: p['stock'] for p in self.get('/api/shop/products/').data['results']}
+        self.assertEqual(listed, {'novel': 30, 'laptop': 8})
+
+        inventory.disable(self.novel)
+        self.novel.refresh_from_db()
+        self.assertEqual((self.novel.stock, self.novel.sharded_stock, self.shards()), (30, False, []))
+
+    def test_checkout_decrements_one_shard(self):
+        self.buy(3)
+        self.assertEqual(sum(self.shards()), 27)
+        self.assertEqual(len([stock for stock in self.shards() if stock not in (7, 8)]), 1)
+
+        response = self.post('/api/shop/cart/add/', {'product_id': self.novel.pk, 'quantity': 28})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebalances_when_no_shard_covers_the_line(self):
+        order = self.buy(20)  # every shard holds 8 or less
+        self.assertEqual(order.items.get().quantity, 20)
+        self.assertEqual(sum(self.shards()), 10)
+
+        with self.assertRaisesMessage(ValueError, f'Insufficient stock for product {self.novel.pk}'):
+            self.buy(11)
+        self.assertEqual(sum(self.shards()), 10)
+        self.buy(10)
+        self.assertEqual(self.shards(), [0, 0, 0, 0])
+
+    def test_reserve_is_spread_by_the_next_rebalance(self):
+        Product.objects.filter(pk=self.novel.pk).update(stock=12)  # restocked in the admin
+        self.assertEqual(inventory.available(Product.objects.get(pk=self.novel.pk)), 42)
+        self.buy(40)
+        self.assertEqual(Product.objects.with_stock_total().get(pk=self.novel.pk).stock_total, 2)
+
+        inventory.reset_totals([Product.objects.get(pk=self.novel.pk)])  # stock is the new total
+        self.assertEqual(sum(self.shards()), 0)
+
+    def test_rebalance_without_shard_rows_keeps_the_reserve(self):
+        StockShard.objects.filter(product=self.novel).delete()  # flagged sharded, but no counters
+        Product.objects.filter(pk=self.novel.pk).update(stock=12)
+
+        self.assertEqual(inventory.rebalance(self.novel.pk, need=5), 12)
+        self.assertEqual(Product.objects.get(pk=self.novel.pk).stock, 12)
+        self.assertFalse(inventory.take(self.novel.pk, 5))
+        self.assertEqual(Product.objects.get(pk=self.novel.pk).stock, 12)
+
+    def test_checkout_endpoint_stays_within_budget(self):
+        self.post('/api/shop/cart/add/', {'product_id': self.novel.pk, 'quantity': 2})
+        self.post('/api/shop/cart/add/', {'product_id': self.laptop.pk, 'quantity': 1})
+        response = self.post('/api/shop/orders/checkout/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sum(self.shards()), 28)
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock, 7)
+
+
+# -----------------------------
+# IDEMPOTENCY KEYS
+# -----------------------------
+class IdempotencyKeyTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+
+    def add(self, key, product=None, quantity=1):
+        product = product or self.novel
+        return self.post(
+            '/api/shop/cart/add/', {'product_id': product.pk, 'quantity': quantity}, HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def checkout(self, key):
+        return self.post('/api/shop/orders/checkout/', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_checkout_retry_replays_without_touching_orders(self):
+        self.add('add-1', quantity=2)
+        first = self.checkout('checkout-1')
+        self.assertEqual(first.status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.checkout('checkout-1')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse([
+            q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in ('shop_order', 'shop_cart', 'shop_product'))
+        ])
+        self.novel.refresh_from_db()
+        self.assertEqual(self.novel.stock, 28)
+
+    def test_cart_add_retry_does_not_double_quantity(self):
+        self.assertEqual(self.add('a').status_code, 200)
+        self.assertEqual(self.add('a').status_code, 200)
+        self.assertEqual(self.user.cart.items.get().quantity, 1)
+        self.assertEqual(self.add('b').status_code, 200)  # a new key is a new request
+        self.assertEqual(self.user.cart.items.get().quantity, 2)
+        self.assertNotIn('Idempotent-Replayed', self.add('c'))
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.add('k')
+        response = self.add('k', product=self.laptop)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(self.user.cart.items.filter(product=self.laptop).exists())
+
+    def test_failed_request_releases_the_key(self):
+        self.assertEqual(self.add('k', quantity=999).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.add('k', quantity=1).status_code, 200)
+
+    def test_batch_retry_does_not_apply_operations_twice(self):
+        body = {'operations': [{'op': 'add', 'product_id': self.novel.pk, 'quantity': 2}]}
+        first = self.post('/api/shop/cart/batch/', body, HTTP_IDEMPOTENCY_KEY='b')
+        retry = self.post('/api/shop/cart/batch/', body, HTTP_IDEMPOTENCY_KEY='b')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(self.user.cart.items.get().quantity, 2)
+
+        self.add('a', product=self.laptop)
+        self.post('/api/shop/cart/remove/', {'product_id': self.novel.pk}, HTTP_IDEMPOTENCY_KEY='r')
+        self.add('a2')  # the shopper puts it back; a late retry of the removal must not take it out again
+        retry = self.post('/api/shop/cart/remove/', {'product_id': self.novel.pk}, HTTP_IDEMPOTENCY_KEY='r')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertTrue(self.user.cart.items.filter(product=self.novel).exists())
+
+    def test_raised_client_error_is_not_stored(self):
+        @idempotent
+        def rejecting_view(viewset, request):
+            Category.objects.create(name='Half done', slug='half-done')
+            raise ValidationError({'quantity': 'Not enough stock.'})
+
+        request = APIRequestFactory().post('/api/shop/cart/add/', HTTP_IDEMPOTENCY_KEY='k')
+        request.user = self.user
+        with self.assertRaises(ValidationError):
+            rejecting_view(None, request)
+        self.assertFalse(Category.objects.filter(slug='half-done').exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_returned_server_error_rolls_back_and_releases_the_key(self):
+        @idempotent
+        def failing_view(viewset, request):
+            Category.objects.create(name='Half done', slug='half-done')
+            return Response({'detail': 'Payment provider unavailable.'}, status=503)
+
+        request = APIRequestFactory().post('/api/shop/orders/checkout/', HTTP_IDEMPOTENCY_KEY='k')
+        request.user = self.user
+        self.assertEqual(failing_view(None, request).status_code, 503)
+        self.assertFalse(Category.objects.filter(slug='half-done').exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.1)
+    def test_waiting_on_a_vanishing_claim_backs_off_and_gives_up(self):
+        # The key is taken on every claim but gone by the time it is read
+        with mock.patch('shop.idempotency.claim', return_value=None), \
+                mock.patch('shop.idempotency.time.sleep') as sleep:
+            self.assertEqual(self.checkout('k').status_code, 409)
+        self.assertTrue(sleep.called)
+
+    def test_duplicate_waits_for_the_in_flight_request(self):
+        self.add('add')
+        request = APIRequestFactory().post('/api/shop/orders/checkout/')
+        in_flight = IdempotencyKey.objects.create(
+            user=self.user, key='k', request_hash=request_hash(Request(request)),
+            expires_at=datetime.now(dt_timezone.utc) + timedelta(hours=1),
+        )
+
+        def finish(delay):  # the first request stores its response while we wait
+            IdempotencyKey.objects.filter(pk=in_flight.pk).update(status_code=201, response={'id': 1})
+
+        with mock.patch('shop.idempotency.time.sleep', side_effect=finish) as sleep:
+            response = self.checkout('k')
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual((response.status_code, json.loads(response.content)), (201, {'id': 1}))
+        self.assertFalse(Order.objects.exists())
+
+        IdempotencyKey.objects.filter(pk=in_flight.pk).update(status_code=None)
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            self.assertEqual(self.checkout('k').status_code, 409)
+
+        # A claim whose worker died is taken over
+        IdempotencyKey.objects.filter(pk=in_flight.pk).update(
+            started_at=datetime.now(dt_timezone.utc) - timedelta(hours=1)
+        )
+        self.assertEqual(self.checkout('k').status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        self.add('k')
+        IdempotencyKey.objects.update(expires_at=datetime.now(dt_timezone.utc) - timedelta(seconds=1))
+        self.assertEqual(self.add('k').status_code, 200)  # expired: runs again
+        self.assertEqual(self.user.cart.items.get().quantity, 2)
+
+        IdempotencyKey.objects.update(expires_at=datetime.now(dt_timezone.utc) - timedelta(seconds=1))
+        out = io.StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+
+
+# -----------------------------
+# READ REPLICAS
+# -----------------------------
+# The test database stands in for the replica: routing is observed through
+# the X-Read-Replica header and the aliases the router hands out.
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReadReplicaRoutingTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+
+    def read_aliases(self):
+        seen = []
+        real = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            seen.append(real(router, model, **hints))
+            return seen[-1]
+        return seen, mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record)
+
+    def test_catalog_and_order_history_reads_use_a_replica(self):
+        for url in ('/api/shop/products/', '/api/shop/products/laptop/', '/api/shop/categories/', '/api/shop/orders/'):
+            self.assertEqual(self.get(url)[routers.HEADER], 'default', url)
+        self.assertNotIn(routers.HEADER, self.get('/api/shop/cart/'))
+
+    def test_no_replicas_means_no_routing(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertNotIn(routers.HEADER, self.get('/api/shop/products/'))
+
+    def test_user_reads_from_primary_after_a_write(self):
+        self.post('/api/shop/cart/add/', {'product_id': self.novel.pk, 'quantity': 1})
+        self.assertEqual(self.post('/api/shop/orders/checkout/').status_code, 201)
+
+        seen, patch = self.read_aliases()
+        with patch:
+            response = self.get('/api/shop/orders/')
+        self.assertNotIn(routers.HEADER, response)
+        self.assertEqual(response.data['count'], 1)  # the new order is visible at once
+        self.assertTrue(seen)
+        self.assertEqual(set(seen), {None})
+
+        # Other users are unaffected, and the user goes back once the window is over
+        self.client.force_authenticate(self.create_user('other'))
+        self.assertEqual(self.get('/api/shop/orders/')[routers.HEADER], 'default')
+        self.client.force_authenticate(self.user)
+        cache.delete(f'{routers.STICKY_PREFIX}:{self.user.pk}')
+        self.assertEqual(self.get('/api/shop/orders/')[routers.HEADER], 'default')
+
+    def test_catalog_cache_rebuilds_from_primary_after_a_catalog_write(self):
+        self.laptop.price = Decimal('899.99')
+        self.laptop.save()
+        self.assertTrue(catalog_cache.recently_written())
+
+        seen, patch = self.read_aliases()
+        with patch:
+            response = self.get('/api/shop/products/laptop/')
+        self.assertEqual(response.data['price'], '899.99')
+        self.assertEqual(set(seen), {None})
+
+        catalog_cache.bump(catalog_cache.GLOBAL_SCOPE)
+        cache.delete(catalog_cache.RECENT_WRITE_KEY)  # the replicas have caught up
+        seen, patch = self.read_aliases()
+        with patch:
+            self.get('/api/shop/products/laptop/')
+        self.assertEqual(set(seen), {'default'})
+
+    def test_router_sends_writes_to_primary(self):
+        router = ReplicaRouter()
+        with routers.use_database('replica1'):
+            self.assertEqual(router.db_for_read(Product), 'replica1')
+            self.assertEqual(Product.objects.all().db, 'replica1')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            with routers.use_primary():
+                self.assertIsNone(router.db_for_read(Product))
+        self.assertFalse(router.allow_migrate('default', 'shop'))  # 'default' is the replica here
+
+    def test_lagged_replicator(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            primary, replica = os.path.join(tmp, 'primary.sqlite3'), os.path.join(tmp, 'replica.sqlite3')
+            with closing(sqlite3.connect(primary)) as db, db:
+                db.execute('CREATE TABLE t (n INTEGER)')
+                db.execute('INSERT INTO t VALUES (1)')
+            replicator = LaggedReplicator(primary, [replica], lag=2)
+
+            def rows():
+                with closing(sqlite3.connect(replica)) as db:
+                    try:
+                        return [n for (n,) in db.execute('SELECT n FROM t ORDER BY n')]
+                    except sqlite3.OperationalError:
+                        return None
+
+            self.assertIsNone(replicator.tick(now=0))
+            self.assertIsNone(rows())
+            with closing(sqlite3.connect(primary)) as db, db:
+                db.execute('INSERT INTO t VALUES (2)')
+            self.assertEqual(replicator.tick(now=2), 2)  # applies the 2 s old snapshot only
+            self.assertEqual(rows(), [1])
+            self.assertEqual(replicator.tick(now=4), 2)
+            self.assertEqual(rows(), [1, 2])
+
+
+# -----------------------------
+# ORDER ARCHIVE
+# -----------------------------
+class OrderArchiveTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        old = datetime.now(dt_timezone.utc) - timedelta(days=400)
+        self.orders = []
+        for status, created_at in [
+            (Order.STATUS_COMPLETED, old), (Order.STATUS_CANCELLED, old),
+            (Order.STATUS_PENDING, old), (Order.STATUS_COMPLETED, datetime.now(dt_timezone.utc)),
+        ]:
+            CartItem.objects.create(cart=self.user.cart, product=self.novel, quantity=2)
+            order = Order.create_from_cart(self.user.cart)
+            Order.objects.filter(pk=order.pk).update(status=status, created_at=created_at, placed_at=created_at)
+            self.orders.append(order)
+
+    def archive(self, *args):
+        out = io.StringIO()
+        call_command('archive_orders', *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_finished_orders_in_batches(self):
+        output = self.archive('--batch-size', '1')
+        self.assertIn('Archived 2 orders (2 items) in 2 batches', output)
+        self.assertIn('Lock held per batch', output)
+
+        archived, live = self.orders[:2], self.orders[2:]
+        self.assertEqual(set(ArchivedOrder.objects.values_list('pk', flat=True)), {o.pk for o in archived})
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {o.pk for o in live})
+        self.assertEqual(OrderItem.objects.count(), 2)
+        item = ArchivedOrderItem.objects.get(order=archived[0].pk)
+        self.assertEqual((item.product_name, item.quantity, item.price), ('Novel', 2, Decimal('12.50')))
+        self.assertIn('No orders', self.archive())
+
+    def test_dry_run_changes_nothing(self):
+        self.assertIn('2 orders created before', self.archive('--dry-run'))
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_detail_lookup_falls_back_to_the_archive(self):
+        self.archive()
+        order = self.orders[0]
+        live_by_uuid = self.get(f'/api/shop/orders/{self.orders[3].uuid}/')
+        self.assertEqual(live_by_uuid.data['id'], self.orders[3].pk)
+
+        by_uuid = self.get(f'/api/shop/orders/{order.uuid}/')
+        self.assertEqual(by_uuid.status_code, 200)
+        self.assertEqual(by_uuid.data['status'], Order.STATUS_COMPLETED)
+        self.assertEqual(by_uuid.data['total_amount'], '25.00')
+        self.assertEqual(by_uuid.data['items'][0]['product']['name'], 'Novel')
+        self.assertEqual(self.get(f'/api/shop/orders/{order.pk}/').data, by_uuid.data)
+
+        # Lists only show live orders, and nobody else can see archived ones
+        self.assertEqual(self.get('/api/shop/orders/').data['count'], 2)
+        self.assertEqual(self.get('/api/shop/orders/not-an-id/').status_code, 404)
+        for digits in ('²', '①', '٣'):  # Unicode digits are neither an id nor a uuid
+            self.assertEqual(self.get(f'/api/shop/orders/{digits}/').status_code, 404)
+        self.client.force_authenticate(self.create_user('other'))
+        self.assertEqual(self.get(f'/api/shop/orders/{order.uuid}/').status_code, 404)
+
+    def test_export_includes_archived_lines_in_order(self):
+        self.archive()
+        rows = list(exports.export_rows())
+        # By placed_at, then order id: two archived, then the two live ones
+        self.assertEqual([row['order_uuid'] for row in rows], [order.uuid for order in self.orders])
+
+
+# -----------------------------
+# SALES ROLLUPS
+# -----------------------------
+class SalesRollupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.today = timezone.localdate()
+
+    def checkout(self, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(cart=self.user.cart, product=product, quantity=quantity)
+        return Order.create_from_cart(self.user.cart)
+
+    def rollups(self):
+        return (
+            list(SalesDay.objects.values_list('day', 'units', 'revenue', 'orders').order_by('day')),
+            list(ProductSalesDay.objects.values_list('day', 'product', 'units', 'revenue', 'orders').order_by('product')),
+            list(CategorySalesDay.objects.values_list('day', 'category', 'units', 'revenue', 'orders').order_by('category')),
+        )
+
+    def test_checkout_updates_the_rollups(self):
+        self.checkout((self.laptop, 1), (self.novel, 2))
+        self.checkout((self.novel, 1))
+
+        day = SalesDay.objects.get()
+        self.assertEqual((day.day, day.units, day.revenue, day.orders), (self.today, 4, Decimal('1037.49'), 2))
+        novel = ProductSalesDay.objects.get(product=self.novel)
+        self.assertEqual((novel.units, novel.revenue, novel.orders), (3, Decimal('37.50'), 2))
+        books = CategorySalesDay.objects.get(category=self.books)
+        self.assertEqual((books.units, books.revenue, books.orders), (3, Decimal('37.50'), 2))
+        self.assertEqual(CategorySalesDay.objects.get(category=self.electronics).orders, 1)
+
+    def test_cancelling_an_order_takes_it_out_and_back(self):
+        self.checkout((self.novel, 2))
+        order = self.checkout((self.novel, 1))
+
+        order.status = Order.STATUS_CANCELLED
+        order.save()
+        self.assertEqual(SalesDay.objects.values_list('units', 'orders').get(), (2, 1))
+        self.assertEqual(ProductSalesDay.objects.get().revenue, Decimal('25.00'))
+
+        order.status = Order.STATUS_COMPLETED
+        order.save()
+        self.assertEqual(SalesDay.objects.values_list('units', 'orders').get(), (3, 2))
+        order.save(update_fields=['updated_at'])  # status untouched
+        self.assertEqual(SalesDay.objects.values_list('units', 'orders').get(), (3, 2))
+
+    def test_sales_stay_with_the_category_they_were_made_in(self):
+        kept = self.checkout((self.laptop, 1))
+        cancelled = self.checkout((self.laptop, 2))
+        self.laptop.category = self.books
+        self.laptop.save()
+
+        cancelled.status = Order.STATUS_CANCELLED
+        cancelled.save()
+        electronics = CategorySalesDay.objects.get(category=self.electronics)
+        self.assertEqual((electronics.units, electronics.revenue, electronics.orders), (1, Decimal('999.99'), 1))
+        self.assertFalse(CategorySalesDay.objects.filter(category=self.books).exists())
+
+        before = self.rollups()
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), before)
+        self.assertEqual(kept.items.get().category_id, self.electronics.pk)
+
+    def test_rebuild_matches_incremental_updates_and_counts_archived_orders(self):
+        old = self.checkout((self.laptop, 1))
+        self.checkout((self.laptop, 1), (self.novel, 3))
+        cancelled = self.checkout((self.novel, 1))
+        cancelled.status = Order.STATUS_CANCELLED
+        cancelled.save()
+        # An old completed order, archived: placed_at moves it to another day
+        placed_at = datetime.now(dt_timezone.utc) - timedelta(days=400)
+        Order.objects.filter(pk=old.pk).update(status=Order.STATUS_COMPLETED, created_at=placed_at, placed_at=placed_at)
+        call_command('archive_orders', stdout=io.StringIO())
+        self.assertTrue(ArchivedOrder.objects.filter(pk=old.pk).exists())
+
+        out = io.StringIO()
+        call_command('rebuild_sales_rollups', '--days-per-batch', '7', stdout=out)
+        self.assertIn('(2 days with sales)', out.getvalue())
+        days, products, categories = self.rollups()
+        self.assertEqual(days, [
+            (placed_at.date(), 1, Decimal('999.99'), 1), (self.today, 4, Decimal('1037.49'), 1),
+        ])
+        self.assertEqual(len(products), 3)
+        self.assertEqual(len(categories), 3)
+
+        # Rebuilding today only gives the same rows as the incremental updates did
+        before = self.rollups()
+        call_command('rebuild_sales_rollups', '--start', str(self.today), stdout=io.StringIO())
+        self.assertEqual(self.rollups(), before)
+
+    def test_analytics_endpoints_read_the_rollups(self):
+        self.checkout((self.laptop, 1), (self.novel, 2))
+        self.checkout((self.novel, 1))
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.get('/api/shop/analytics/sales/').status_code, 403)
+
+        staff = self.create_user('finance')
+        staff.is_staff = True
+        staff.save()
+        self.client.force_authenticate(staff)
+        sales = self.get('/api/shop/analytics/sales/')  # query budget of one, enforced here
+        self.assertEqual(sales.status_code, 200)
+        self.assertEqual(sales.data['totals'], {'units': 4, 'revenue': '1037.49', 'orders': 2})
+        self.assertEqual(sales.data['days'][0]['day'], str(self.today))
+
+        products = self.get('/api/shop/analytics/products/', {'limit': 1}).data['results']
+        self.assertEqual(products, [{'units': 1, 'revenue': '999.99', 'orders': 1, 'id': self.laptop.pk, 'name': 'Laptop'}])
+        categories = self.get('/api/shop/analytics/categories/').data['results']
+        self.assertEqual([row['name'] for row in categories], ['Electronics', 'Books'])
+        self.assertEqual(categories[1]['orders'], 2)
+
+        last_year = self.get('/api/shop/analytics/sales/', {'start': '2000-01-01', 'end': '2000-12-31'})
+        self.assertEqual(last_year.data['totals']['orders'], 0)
+        self.assertEqual(self.get('/api/shop/analytics/sales/', {'start': 'yesterday'}).status_code, 400)
+
+
+# -----------------------------
+# CART BATCH
+# -----------------------------
+class CartBatchTests(ShopTestCase):
+    url = '/api/shop/cart/batch/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        self.cart = self.user.cart
+        CartItem.objects.create(cart=self.cart, product=self.novel, quantity=2)
+
+    def quantities(self):
+        return dict(self.cart.items.values_list('product__slug', 'quantity'))
+
+    def test_applies_operations_in_order_and_returns_cart(self):
+        extra = self.make_products(3)
+        response = self.post(self.url, {'operations': [
+            {'op': 'add', 'product_id': self.novel.pk, 'quantity': 3},
+            {'op': 'set', 'product_id': self.laptop.pk, 'quantity': 2},
+            {'op': 'add', 'product_id': extra[0].pk},
+            {'op': 'add', 'product_id': extra[1].pk},
+            {'op': 'remove', 'product_id': extra[1].pk},
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {'novel': 5, 'laptop': 2, 'item-0': 1})
+        self.assertEqual(len(response.data['items']), 3)
+
+    def test_failed_line_reports_per_line_and_applies_nothing(self):
+        response = self.post(self.url, {'operations': [
+            {'op': 'add', 'product_id': self.laptop.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.novel.pk, 'quantity': 31},
+            {'op': 'add', 'product_id': 999999},
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['operations']
+        self.assertEqual(errors[0], {})
+        self.assertIn('stock', errors[1])
+        self.assertIn('product', errors[2])
+        self.assertEqual(self.quantities(), {'novel': 2})
+
+    def test_adds_accumulate_against_stock(self):
+        response = self.post(self.url, {'operations': [
+            {'op': 'add', 'product_id': self.laptop.pk, 'quantity': 5},
+            {'op': 'add', 'product_id': self.laptop.pk, 'quantity': 5},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['operations'][0], {})
+        self.assertIn('stock', response.data['operations'][1])
+
+    def test_write_queries_do_not_grow_with_batch_size(self):
+        def batch_queries(products):
+            operations = [{'op': 'add', 'product_id': p.pk} for p in products]
+            with CaptureQueriesContext(connection) as ctx:
+                self.post(self.url, {'operations': operations})
+            return [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')]
+
+        small = batch_queries(self.make_products(2, prefix='small'))
+        large = batch_queries(self.make_products(30, prefix='large'))
+        self.assertEqual(len(small), len(large))
+
+
+# -----------------------------
+# CART RENDERING
+# -----------------------------
+class CartRenderingTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        self.cart = self.user.cart
+
+    def test_fifty_item_cart_renders_in_three_queries(self):
+        products = self.make_products(50, price=Decimal('19.99'))
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=p, quantity=3) for p in products])
+
+        with self.assertNumQueries(3):
+            response = self.get('/api/shop/cart/')
+
+        self.assertEqual(len(response.data['items']), 50)
+        self.assertEqual(response.data['items'][0]['subtotal'], Decimal('59.97'))
+        self.assertEqual(response.data['items'][0]['product']['category'], 'Electronics')
+        self.assertEqual(response.data['total'], Decimal('2998.50'))
+
+    def test_sharded_lines_do_not_add_queries(self):
+        products = self.make_products(6, stock=30)
+        for product in products[:4]:
+            inventory.enable(product, shards=3)
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=p) for p in products])
+
+        with self.assertNumQueries(3):
+            response = self.get('/api/shop/cart/')
+
+        self.assertEqual([item['product']['stock'] for item in response.data['items']], [30] * 6)
+
+    def test_totals_match_python_arithmetic(self):
+        CartItem.objects.create(cart=self.cart, product=self.laptop, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.novel, quantity=7)
+
+        cart = Cart.objects.with_items().get(pk=self.cart.pk)
+        self.assertEqual(cart.total(), Decimal('999.99') * 3 + Decimal('12.50') * 7)
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).total(), cart.total())
+
+    @override_settings(SQL_QUERY_BUDGET_STRICT=False)  # one-off path for accounts that predate carts
+    def test_cart_is_created_on_first_view(self):
+        self.cart.delete()
+        response = self.get('/api/shop/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['items'], response.data['total']), ([], 0))
+
+
+# -----------------------------
+# ASYNC CATALOG VIEWS
+# -----------------------------
+class AsyncCatalogTests(ShopTestCase):
+    def assertSameAsSync(self, path, params=None):
+        sync = self.get(f'/api/shop/{path}', params)
+        cache.clear()
+        native = self.get(f'/api/shop/async/{path}', params)
+        self.assertEqual(native.status_code, sync.status_code)
+        # Identical apart from pagination links pointing back at the async route
+        self.assertEqual(native.content.replace(b'/async/', b'/'), sync.content)
+
+    def test_product_list_matches_sync_endpoint(self):
+        self.make_products(12)
+        self.assertSameAsSync('products/')
+        self.assertSameAsSync('products/', {'page': 2, 'ordering': 'price'})
+        self.assertSameAsSync('products/', {'category': 'books', 'max_price': '50'})
+        self.assertSameAsSync('products/', {'search': 'lapt'})
+        self.assertSameAsSync('products/', {'page': 9})
+
+    def test_detail_and_categories_match_sync_endpoints(self):
+        self.assertSameAsSync('products/laptop/')
+        self.assertSameAsSync('products/missing/')
+        self.assertSameAsSync('categories/')
+        self.assertSameAsSync(f'categories/{self.books.pk}/')
+
+    def test_invalid_filter_is_400(self):
+        response = self.get('/api/shop/async/products/', {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_price', response.json())
+
+    def test_writes_are_rejected(self):
+        self.assertEqual(self.post('/api/shop/async/products/', {}).status_code, 405)
+
+
+# -----------------------------
+# CATALOG IMPORT
+# -----------------------------
+class ImportCatalogTests(ShopTestCase):
+    def write_feed(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def run_import(self, path, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_catalog', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_upserts_by_slug_and_creates_categories(self):
+        path = self.write_feed('.csv', (
+            'name,slug,description,price,stock,category\n'
+            'Laptop,laptop,Updated,899.00,3,Electronics\n'
+            'Desk Lamp,,Warm light,24.50,40,Home & Kitchen\n'
+            'Broken,,,free,1,Books\n'
+        ))
+        out, err = self.run_import(path, '--chunk-size', '1')
+
+        self.laptop.refresh_from_db()
+        self.assertEqual((self.laptop.price, self.laptop.stock, self.laptop.description), (Decimal('899.00'), 3, 'Updated'))
+        lamp = Product.objects.get(slug='desk-lamp')
+        self.assertEqual(lamp.category.name, 'Home & Kitchen')
+        self.assertIn('Line 4', err)
+        self.assertIn('Imported 2 rows', out)
+        self.assertIn('1 rows rejected', out)
+        # Bulk writes bypass signals; the search index is maintained per chunk
+        self.assertEqual(
+            [p['slug'] for p in self.get('/api/shop/products/', {'search': 'warm'}).data['results']], ['desk-lamp']
+        )
+
+    def test_category_names_that_collide_on_slug_get_unique_slugs(self):
+        path = self.write_feed('.csv', (
+            'name,slug,description,price,stock,category\n'
+            'Pan,,,10.00,1,Home & Kitchen\n'
+            'Pot,,,10.00,1,Home Kitchen\n'
+            'Atlas,,,10.00,1,books\n'
+            'Kettle,,,10.00,1,!!!\n'
+            'Teapot,,,10.00,1,???\n'
+            f'Mug,,,10.00,1,{"x" * 121}\n'
+            'Cup,,,10.00,1,HOME KITCHEN\n'
+        ))
+        out, err = self.run_import(path)
+
+        slugs = dict(Product.objects.filter(slug__in=['pan', 'pot', 'atlas', 'kettle', 'teapot', 'cup'])
+                     .values_list('slug', 'category__slug'))
+        self.assertEqual(slugs['pan'], 'home-kitchen')
+        self.assertEqual(slugs['pot'], 'home-kitchen-2')
+        self.assertEqual(slugs['cup'], 'home-kitchen-2')  # names match case-insensitively
+        self.assertEqual(slugs['atlas'], 'books')  # the existing "Books"
+        self.assertEqual((slugs['kettle'], slugs['teapot']), ('category', 'category-2'))
+        self.assertIn('Line 7: category is longer than 120 characters', err)
+        self.assertIn('Imported 6 rows', out)
+
+    def test_category_created_concurrently_is_reused_or_the_row_rejected(self):
+        path = self.write_feed('.csv', 'name,slug,description,price,stock,category\nRake,,,5.00,1,Garden\n')
+
+        # Created by another process after the import loaded the categories
+        Category.objects.create(name='garden', slug='garden')
+        with mock.patch.object(Category.objects, 'values_list', return_value=[]):
+            self.run_import(path)
+        self.assertEqual(Product.objects.get(slug='rake').category.name, 'garden')
+
+        path = self.write_feed('.csv', 'name,slug,description,price,stock,category\nHoe,,,5.00,1,Shed\n')
+        with mock.patch.object(Category.objects, 'create', side_effect=IntegrityError):
+            out, err = self.run_import(path)
+        self.assertIn("Line 2: could not create category 'Shed'", err)
+        self.assertIn('1 rows rejected', out)
+
+    def test_jsonl_dry_run_validates_without_writing(self):
+        path = self.write_feed('.jsonl', (
+            '{"name": "Tablet", "price": "199.99", "stock": 4, "category": "Gadgets"}\n'
+            '{"name": "Tablet Pro", "price": "-1", "stock": 4, "category": "Gadgets"}\n'
+            'not json\n'
+        ))
+        out, err = self.run_import(path, '--dry-run')
+
+        self.assertIn('Validated 1 rows', out)
+        self.assertIn('Line 2', err)
+        self.assertIn('Line 3', err)
+        self.assertFalse(Product.objects.filter(slug__startswith='tablet').exists())
+        self.assertFalse(Category.objects.filter(name='Gadgets').exists())
+
+    def test_queries_per_chunk_do_not_depend_on_row_count(self):
+        rows = ''.join(f'Bulb {i},,,1.00,5,Electronics\n' for i in range(50))
+        path = self.write_feed('.csv', 'name,slug,description,price,stock,category\n' + rows)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_import(path, '--chunk-size', '50')
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.assertEqual(Product.objects.filter(slug__startswith='bulb-').count(), 50)
+
+
+# -----------------------------
+# ORDER EXPORT
+# -----------------------------
+class OrderExportTests(ShopTestCase):
+    url = '/api/shop/orders/export/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.staff = self.create_user('finance')
+        self.staff.is_staff = True
+        self.staff.save()
+
+        cart = self.user.cart
+        for placed_at, quantity in [('2024-01-10T09:00:00Z', 2), ('2024-03-05T18:30:00Z', 1)]:
+            CartItem.objects.create(cart=cart, product=self.novel, quantity=quantity)
+            order = Order.create_from_cart(cart)
+            Order.objects.filter(pk=order.pk).update(placed_at=placed_at)
+
+    def export(self, **params):
+        response = self.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.get(self.url).status_code, 403)
+
+    def test_ndjson_streams_one_line_per_order_item_within_range(self):
+        self.client.force_authenticate(self.staff)
+        lines = [json.loads(line) for line in self.export(start='2024-01-01', end='2024-01-31').splitlines()]
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['quantity'], 2)
+        self.assertEqual(lines[0]['unit_price'], '12.50')
+        self.assertEqual(lines[0]['line_total'], '25.00')
+        self.assertEqual(lines[0]['user_email'], 'buyer@example.com')
+
+    def test_csv_has_header_and_all_rows(self):
+        self.client.force_authenticate(self.staff)
+        rows = list(csv.reader(io.StringIO(self.export(output='csv'))))
+        self.assertEqual(rows[0][:3], ['order_uuid', 'order_status', 'placed_at'])
+        self.assertEqual(len(rows), 3)
+
+    def test_unplaced_orders_sort_last_in_the_merged_stream(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.laptop, quantity=1)
+        unplaced = Order.create_from_cart(self.user.cart)
+        Order.objects.filter(pk=unplaced.pk).update(placed_at=None)
+        archived = Order.objects.exclude(pk=unplaced.pk).earliest('placed_at')
+        Order.objects.filter(pk=archived.pk).update(status=Order.STATUS_COMPLETED)
+        call_command('archive_orders', '--days', '0', stdout=io.StringIO())
+
+        rows = list(exports.export_rows())
+        self.assertEqual(
+            [(row['placed_at'] is None, str(row['order_uuid'])) for row in rows],
+            [
+                (False, str(archived.uuid)),
+                (False, str(Order.objects.exclude(pk=unplaced.pk).get().uuid)),
+                (True, str(unplaced.uuid)),
+            ],
+        )
+
+    def test_invalid_parameters_are_rejected(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.get(self.url, {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.get(self.url, {'start': 'yesterday'}).status_code, 400)
+
+    def test_management_command_writes_csv(self):
+        out = io.StringIO()
+        call_command('export_orders', '--format', 'csv', '--start', '2024-03-01', stdout=out)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 2)
+
+
+# -----------------------------
+# FACETS
+# -----------------------------
+class ProductFacetTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(
+            name='Cookbook', slug='cookbook', price=Decimal('30.00'), stock=3, category=self.books
+        )
+        Product.objects.create(
+            name='Hidden', slug='hidden', price=Decimal('1.00'), stock=3, category=self.books, is_active=False
+        )
+
+    def facets(self, **params):
+        response = self.get('/api/shop/products/', dict(params, facets='true'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['facets']
+
+    def test_counts_per_category_and_price_range(self):
+        facets = self.facets()
+        self.assertEqual(
+            facets['category'],
+            [{'slug': 'books', 'name': 'Books', 'count': 2}, {'slug': 'electronics', 'name': 'Electronics', 'count': 1}],
+        )
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 1, 0, 0, 1])
+        self.assertEqual((facets['price'][0]['min'], facets['price'][0]['max']), (None, '25'))
+
+    def test_each_facet_ignores_its_own_filter(self):
+        facets = self.facets(category='books', max_price='20')
+        # Category counts honour the price filter, not the category one
+        self.assertEqual(facets['category'], [{'slug': 'books', 'name': 'Books', 'count': 1}])
+        # Price counts honour the category filter, not the price one
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 1, 0, 0, 0])
+
+    def test_facets_follow_search_and_custom_ranges(self):
+        facets = self.facets(search='cook', price_ranges='0-50,50-')
+        self.assertEqual([c['slug'] for c in facets['category']], ['books'])
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 0])
+
+        response = self.get('/api/shop/products/', {'facets': 'true', 'price_ranges': '50-10'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets_are_computed_in_two_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.facets(category='books')
+        # count + page, then one grouped query per facet
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+    @override_settings(PRODUCT_FACET_COUNT_TABLE=True)
+    def test_precomputed_table_tracks_product_changes(self):
+        call_command('rebuild_facet_counts', stdout=io.StringIO())
+        live = self.facets(category='')
+
+        self.laptop.price = Decimal('20.00')
+        self.laptop.category = self.books
+        self.laptop.save()
+        self.novel.delete()
+        Product.objects.create(name='Radio', slug='radio', price=Decimal('75'), stock=1, category=self.electronics)
+
+        with CaptureQueriesContext(connection) as ctx:
+            precomputed = self.facets()
+        self.assertFalse(any('GROUP BY' in q['sql'] for q in ctx.captured_queries))
+
+        with override_settings(PRODUCT_FACET_COUNT_TABLE=False):
+            cache.clear()
+            self.assertEqual(precomputed, self.facets())
+        self.assertNotEqual(live, precomputed)
+
+
+# -----------------------------
+# VALUES() FAST PATH
+# -----------------------------
+class ProductValuesSerializerTests(ShopTestCase):
+    def test_output_is_byte_identical_to_product_serializer(self):
+        Product.objects.filter(pk=self.laptop.pk).update(
+            image='products/laptop front.jpg', description='Ünïcode "quoted"',
+            image_variants={
+                'source': 'products/laptop front.jpg',
+                'sizes': {'thumb': {'name': 'products/laptop front.thumb.webp', 'width': 160, 'height': 90}},
+            },
+        )
+        Product.objects.create(
+            name='Free Sample', slug='free-sample', price=Decimal('0'), stock=0, category=self.books
+        )
+        request = APIRequestFactory().get('/api/shop/products/', secure=True)
+        context = {'request': Request(request)}
+        queryset = Product.objects.select_related('category').order_by('pk')
+
+        expected = ProductSerializer(queryset, many=True, context=context).data
+        fast = ProductValuesSerializer(ProductValuesSerializer.values(queryset), context=context).data
+
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(expected))
+
+    def test_list_endpoint_uses_fast_path_without_per_row_queries(self):
+        self.make_products(10)
+        with self.assertNumQueries(2):  # count + page (category joined)
+            response = self.get('/api/shop/products/')
+        self.assertEqual(response.data['results'][0]['category'], 'Electronics')
+
+
+# -----------------------------
+# IMAGE VARIANTS
+# -----------------------------
+class ProductImageVariantTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=media.name, PRODUCT_IMAGE_WORKERS=0,
+            PRODUCT_IMAGE_VARIANTS={'thumb': 160, 'medium': 640, 'huge': 4000},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, width=1200, height=900, name='lamp.jpg'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'orange').save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def test_upload_renders_webp_variants_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptop.image = self.upload()
+            self.laptop.save()
+
+        self.laptop.refresh_from_db()
+        sizes = self.laptop.image_variants['sizes']
+        self.assertEqual(self.laptop.image_variants['source'], self.laptop.image.name)
+        self.assertEqual(set(sizes), {'thumb', 'medium'})  # never upscaled
+        self.assertEqual((sizes['thumb']['width'], sizes['thumb']['height']), (160, 120))
+        storage = images.get_storage()
+        with storage.open(sizes['medium']['name']) as f, Image.open(f) as variant:
+            self.assertEqual((variant.format, variant.size), ('WEBP', (640, 480)))
+        self.assertEqual(sizes['thumb']['name'], self.laptop.image.name.replace('.jpg', '.thumb.webp'))
+
+        detail = self.get('/api/shop/products/laptop/').data['image_variants']
+        listed = next(p for p in self.get('/api/shop/products/').data['results'] if p['slug'] == 'laptop')
+        self.assertEqual(detail['thumb']['url'], f"https://testserver/media/{sizes['thumb']['name']}")
+        self.assertEqual(listed['image_variants'], detail)
+
+    def test_replaced_image_hides_old_variants_until_rendered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptop.image = self.upload()
+            self.laptop.save()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.laptop.image = self.upload(name='lamp-v2.jpg')
+            self.laptop.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.get('/api/shop/products/laptop/').data['image_variants'], {})
+
+        # Stock-only saves don't schedule anything
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.laptop.save(update_fields=['stock'])
+        self.assertEqual(callbacks, [])
+
+    def test_backfill_command_renders_existing_images(self):
+        storage = images.get_storage()
+        names = [storage.save(f'products/p{i}.jpg', self.upload(800, 400)) for i in range(2)]
+        Product.objects.filter(pk=self.laptop.pk).update(image=names[0])
+        Product.objects.filter(pk=self.novel.pk).update(image=names[1])
+        broken = Product.objects.create(
+            name='Broken', slug='broken', price=Decimal('1'), category=self.books, image='products/missing.jpg'
+        )
+
+        out = io.StringIO()
+        with self.assertLogs('shopsphere.images', 'WARNING'):
+            call_command('generate_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('Rendered variants for 2 products', out.getvalue())
+        self.assertIn('1 failed', out.getvalue())
+        self.assertEqual(Product.objects.get(pk=self.novel.pk).image_variants['sizes']['thumb']['height'], 80)
+        self.assertEqual(Product.objects.get(pk=broken.pk).image_variants, {})
+
+        out = io.StringIO()
+        with self.assertLogs('shopsphere.images', 'WARNING'):
+            call_command('generate_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('2 already current', out.getvalue())
+
+
+# -----------------------------
+# JSON RENDERER / PARSER
+# -----------------------------
+class FastJSONTests(ShopTestCase):
+    def payload(self):
+        order = Order.objects.create(user=self.create_user(), total_amount=Decimal('59.97'))
+        return {
+            'uuid': order.uuid,
+            'total': Decimal('59.97'),
+            'zero': Decimal('0.00'),
+            'utc': datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'lagos': datetime(2024, 3, 1, 13, 30, tzinfo=dt_timezone(timedelta(hours=1))),
+            'day': date(2024, 3, 1),
+            'time': time(9, 5, 1, 250000),
+            'elapsed': timedelta(minutes=3),
+            'label': gettext_lazy('Invalid page.'),
+            'text': 'Ünïcode "quoted"\u2028line\u2029para',
+            'ids': {1: 'one', 2: 'two'},
+            'order': OrderSerializer(order).data,
+            'products': ProductSerializer(Product.objects.select_related('category'), many=True).data,
+        }
+
+    def test_output_matches_drf_json_renderer(self):
+        data = self.payload()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        data['big'] = 2 ** 70  # beyond orjson's range, falls back to the stdlib encoder
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_and_non_finite_output_use_stdlib_rules(self):
+        data = {'price': Decimal('9.99'), 'name': 'Lamp'}
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type)
+        )
+        with self.assertRaises(ValueError):
+            FastJSONRenderer().render({'price': Decimal('NaN')})
+
+    def test_parser_matches_drf_json_parser(self):
+        body = JSONRenderer().render({'big': 2 ** 70, 'price': 12.5, 'text': 'Ünïcode', 'items': [1, None]})
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+        for bad in [b'{"a": ', b'{"a": NaN}']:
+            with self.assertRaises(ParseError) as fast:
+                FastJSONParser().parse(io.BytesIO(bad))
+            with self.assertRaises(ParseError) as stock:
+                JSONParser().parse(io.BytesIO(bad))
+            self.assertEqual(str(fast.exception.detail), str(stock.exception.detail))
+
+    def test_without_orjson_the_stock_encoder_and_parser_are_used(self):
+        data = self.payload()
+        body = JSONRenderer().render({'big': 2 ** 70, 'price': 12.5, 'text': 'Ünïcode'})
+        with mock.patch('Shopsphere.renderers.orjson', None), mock.patch('Shopsphere.parsers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+            self.client.force_authenticate(self.create_user('shopper'))
+            response = self.post('/api/shop/cart/add/', {'product_id': self.novel.pk, 'quantity': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_api_responses_and_requests_use_fast_pair(self):
+        response = self.get('/api/shop/products/')
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        self.client.force_authenticate(self.create_user())
+        response = self.post('/api/shop/cart/add/', {'product_id': self.novel.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+
+# -----------------------------
+# SQL INSTRUMENTATION
+# -----------------------------
+class QueryInstrumentationTests(ShopTestCase):
+    def test_server_timing_reports_queries(self):
+        response = self.get('/api/shop/products/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 queries", app;dur=[\d.]+$')
+
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'  AND n > 3"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?',
+        )
+        self.assertEqual(fingerprint('SAVEPOINT "s1402_x12"'), fingerprint('SAVEPOINT "s77_x1"'))
+
+    def test_view_over_budget_fails(self):
+        with mock.patch.object(ProductViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries, budget is 1'):
+                self.get('/api/shop/products/')
+
+    def test_n_plus_one_is_detected(self):
+        user = self.create_user()
+        self.client.force_authenticate(user)
+        self.make_products(6)
+        CartItem.objects.bulk_create([CartItem(cart=user.cart, product=p) for p in Product.objects.all()])
+
+        # Without with_items() every line loads its product and category separately
+        with mock.patch.object(CartViewSet, 'get_cart_for_display', lambda view, user: Cart.objects.get(user=user)):
+            with self.assertRaisesMessage(QueryBudgetExceeded, '8x SELECT "shop_category"."id"'):
+                self.get('/api/shop/cart/')
+
+            with override_settings(SQL_QUERY_BUDGET_STRICT=False), self.assertLogs('shopsphere.sql', 'WARNING') as logs:
+                self.get('/api/shop/cart/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/api/shop/cart/')
+        self.assertEqual(max(entry['count'] for entry in record['repeated']), 8)
+
+
+# -----------------------------
+# BENCHMARK SUITE
+# -----------------------------
+class BenchmarkSuiteTests(TestCase):
+    def generate(self, *args):
+        call_command(
+            'generate_dataset', '--categories', '3', '--products', '40', '--users', '4', '--orders', '10',
+            '--batch-size', '7', *args, stdout=io.StringIO(),
+        )
+
+    def test_generate_dataset(self):
+        self.generate()
+        self.assertEqual(Product.objects.filter(slug__startswith='bench-').count(), 40)
+        self.assertEqual(Cart.objects.filter(user__username__startswith='bench-user-').count(), 4)
+        self.assertEqual(CartItem.objects.count(), 12)
+        self.assertEqual(Order.objects.count(), 10)
+
+        item = OrderItem.objects.select_related('product__category').first()
+        self.assertEqual(item.product_name, item.product.name)
+        self.assertEqual(item.category_name, item.product.category.name)
+        order = item.order
+        self.assertEqual(order.total_amount, sum(line.price * line.quantity for line in order.items.all()))
+
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            self.generate()
+        self.generate('--replace')
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 10)
+
+    def test_benchmark_saves_and_compares_baseline(self):
+        self.generate()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            options = ['--requests', '3', '--warmup', '0', '--login-requests', '1']
+            call_command('benchmark_endpoints', *options, '--save', path, stdout=io.StringIO())
+            with open(path) as f:
+                baseline = json.load(f)
+
+            self.assertEqual(baseline['dataset']['products'], 40)
+            for name, result in baseline['endpoints'].items():
+                self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(baseline['endpoints']['products_detail']['queries'], 1)
+            self.assertEqual(CartItem.objects.count(), 12)  # writes were rolled back
+
+            out = io.StringIO()
+            call_command('benchmark_endpoints', *options, '--compare', path, '--tolerance', '1000', stdout=out)
+            self.assertIn('No regressions', out.getvalue())
+
+            baseline['endpoints']['cart_view']['queries'] -= 1
+            with open(path, 'w') as f:
+                json.dump(baseline, f)
+            with self.assertRaisesMessage(CommandError, 'cart_view'):
+                call_command('benchmark_endpoints', *options, '--compare', path, '--tolerance', '1000', stdout=io.StringIO())
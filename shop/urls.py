@@ -1,6 +1,8 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import CategoryViewSet, ProductViewSet, CartViewSet, OrderViewSet
+from . import async_views
+from .views import CategoryViewSet, ProductViewSet, CartViewSet, OrderViewSet, SalesAnalyticsViewSet
 
 router = DefaultRouter()
 
@@ -12,4 +14,15 @@ router.register(r'products', ProductViewSet, basename='product')
 router.register(r'cart', CartViewSet, basename='cart')
 router.register(r'orders', OrderViewSet, basename='order')
 
-urlpatterns = router.urls
\ No newline at end of file
+# Staff endpoints
+router.register(r'analytics', SalesAnalyticsViewSet, basename='analytics')
+
+# Async catalog reads (native under Shopsphere.asgi)
+async_urlpatterns = [
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<slug:slug>/', async_views.product_detail, name='async-product-detail'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('async/categories/<int:pk>/', async_views.category_detail, name='async-category-detail'),
+]
+
+urlpatterns = router.urls + async_urlpatterns
@@ -1,58 +1,216 @@
+from datetime import timedelta
+
 from django.shortcuts import render
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.filters import OrderingFilter
 from rest_framework.exceptions import ValidationError
 
+from Shopsphere import routers
+from Shopsphere.db import immediate_atomic
+from Shopsphere.routers import ReplicaReadMixin
+
 from .models import Category, Product, Cart, CartItem, Order
-from .serializers import CategorySerializer, ProductSerializer, CartSerializer, OrderSerializer
+from .serializers import (
+    CategorySerializer, ProductSerializer, CartSerializer, OrderSerializer,
+    CartBatchSerializer, CartOperationSerializer, ProductValuesSerializer,
+    SalesBreakdownSerializer, SalesDaySerializer, SalesTotalsSerializer,
+)
 from .filters import ProductFilter
+from .idempotency import idempotent
+from .pagination import ProductKeysetPagination
+from .search import ProductSearchFilter
+from . import cache as catalog_cache
+from . import archive, exports, facets, rollups
+
+
+# -----------------------------
+# CATALOG CACHE MIXIN
+# -----------------------------
+class CatalogCacheMixin:
+    """
+    Serve list/retrieve responses from the versioned catalog cache.
+    `X-Cache` tells clients (and load tests) whether the response was a hit.
+    """
+    cache_namespace = None
+
+    def get_list_cache_scopes(self, request):
+        return [catalog_cache.GLOBAL_SCOPE]
+
+    def get_detail_cache_scopes(self, request):
+        return [catalog_cache.GLOBAL_SCOPE]
+
+    def _cached_response(self, action, scopes, build):
+        key = catalog_cache.build_key(f'{self.cache_namespace}:{action}', self.request, scopes)
+
+        def build_data():
+            if catalog_cache.recently_written():
+                with routers.use_primary():
+                    return build().data
+            return build().data
+
+        data, hit = catalog_cache.get_or_build(key, build_data)
+        response = Response(data)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return self._cached_response(
+            'list', self.get_list_cache_scopes(request), lambda: build(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return self._cached_response(
+            'detail', self.get_detail_cache_scopes(request), lambda: build(request, *args, **kwargs)
+        )
+
+
+# -----------------------------
+# FACETED LIST MIXIN
+# -----------------------------
+class FacetedListMixin:
+    """
+    `?facets=true` adds category and price-range counts for the current
+    search/filters next to the page. `?price_ranges=-25,25-100,100-`
+    overrides the configured ranges.
+    """
+    facet_query_param = 'facets'
+    price_ranges_query_param = 'price_ranges'
+    facet_filter_params = ['category', 'min_price', 'max_price', 'search']
+
+    def facets_requested(self, request):
+        return request.query_params.get(self.facet_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not self.facets_requested(request):
+            return response
+
+        data = response.data if isinstance(response.data, dict) else {'results': response.data}
+        data['facets'] = self.get_facets(request)
+        response.data = data
+        return response
+
+    def get_facets(self, request):
+        try:
+            ranges = facets.parse_price_ranges(request.query_params.get(self.price_ranges_query_param))
+        except facets.InvalidRanges as e:
+            raise ValidationError({self.price_ranges_query_param: str(e)})
+
+        if not any(request.query_params.get(param) for param in self.facet_filter_params):
+            counts = facets.precomputed_counts(ranges)
+            if counts is not None:
+                return counts
+
+        queryset = ProductSearchFilter().filter_queryset(request, self.get_queryset(), self)
+        filterset = self.filterset_class(request.query_params, queryset=queryset, request=request)
+        return filterset.facet_counts(ranges)
 
 
 # -----------------------------
 # CATEGORY ViewSet
 # -----------------------------
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
+    cache_namespace = 'categories'
+    query_budget = {'list': 2, 'retrieve': 1}  # enforced in tests - see Shopsphere/middleware.py
+
+    def get_list_cache_scopes(self, request):
+        return [catalog_cache.CATEGORIES_SCOPE]
+
+    def get_detail_cache_scopes(self, request):
+        return [catalog_cache.CATEGORIES_SCOPE]
 
 
 # -----------------------------
 # PRODUCT ViewSet
 # -----------------------------
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.filter(is_active=True).select_related('category')
+class ProductViewSet(ReplicaReadMixin, CatalogCacheMixin, FacetedListMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Product.objects.filter(is_active=True).select_related('category').with_stock_total()
     serializer_class = ProductSerializer
     lookup_field = 'slug'
+    cache_namespace = 'products'
+    query_budget = {'list': 4, 'retrieve': 1}  # count + page, plus two grouped facet queries
 
-    filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
+    # Search runs last so it can order by relevance when no ?ordering= is given
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['name']
     ordering_fields = ['price', 'created_at']
     ordering = ['-created_at']
 
+    # Serve list pages from .values() rows - see ProductValuesSerializer
+    values_list_fast_path = True
+
+    def use_values_fast_path(self):
+        return self.action == 'list' and self.values_list_fast_path
+
+    def paginate_queryset(self, queryset):
+        if self.use_values_fast_path():
+            queryset = ProductValuesSerializer.values(queryset)
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.use_values_fast_path() and kwargs.get('many'):
+            kwargs.setdefault('context', self.get_serializer_context())
+            return ProductValuesSerializer(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    @property
+    def paginator(self):
+        """Use keyset pagination when the client asks for `?pagination=cursor`."""
+        if not hasattr(self, '_paginator'):
+            if ProductKeysetPagination.is_requested(self.request):
+                self._paginator = ProductKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_list_cache_scopes(self, request):
+        # Lists narrowed to one category only depend on that category's products,
+        # unless they carry facets, which count every category
+        category = request.query_params.get('category')
+        if category and not self.facets_requested(request):
+            return [catalog_cache.CATEGORIES_SCOPE, catalog_cache.category_scope(category)]
+        return [catalog_cache.GLOBAL_SCOPE]
+
 
 # -----------------------------
 # CART ViewSet
 # -----------------------------
 class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    # None of these may grow with the number of cart lines or batch operations
+    query_budget = {'list': 3, 'add': 8, 'remove': 2, 'batch': 9, 'clear': 2}
 
     def get_cart(self, user):
-        cart, _ = Cart.objects.get_or_create(user=user)
+        return Cart.for_user(user)
+
+    def get_cart_for_display(self, user):
+        """The user's cart with items, products and totals loaded in a fixed number of queries."""
+        cart = Cart.objects.with_items().filter(user=user).first()
+        if cart is None:
+            self.get_cart(user)
+            cart = Cart.objects.with_items().get(user=user)
         return cart
 
     def list(self, request):
-        cart = self.get_cart(request.user)
+        cart = self.get_cart_for_display(request.user)
         return Response(CartSerializer(cart).data)
 
     @action(detail=False, methods=['post'])
-    @transaction.atomic
+    @idempotent
+    @immediate_atomic()
     def add(self, request):
         cart = self.get_cart(request.user)
 
@@ -66,11 +224,11 @@ class CartViewSet(viewsets.ViewSet):
             raise ValidationError({'quantity': 'Quantity must be at least 1.'})
         
         try:
-            product = Product.objects.get(id=product_id, is_active=True)
+            product = Product.objects.with_stock_total().get(id=product_id, is_active=True)
         except Product.DoesNotExist:
             raise ValidationError({'product': 'Product is not found.'})
         
-        if product.stock < quantity:
+        if product.stock_total < quantity:
             raise ValidationError({'stock': 'Insufficient stock available.'})
 
         item, created = CartItem.objects.get_or_create(
@@ -81,7 +239,7 @@ class CartViewSet(viewsets.ViewSet):
 
         if not created:
             item.quantity += quantity
-            if item.quantity > product.stock:
+            if item.quantity > product.stock_total:
                 raise ValidationError({'stock': 'Insufficient stock available.'})
             item.save()
 
@@ -89,6 +247,7 @@ class CartViewSet(viewsets.ViewSet):
     
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def remove(self, request):
         cart = self.get_cart(request.user)
         product_id = request.data.get('product_id')
@@ -101,6 +260,78 @@ class CartViewSet(viewsets.ViewSet):
     
 
     @action(detail=False, methods=['post'])
+    @idempotent
+    @immediate_atomic()
+    def batch(self, request):
+        """
+        Apply a list of add/set/remove operations in one transaction.
+
+        Stock for every product (and what is already in the cart) is read with
+        a single query, the resulting quantities are written with one bulk
+        upsert plus one delete. If any line fails nothing is applied and the
+        errors are reported per line, in the same order as `operations`.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+        cart = self.get_cart(request.user)
+
+        in_cart = CartItem.objects.filter(cart=cart, product=OuterRef('pk')).values('quantity')[:1]
+        products = (
+            Product.objects.filter(id__in={op['product_id'] for op in operations}, is_active=True)
+            .with_stock_total()
+            .annotate(in_cart=Subquery(in_cart))
+            .only('id', 'stock', 'sharded_stock')
+            .in_bulk()
+        )
+        quantities = {product_id: product.in_cart or 0 for product_id, product in products.items()}
+        original = dict(quantities)
+
+        errors = []
+        for op in operations:
+            product_id = op['product_id']
+            product = products.get(product_id)
+            error = {}
+            if op['op'] == CartOperationSerializer.OP_REMOVE:
+                quantities[product_id] = 0
+            elif product is None:
+                error = {'product': ['Product is not found.']}
+            else:
+                quantity = op['quantity']
+                if op['op'] == CartOperationSerializer.OP_ADD:
+                    quantity += quantities[product_id]
+                if quantity > product.stock_total:
+                    error = {'stock': ['Insufficient stock available.']}
+                else:
+                    quantities[product_id] = quantity
+            errors.append(error)
+
+        if any(errors):
+            raise ValidationError({'operations': errors})
+
+        removed = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+        if removed:
+            CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+
+        changed = [
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+            if quantity and quantity != original.get(product_id)
+        ]
+        if changed:
+            CartItem.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+
+        cart = self.get_cart_for_display(request.user)
+        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+
+
+    @action(detail=False, methods=['post'])
+    @idempotent
     def clear(self, request):
         cart = self.get_cart(request.user)
         cart.clear()
@@ -110,16 +341,37 @@ class CartViewSet(viewsets.ViewSet):
 # -----------------------------
 # ORDER ViewSet
 # -----------------------------
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    # Checkout is flat in cart size (six of it for the sales rollups), plus one UPDATE per
+    # line of a sharded product (room for two).
+    # Retrieving an archived order takes one more query than a live one.
+    query_budget = {'list': 3, 'retrieve': 3, 'checkout': 17}
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related("items__product")
+        # Items carry a snapshot of their product, so the catalog is never joined
+        return Order.objects.filter(user=self.request.user).prefetch_related("items")
+
+    def get_object(self):
+        """
+        The user's order by id or uuid, falling back to the archive - see
+        shop/archive.py. ArchivedOrder has Order's fields, so OrderSerializer
+        renders either.
+        """
+        lookup = archive.lookup_filter(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if lookup is None:
+            raise Http404
+        order = self.get_queryset().filter(**lookup).first() or archive.find(self.request.user, lookup)
+        if order is None:
+            raise Http404
+        self.check_object_permissions(self.request, order)
+        return order
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def checkout(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+        cart = Cart.for_user(request.user)
 
         if not cart.items.exists():
             return Response({'detail': 'Your cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
@@ -129,4 +381,89 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         except ValueError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Staff-only streaming export of every order line (all users).
+        `?output=ndjson|csv&start=YYYY-MM-DD&end=YYYY-MM-DD` filter on `placed_at`.
+        """
+        fmt = request.query_params.get('output', 'ndjson')
+        if fmt not in exports.FORMATS:
+            raise ValidationError({'output': f"Choose one of: {', '.join(exports.FORMATS)}."})
+        try:
+            start = exports.parse_bound(request.query_params.get('start'))
+            end = exports.parse_bound(request.query_params.get('end'), end=True)
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+
+        response = StreamingHttpResponse(
+            exports.render(exports.export_rows(start, end), fmt),
+            content_type=exports.CONTENT_TYPES[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+        return response
+
+
+# -----------------------------
+# SALES ANALYTICS ViewSet
+# -----------------------------
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Staff-only sales reports over `?start=YYYY-MM-DD&end=YYYY-MM-DD` (the last
+    30 days by default). They read only the daily rollups (shop/rollups.py),
+    never the orders, so they cost the same however many orders there are.
+    """
+    permission_classes = [IsAdminUser]
+    query_budget = {'sales': 1, 'products': 1, 'categories': 1}
+    default_days = 30
+    max_limit = 100
+
+    def get_range(self, request):
+        end = self.parse_day(request, 'end') or timezone.localdate()
+        start = self.parse_day(request, 'start') or end - timedelta(days=self.default_days - 1)
+        if start > end:
+            raise ValidationError({'start': 'Must not be after end.'})
+        return start, end
+
+    def parse_day(self, request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        day = parse_date(value) if len(value) == 10 else None
+        if day is None:
+            raise ValidationError({name: 'Use YYYY-MM-DD.'})
+        return day
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be a number.'})
+        return max(1, min(limit, self.max_limit))
+
+    @action(detail=False, methods=['get'])
+    def sales(self, request):
+        """Totals per day, and over the whole range."""
+        start, end = self.get_range(request)
+        days = list(rollups.daily(start, end))
+        return Response({
+            'start': start, 'end': end,
+            'totals': SalesTotalsSerializer(rollups.totals(days)).data,
+            'days': SalesDaySerializer(days, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def products(self, request):
+        """Best-selling products by revenue; `?limit=` (20, at most 100)."""
+        start, end = self.get_range(request)
+        rows = rollups.top_products(start, end, self.get_limit(request))
+        return Response({'start': start, 'end': end, 'results': SalesBreakdownSerializer(rows, many=True).data})
+
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        """Categories by revenue; `?limit=` (20, at most 100)."""
+        start, end = self.get_range(request)
+        rows = rollups.top_categories(start, end, self.get_limit(request))
+        return Response({'start': start, 'end': end, 'results': SalesBreakdownSerializer(rows, many=True).data})